@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : bench_save_file_task.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+""" Compare the text and binary formats of the SaveFileTask.
+
+Each call saves a scalar and a trace of one million points. Run from the root
+of the repository : PYTHONPATH=. python benchmarks/bench_save_file_task.py
+
+"""
+import os
+import shutil
+from tempfile import mkdtemp
+from timeit import default_timer
+from multiprocessing import Event
+
+import numpy as np
+
+from hqc_meas.tasks.api import RootTask
+from hqc_meas.tasks.tasks_util.save_tasks import SaveFileTask
+
+
+ROWS = 1000000
+
+CALLS = 5
+
+
+def run(file_format, folder):
+    """ Time the saving of CALLS traces in the given format.
+
+    """
+    root = RootTask(should_stop=Event(), should_pause=Event())
+    task = SaveFileTask(task_name='Bench', folder=folder,
+                        filename='bench_' + file_format.lower(),
+                        file_format=file_format,
+                        saved_values=[('x', '{Root_x}'),
+                                      ('trace', '{Root_trace}')])
+    root.children_task.append(task)
+    root.write_in_database('x', 1.0)
+    root.write_in_database('trace', np.random.rand(ROWS))
+
+    start = default_timer()
+    try:
+        for i in range(CALLS):
+            task.perform()
+    finally:
+        task.file_object.close()
+    duration = default_timer() - start
+
+    size = os.path.getsize(os.path.join(folder, task.filename))
+    return duration/CALLS, size
+
+
+if __name__ == '__main__':
+    folder = mkdtemp()
+    try:
+        for file_format in ('Text', 'Binary'):
+            duration, size = run(file_format, folder)
+            print '{:<8}: {:8.3f} s per trace, {:6.1f} MB'.format(
+                file_format, duration, size/1e6)
+    finally:
+        shutil.rmtree(folder)
@@ -7,6 +7,7 @@ except Exception:
     from pyvisa.legacy.visa import Instrument, VisaIOError
     from pyvisa.errors import VisaTypeError
 
+from ..utils.tracing import traced
 from .driver_tools import BaseInstrument, InstrIOError
 
 
@@ -127,6 +128,7 @@ class VisaInstrument(BaseInstrument):
         """
         return bool(self._driver)
 
+    @traced('instrument')
     def write(self, message):
         """Send the specified message to the instrument.
 
@@ -135,6 +137,7 @@ class VisaInstrument(BaseInstrument):
         """
         self._driver.write(message)
 
+    @traced('instrument')
     def read(self):
         """Read one line of the instrument's buffer.
 
@@ -143,6 +146,7 @@ class VisaInstrument(BaseInstrument):
         """
         return self._driver.read()
 
+    @traced('instrument')
     def read_values(self, format=None):
         """Read one line of the instrument's buffer and convert to values.
 
@@ -151,6 +155,7 @@ class VisaInstrument(BaseInstrument):
         """
         return self._driver.read_values(format=format)
 
+    @traced('instrument')
     def ask(self, message):
         """Send the specified message to the instrument and read its answer.
 
@@ -159,6 +164,7 @@ class VisaInstrument(BaseInstrument):
         """
         return self._driver.ask(message)
 
+    @traced('instrument')
     def ask_for_values(self, message, format=None):
         """Send the specified message to the instrument and convert its answer
         to values.
@@ -184,6 +190,7 @@ class VisaInstrument(BaseInstrument):
         """
         return self._driver.trigger()
 
+    @traced('instrument')
     def read_raw(self):
         """Read one line of the instrument buffer and return without stripping
         termination caracters.
@@ -4,7 +4,7 @@
 # author : Matthieu Dartiailh
 # license : MIT license
 # =============================================================================
-from atom.api import Typed, Value, Tuple, Bool
+from atom.api import Typed, Value, Tuple, Bool, Enum, Float
 from enaml.workbench.api import Workbench
 from enaml.application import deferred_call
 from multiprocessing import Pipe
@@ -31,6 +31,19 @@ class ProcessEngine(BaseEngine):
     #: Reference to the workbench got at __init__
     workbench = Typed(Workbench)
 
+    #: Profiler used when performing the measures in the subprocess :
+    #: - 'none' : no profiling.
+    #: - 'deterministic' : cProfile, only the main thread of the measure is
+    #:   profiled. Stats are saved in <measure name>.prof.
+    #: - 'sampling' : statistical profiler sampling all threads. The folded
+    #:   stacks are saved in <measure name>_samples.txt.
+    #: The files are saved next to the log of the measure. This setting (as
+    #: the next one) is set by the ProcessEnginePlugin.
+    profiling = Enum('none', 'deterministic', 'sampling').tag(pref=True)
+
+    #: Time in seconds between two samples of the sampling profiler.
+    sampling_interval = Float(0.005).tag(pref=True)
+
     def prepare_to_run(self, name, root, monitored_entries, build_deps):
 
         runtime_deps = root.run_time
@@ -41,7 +54,8 @@ class ProcessEngine(BaseEngine):
 
         # Make infos tuple to send to the subprocess.
         self._temp = (name, config, build_deps, runtime_deps,
-                      monitored_entries)
+                      monitored_entries,
+                      (self.profiling, self.sampling_interval))
 
         # Clear all the flags.
         self._meas_pause.clear()
@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : plugin.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+from atom.api import Enum, Float, Value
+
+from hqc_meas.utils.has_pref_plugin import HasPrefPlugin
+from .engine import ProcessEngine
+
+
+class ProcessEnginePlugin(HasPrefPlugin):
+    """ Plugin storing the settings of the process engine.
+
+    The settings are forwarded to the engine created by the plugin, even when
+    modified after its creation.
+
+    """
+
+    # --- Public API ----------------------------------------------------------
+
+    #: Profiler used when performing the measures (see ProcessEngine).
+    profiling = Enum('none', 'deterministic', 'sampling').tag(pref=True)
+
+    #: Time in seconds between two samples of the sampling profiler.
+    sampling_interval = Float(0.005).tag(pref=True)
+
+    def create_engine(self, declaration):
+        """ Create a process engine using the current settings.
+
+        Parameters
+        ----------
+        declaration : Engine
+            Declaration of the engine.
+
+        """
+        engine = ProcessEngine(workbench=self.workbench,
+                               declaration=declaration,
+                               profiling=self.profiling,
+                               sampling_interval=self.sampling_interval)
+        self._engine = engine
+        return engine
+
+    # --- Private API ---------------------------------------------------------
+
+    #: Last engine created by the plugin.
+    _engine = Value()
+
+    def _observe_profiling(self, change):
+        """ Forward the new profiler to the engine.
+
+        """
+        if self._engine is not None:
+            self._engine.profiling = change['value']
+
+    def _observe_sampling_interval(self, change):
+        """ Forward the new sampling interval to the engine.
+
+        """
+        if self._engine is not None:
+            self._engine.sampling_interval = change['value']
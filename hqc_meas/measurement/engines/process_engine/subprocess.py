@@ -5,6 +5,7 @@
 # license : MIT license
 # =============================================================================
 import os
+import cProfile
 import logging
 import logging.config
 import warnings
@@ -14,6 +15,7 @@ from logging.handlers import RotatingFileHandler
 from multiprocessing import Process
 
 from hqc_meas.utils.log.tools import (StreamToLogRedirector)
+from hqc_meas.utils.sampling_profiler import SamplingProfiler
 from hqc_meas.tasks.manager.building import build_task_from_config
 from ..tools import MeasureSpy
 
@@ -113,7 +115,8 @@ class TaskProcess(Process):
                     break
 
                 # Get the measure.
-                name, config, build, runtime, mon_entries = self.pipe.recv()
+                name, config, build, runtime, mon_entries, profiling =\
+                    self.pipe.recv()
 
                 # Build it by using the given build dependencies.
                 root = build_task_from_config(config, build, True)
@@ -163,7 +166,24 @@ class TaskProcess(Process):
                 # They pass perform the measure.
                 if check:
                     logger.info('Check successful')
-                    root.perform_(root)
+                    self._perform(root, profiling,
+                                  os.path.splitext(log_path)[0])
+
+                    # Save the execution statistics next to the log.
+                    if root.profiler is not None:
+                        profile_path = os.path.splitext(log_path)[0]
+                        try:
+                            root.profiler.dump(profile_path + '_profile.json')
+                        except Exception:
+                            logger.exception('Failed to save the profile')
+
+                    if root.tracer is not None:
+                        trace_path = os.path.splitext(log_path)[0]
+                        try:
+                            root.tracer.dump(trace_path + '_trace.json')
+                        except Exception:
+                            logger.exception('Failed to save the trace')
+
                     result = ['', '', '']
                     if self.task_stop.is_set():
                         result[0] = 'INTERRUPTED'
@@ -206,6 +226,49 @@ class TaskProcess(Process):
         self.monitor_queue.put_nowait((None, None))
         self.pipe.close()
 
+    def _perform(self, root, profiling, base_path):
+        """Perform the measure, under a profiler if requested.
+
+        Parameters
+        ----------
+        root : RootTask
+            Root of the measure to perform.
+        profiling : tuple
+            Profiling mode ('none', 'deterministic' or 'sampling') and
+            sampling interval.
+        base_path : unicode
+            Path of the log file without extension, used to build the path of
+            the profiling files.
+
+        """
+        mode, interval = profiling
+        logger = logging.getLogger()
+        if mode == 'deterministic':
+            profiler = cProfile.Profile()
+            try:
+                profiler.runcall(root.perform_, root)
+            finally:
+                try:
+                    profiler.dump_stats(base_path + '.prof')
+                except Exception:
+                    logger.exception('Failed to save the profile')
+
+        elif mode == 'sampling':
+            profiler = SamplingProfiler(interval)
+            profiler.start()
+            try:
+                root.perform_(root)
+            finally:
+                profiler.stop()
+                try:
+                    profiler.dump(base_path + '_samples.txt')
+                    logger.info(profiler.format_report())
+                except Exception:
+                    logger.exception('Failed to save the profile')
+
+        else:
+            root.perform_(root)
+
     def _config_log(self):
         """Configuring the logger for the process.
 
@@ -20,9 +20,13 @@ import logging
 from ..utils.atom_util import member_from_str, tagged_members
 from .tools.task_database import TaskDatabase
 from .tools.task_decorator import (make_parallel, make_wait, make_stoppable,
-                                   smooth_crash)
+                                   make_profiled, make_traced, smooth_crash)
 from .tools.string_evaluation import safe_eval
-from .tools.shared_resources import SharedDict, SharedCounter
+from .tools.shared_resources import SharedDict, ThreadsCounter
+from .tools.lock_monitoring import install_lock_monitor
+from .tools.task_profiler import TaskProfiler, iter_tasks
+from .tools.background_writer import BackgroundWriter
+from ..utils.tracing import Tracer, set_tracer
 
 
 PREFIX = '_a'
@@ -388,11 +392,28 @@ class BaseTask(Atom):
         """
         self._redefine_perform_()
 
-    def _redefine_perform_(self):
+    def _redefine_perform_(self, profile=False, trace=False):
         """ Make perform_ refects the parallel/wait settings.
 
+        Parameters
+        ----------
+        profile : bool, optional
+            Whether or not the execution time should be recorded by the
+            profiler of the root task.
+
+        trace : bool, optional
+            Whether or not the execution should be recorded by the active
+            tracer.
+
         """
         perform_func = self.perform.__func__
+        if trace:
+            perform_func = make_traced(perform_func,
+                                       self.task_path + '/' + self.task_name)
+        if profile:
+            perform_func = make_profiled(perform_func,
+                                         self.task_path + '/' + self.task_name)
+
         parallel = self.parallel
         if parallel.get('activated') and parallel.get('pool'):
             perform_func = make_parallel(perform_func, parallel['pool'])
@@ -1325,14 +1346,47 @@ class RootTask(ComplexTask):
 
     #: Dict like object used to store file handle.
     #: Keys are file handle id as defined by the first user of the file.
-    #: Keys can be deleted.
+    #: Keys can be deleted. Objects whose staging attribute is True hold data
+    #: waiting to be written to other files and are closed first.
     files = Typed(SharedDict, ())
 
-    #: Counter keeping track of the active threads.
-    active_threads_counter = Typed(SharedCounter, kwargs={'count': 1})
+    #: Counter keeping track of the active and paused threads. The paused
+    #: event is set when all threads are paused and cleared on resuming.
+    threads_counter = Typed(ThreadsCounter)
+
+    #: Flag indicating whether or not to record statistics about the time
+    #: spent waiting on locks and other threads. The statistics are written in
+    #: the log when the measure ends.
+    monitor_locks = Bool().tag(pref=True)
+
+    #: Object collecting the locks statistics (only when monitor_locks is
+    #: True).
+    lock_monitor = Value()
+
+    #: Flag indicating whether or not to record the execution time of all
+    #: tasks. The statistics are written in the log when the measure ends.
+    profile_tasks = Bool().tag(pref=True)
 
-    #: Counter keeping track of the paused threads.
-    paused_threads_counter = Typed(SharedCounter, ())
+    #: Object collecting the execution times (only when profile_tasks is True).
+    profiler = Value()
+
+    #: Flag indicating whether or not to record a timeline of the tasks,
+    #: instruments communications and database writes which can be viewed in
+    #: chrome://tracing.
+    trace_execution = Bool().tag(pref=True)
+
+    #: Object collecting the timeline (only when trace_execution is True).
+    tracer = Value()
+
+    #: Size of the files being written when the checkpoint from which the
+    #: measure is resumed was saved (set by the resumed loop). Tasks saving
+    #: data should truncate the files to this size and append to them. For
+    #: memory mapped arrays the number of written rows is stored instead.
+    resumed_files = Dict()
+
+    #: Thread writing the data of the save tasks using background writing
+    #: (only when at least one task requires it).
+    writer = Value()
 
     # Setting default values for the root task.
     has_root = set_default(True)
@@ -1368,6 +1422,27 @@ class RootTask(ComplexTask):
         """ Run sequentially all child tasks, and close ressources.
 
         """
+        if self.monitor_locks:
+            self.lock_monitor = install_lock_monitor(self)
+
+        if self.profile_tasks:
+            self.profiler = TaskProfiler()
+
+        if self.trace_execution:
+            self.tracer = Tracer()
+            set_tracer(self.tracer)
+
+        if self.profile_tasks or self.trace_execution:
+            for task in iter_tasks(self):
+                task._redefine_perform_(profile=self.profile_tasks,
+                                        trace=self.trace_execution)
+
+        if any(getattr(task, 'background_writing', False) or
+               getattr(task, 'compression', 'None') != 'None'
+               for task in iter_tasks(self)):
+            self.writer = BackgroundWriter(self)
+            self.writer.start()
+
         try:
             for child in self.children_task:
                 child.perform_(child)
@@ -1398,9 +1473,21 @@ class RootTask(ComplexTask):
                     mes = 'Failed to close connection to instr:'
                     log.exception(mes)
 
-            # Close all opened files.
-            files = self.files
-            for file_id in files:
+            # Perform the pending writing operations before closing the files.
+            if self.writer is not None:
+                try:
+                    self.writer.close()
+                except Exception:
+                    log = logging.getLogger(__name__)
+                    mes = 'Failed to stop the background writer:'
+                    log.exception(mes)
+                self.writer = None
+
+            # Close all opened files, staging areas first.
+            files = self.files.snapshot()
+            ids = sorted(files,
+                         key=lambda f: not getattr(files[f], 'staging', False))
+            for file_id in ids:
                 try:
                     files[file_id].close()
                 except Exception:
@@ -1408,6 +1495,21 @@ class RootTask(ComplexTask):
                     mes = 'Failed to close file handler:'
                     log.exception(mes)
 
+            if self.lock_monitor is not None:
+                log = logging.getLogger(__name__)
+                log.info(self.lock_monitor.format_report())
+
+            if self.tracer is not None:
+                set_tracer(None)
+
+            if self.profile_tasks or self.trace_execution:
+                for task in iter_tasks(self):
+                    task._redefine_perform_()
+
+            if self.profiler is not None:
+                log = logging.getLogger(__name__)
+                log.info(self.profiler.format_report())
+
     def register_in_database(self):
         """ Create a node in the database and register all entries.
 
@@ -1474,18 +1576,21 @@ class RootTask(ComplexTask):
         """
         pass
 
-    @observe('active_threads_counter.count', 'paused_threads_counter.count')
-    def _state(self, change):
-        """
+    def _default_threads_counter(self):
+        return ThreadsCounter(1, self._all_threads_paused,
+                              self._all_threads_resumed)
+
+    def _all_threads_paused(self):
+        """ Signal that all threads are paused.
 
         """
-        p_count = self.paused_threads_counter.count
-        a_count = self.active_threads_counter.count
-        if a_count == p_count:
-            self.paused.set()
+        self.paused.set()
+
+    def _all_threads_resumed(self):
+        """ Signal that no thread is paused anymore.
 
-        if p_count == 0:
-            self.paused.clear()
+        """
+        self.paused.clear()
 
     def _default_resume(self):
         return tEvent()
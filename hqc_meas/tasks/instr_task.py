@@ -73,13 +73,19 @@ class InstrumentTask(SimpleTask):
         """
         run_time = self.root_task.run_time
         instrs = self.root_task.instrs
-        if self.selected_profile in instrs:
-            self.driver = instrs[self.selected_profile]
-        else:
-            config = run_time['profiles'][self.selected_profile]
-            driver_class = run_time['drivers'][self.selected_driver]
-            self.driver = driver_class(config)
-            instrs[self.selected_profile] = self.driver
+        driver = instrs.get(self.selected_profile)
+        if driver is None:
+            # Check again under the lock so that two tasks running in parallel
+            # cannot open two connections to the same instrument.
+            with instrs.locked():
+                driver = instrs.get(self.selected_profile)
+                if driver is None:
+                    config = run_time['profiles'][self.selected_profile]
+                    driver_class = run_time['drivers'][self.selected_driver]
+                    driver = driver_class(config)
+                    instrs[self.selected_profile] = driver
+
+        self.driver = driver
 
     def stop_driver(self):
         """ Stop the instrument driver.
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : grid_task.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+"""
+"""
+from atom.api import (Bool, Tuple, ContainerList, set_default)
+from collections import Iterable
+import numpy as np
+
+from ..base_tasks import ComplexTask
+from ..tools.task_decorator import handle_stop_pause
+from .loop_exceptions import BreakException, ContinueException
+
+
+def grid_indexes(shape, snake=False):
+    """ Compute the indexes of all the points of a grid.
+
+    Parameters
+    ----------
+    shape : tuple(int)
+        Number of points along each axis. The last axis is the one varying the
+        fastest.
+
+    snake : bool, optional
+        Whether or not to reverse the direction of an axis each time the
+        outer axes move so that two consecutive points are always neighbours
+        (boustrophedon ordering).
+
+    Returns
+    -------
+    indexes : numpy.ndarray
+        Array of shape (number of points, number of axes) holding the index of
+        the point along each axis in the order in which they should be
+        visited.
+
+    """
+    num = int(np.prod(shape))
+    flat = np.arange(num)
+    indexes = np.array(np.unravel_index(flat, shape)).reshape(len(shape), num)
+    if snake:
+        stride = num
+        for k, length in enumerate(shape):
+            stride //= length
+            if k == 0:
+                continue
+            # Number of complete sweeps of this axis done before the point.
+            sweeps = flat // (stride*length)
+            reverse = sweeps % 2 == 1
+            indexes[k, reverse] = length - 1 - indexes[k, reverse]
+
+    return indexes.T
+
+
+class GridTask(ComplexTask):
+    """ Complex task calling all its child tasks on each point of a grid.
+
+    Each axis is defined by a label and a formula evaluating to an iterable
+    (as for the iterable loop interface, use np.linspace for linear ranges).
+    The current value of each axis and its index are stored in the database
+    under the entries '<label>' and '<label>_index'.
+
+    """
+    # --- Public API ----------------------------------------------------------
+
+    logic_task = True
+
+    #: List of (label, iterable) defining the axes of the grid. The last axis
+    #: is the one varying the fastest.
+    axes = ContainerList(Tuple()).tag(pref=True)
+
+    #: Flag indicating whether or not to reverse the direction of an axis
+    #: each time the outer axes move (minimizes the distance between
+    #: consecutive points).
+    snake = Bool().tag(pref=True)
+
+    task_database_entries = set_default({'point_number': 1, 'index': 1,
+                                         'progress': 0.0})
+
+    def check(self, *args, **kwargs):
+        """ Check that all axes can be evaluated before checking the children.
+
+        """
+        test = True
+        traceback = {}
+        err_path = self.task_path + '/' + self.task_name
+
+        if not self.axes:
+            traceback[err_path] = 'No axis is defined.'
+            return False, traceback
+
+        labels = [axis[0] for axis in self.axes]
+        if len(set(labels)) != len(labels) or not all(labels):
+            traceback[err_path + '-labels'] = \
+                'Axes labels must be non empty and unique.'
+            return False, traceback
+
+        number = 1
+        for label, iterable in self.axes:
+            try:
+                values = self.format_and_eval_string(iterable)
+                # Generators have no length and are consumed as in perform.
+                if isinstance(values, Iterable):
+                    values = list(values)
+            except Exception as e:
+                test = False
+                mess = 'Grid task did not succeed to compute the axis {}: {}'
+                traceback[err_path + '-' + label] = mess.format(label, e)
+                continue
+
+            if not isinstance(values, Iterable) or not values:
+                test = False
+                mess = 'The computed values of the axis {} are not a non ' +\
+                    'empty iterable.'
+                traceback[err_path + '-' + label] = mess.format(label)
+                continue
+
+            number *= len(values)
+            self.write_in_database(label, values[0])
+
+        if test:
+            self.write_in_database('point_number', number)
+
+        c_test, c_traceback = super(GridTask, self).check(*args, **kwargs)
+        traceback.update(c_traceback)
+        test &= c_test
+
+        return test, traceback
+
+    def perform(self):
+        """ Call all the child tasks on each point of the grid.
+
+        """
+        name = self.task_name
+        values = [list(self.format_and_eval_string(iterable))
+                  for _, iterable in self.axes]
+        shape = tuple(len(v) for v in values)
+        indexes = grid_indexes(shape, self.snake)
+        number = len(indexes)
+
+        self.write_in_database('point_number', number)
+
+        # Build once the full names of the entries updated at each point.
+        entries = [(name + '_' + label, name + '_' + label + '_index', axis)
+                   for (label, _), axis in zip(self.axes, values)]
+        index_entry = name + '_index'
+        progress_entry = name + '_progress'
+
+        root = self.root_task
+        database = self.task_database
+        path = self.task_path
+        for i, point in enumerate(indexes):
+
+            if handle_stop_pause(root):
+                return
+
+            update = {index_entry: i + 1,
+                      progress_entry: float(i + 1)/number}
+            for (value_entry, axis_index_entry, axis), j in \
+                    zip(entries, point.tolist()):
+                update[value_entry] = axis[j]
+                update[axis_index_entry] = j + 1
+            database.set_values(path, update)
+
+            try:
+                for child in self.children_task:
+                    child.perform_(child)
+            except BreakException:
+                break
+            except ContinueException:
+                continue
+
+    # --- Private API ---------------------------------------------------------
+
+    def _observe_axes(self, change):
+        """ Keep the database entries in sync with the axes.
+
+        """
+        entries = {'point_number': 1, 'index': 1, 'progress': 0.0}
+        for axis in self.axes:
+            entries[axis[0]] = 0.0
+            entries[axis[0] + '_index'] = 1
+        self.task_database_entries = entries
+
+KNOWN_PY_TASKS = [GridTask]
@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : loop_adaptive_interface.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+"""
+"""
+from atom.api import Str
+from bisect import insort
+import numpy as np
+
+from ..task_interface import TaskInterface
+
+
+class AdaptiveSampler(object):
+    """ Iterable generating the points of an adaptive loop.
+
+    A coarse linear sweep is first performed, then points are inserted in the
+    middle of the interval on which the observed quantity varies the most.
+    Intervals are compared using their length in the plane (value, observed)
+    normalized by the span of both quantities so that flat regions are still
+    sampled a bit. The refinement stops when the point budget is exhausted or
+    when the largest interval is below the tolerance.
+
+    The observed quantity is evaluated each time the next point is requested,
+    that is once the children of the loop have been performed for the
+    previous point.
+
+    Parameters
+    ----------
+    task : LoopTask
+        Task performing the loop, used to evaluate the observed quantity.
+
+    start, stop : float
+        Bounds of the loop.
+
+    coarse_points : int
+        Number of points of the initial sweep.
+
+    max_points : int
+        Maximal number of points.
+
+    tolerance : float
+        The refinement stops when all the normalized intervals are smaller.
+
+    observed : str
+        Formula of the observed quantity.
+
+    """
+
+    def __init__(self, task, start, stop, coarse_points, max_points,
+                 tolerance, observed):
+        self.task = task
+        self.start = start
+        self.stop = stop
+        self.coarse_points = coarse_points
+        self.max_points = max_points
+        self.tolerance = tolerance
+        self.observed = observed
+
+    def __len__(self):
+        return self.max_points
+
+    def __iter__(self):
+        task = self.task
+        points = []
+        for x in np.linspace(self.start, self.stop, self.coarse_points):
+            yield x
+            points.append((x, task.format_and_eval_string(self.observed)))
+
+        points.sort()
+        number = self.coarse_points
+        while number < self.max_points:
+            x = self.next_point(points)
+            if x is None:
+                break
+            yield x
+            insort(points, (x, task.format_and_eval_string(self.observed)))
+            number += 1
+
+        # Let the database reflect the number of points actually measured.
+        task.write_in_database('point_number', number)
+
+    def next_point(self, points):
+        """ Determine the next point to measure.
+
+        Parameters
+        ----------
+        points : list(tuple)
+            Already measured (value, observed) pairs sorted by value.
+
+        Returns
+        -------
+        value : float or None
+            Next value to measure or None if the tolerance is met.
+
+        """
+        xs = np.array([p[0] for p in points])
+        ys = np.array([p[1] for p in points])
+        x_span = (xs[-1] - xs[0]) or 1.0
+        y_span = np.ptp(ys) or 1.0
+        scores = np.hypot(np.diff(xs)/x_span, np.diff(ys)/y_span)
+        i = np.argmax(scores)
+        if scores[i] < self.tolerance:
+            return None
+        return (xs[i] + xs[i + 1])/2
+
+
+class AdaptiveLoopInterface(TaskInterface):
+    """ Loop refining the sampling where an observed quantity varies most.
+
+    The observed quantity is read once the children have been performed for
+    a point so the loop cannot be pipelined. As the measured values are not
+    part of the checkpoints the loop can neither be resumed.
+
+    """
+    #: Value at which to start the loop.
+    start = Str('0.0').tag(pref=True)
+
+    #: Value at which to stop the loop (included)
+    stop = Str('1.0').tag(pref=True)
+
+    #: Number of points of the initial coarse sweep.
+    coarse_points = Str('11').tag(pref=True)
+
+    #: Maximal number of points (coarse ones included).
+    max_points = Str('101').tag(pref=True)
+
+    #: Normalized interval length below which no point is added.
+    tolerance = Str('0.01').tag(pref=True)
+
+    #: Formula of the quantity whose variations drive the refinement.
+    observed = Str().tag(pref=True)
+
+    def check(self, *args, **kwargs):
+        """ Check evaluation of all loop parameters.
+
+        """
+        test = True
+        traceback = {}
+        task = self.task
+        err_path = task.task_path + '/' + task.task_name
+        values = {}
+        for name in ('start', 'stop', 'coarse_points', 'max_points',
+                     'tolerance'):
+            try:
+                values[name] = task.format_and_eval_string(getattr(self,
+                                                                   name))
+            except Exception as e:
+                test = False
+                mess = 'Loop task did not succeed to compute the {}: {}'
+                traceback[err_path + '-' + name] = mess.format(name, e)
+
+        try:
+            task.format_and_eval_string(self.observed)
+        except Exception as e:
+            test = False
+            mess = 'Loop task did not succeed to compute the observed ' +\
+                'value: {}'
+            traceback[err_path + '-observed'] = mess.format(e)
+
+        for name in ('pipelined', 'checkpoint', 'resume'):
+            if getattr(task, name):
+                test = False
+                traceback[err_path + '-' + name] = \
+                    'An adaptive loop does not support the {} option.'\
+                    .format(name)
+
+        if not test:
+            return test, traceback
+
+        if 'value' in task.task_database_entries:
+            task.write_in_database('value', values['start'])
+
+        coarse, max_points = values['coarse_points'], values['max_points']
+        if coarse < 2 or max_points < coarse:
+            test = False
+            traceback[err_path + '-points'] = \
+                'The coarse sweep must have at least two points and no ' +\
+                'more than the maximal number of points.'
+        else:
+            task.write_in_database('point_number', int(max_points))
+
+        return test, traceback
+
+    def perform(self):
+        """
+        """
+        task = self.task
+        sampler = AdaptiveSampler(
+            task,
+            task.format_and_eval_string(self.start),
+            task.format_and_eval_string(self.stop),
+            int(task.format_and_eval_string(self.coarse_points)),
+            int(task.format_and_eval_string(self.max_points)),
+            task.format_and_eval_string(self.tolerance),
+            self.observed)
+
+        task.perform_loop(sampler)
+
+INTERFACES = {'LoopTask': [AdaptiveLoopInterface]}
@@ -6,11 +6,14 @@
 # =============================================================================
 """
 """
-from atom.api import (Str, set_default)
+from atom.api import (Str, Int, Float, set_default)
+from inspect import cleandoc
+from math import sqrt
 
 from ..base_tasks import SimpleTask
 from .loop_task import LoopTask
 from .while_task import WhileTask
+from .grid_task import GridTask
 from .loop_exceptions import BreakException, ContinueException
 
 
@@ -34,9 +37,10 @@ class BreakTask(SimpleTask):
         test = True
         traceback = {}
         # XXXX to extend later for support of other looping tasks.
-        if not isinstance(self.parent_task, (LoopTask, WhileTask)):
+        if not isinstance(self.parent_task, (LoopTask, WhileTask, GridTask)):
             test = False
-            mess = 'Incorrect parent type: {}, expected LoopTask or WhileTask.'
+            mess = cleandoc('''Incorrect parent type: {}, expected LoopTask,
+                            WhileTask or GridTask.''')
             traceback[self.task_path + '/' + self.task_name + '-parent'] = \
                 mess.format(self.parent_task.task_class)
 
@@ -78,9 +82,10 @@ class ContinueTask(SimpleTask):
         test = True
         traceback = {}
         # XXXX to extend later for support of other looping tasks.
-        if not isinstance(self.parent_task, (LoopTask, WhileTask)):
+        if not isinstance(self.parent_task, (LoopTask, WhileTask, GridTask)):
             test = False
-            mess = 'Incorrect parent type: {}, expected LoopTask or WhileTask.'
+            mess = cleandoc('''Incorrect parent type: {}, expected LoopTask,
+                            WhileTask or GridTask.''')
             traceback[self.task_path + '/' + self.task_name + '-parent'] = \
                 mess.format(self.parent_task.task_class)
 
@@ -101,4 +106,114 @@ class ContinueTask(SimpleTask):
         if self.format_and_eval_string(self.condition):
             raise ContinueException()
 
-KNOWN_PY_TASKS = [BreakTask, ContinueTask]
+
+class ConvergenceTask(SimpleTask):
+    """ Task breaking out of a loop once the mean of a quantity is known with
+    a sufficient precision.
+
+    The mean and variance of the observed quantity are updated at each
+    iteration using Welford online algorithm and the loop is exited as soon as
+    the relative standard error on the mean falls below the threshold (or the
+    maximal number of values has been reached). The statistics are reset when
+    the parent loop starts a new run.
+
+    """
+
+    logic_task = True
+
+    #: Formula of the quantity to average.
+    observed = Str().tag(pref=True)
+
+    #: Relative standard error on the mean below which to exit the loop.
+    threshold = Str('0.01').tag(pref=True)
+
+    #: Minimal number of values to collect before testing the convergence.
+    min_count = Str('3').tag(pref=True)
+
+    #: Maximal number of values to collect (optional).
+    max_count = Str().tag(pref=True)
+
+    parallel = set_default({'forbidden': True})
+
+    task_database_entries = set_default({'count': 0, 'mean': 0.0,
+                                         'std_error': 0.0,
+                                         'relative_error': 0.0})
+
+    def check(self, *args, **kwargs):
+        """
+
+        """
+        test = True
+        traceback = {}
+        err_path = self.task_path + '/' + self.task_name
+        if not isinstance(self.parent_task, (LoopTask, WhileTask, GridTask)):
+            test = False
+            mess = cleandoc('''Incorrect parent type: {}, expected LoopTask,
+                            WhileTask or GridTask.''')
+            traceback[err_path + '-parent'] = \
+                mess.format(self.parent_task.task_class)
+
+        for name in ('observed', 'threshold', 'min_count', 'max_count'):
+            formula = getattr(self, name)
+            if not formula and name == 'max_count':
+                continue
+            try:
+                self.format_and_eval_string(formula)
+            except Exception as e:
+                test = False
+                mess = 'Task did not succeed to compute the {}: {}'
+                traceback[err_path + '-' + name] = mess.format(name, e)
+
+        return test, traceback
+
+    def perform(self):
+        """ Update the statistics and break if the mean converged.
+
+        """
+        index_entry = self.parent_task.task_name + '_index'
+        if self.get_from_database(index_entry) == 1:
+            self._count = 0
+            self._mean = 0.0
+            self._m2 = 0.0
+
+        value = self.format_and_eval_string(self.observed)
+        self._count += 1
+        count = self._count
+        delta = value - self._mean
+        self._mean += delta/count
+        self._m2 += delta*(value - self._mean)
+        mean = self._mean
+
+        if count > 1:
+            std_error = sqrt(self._m2/(count - 1)/count)
+            rel_error = std_error/abs(mean) if mean else float('inf')
+        else:
+            std_error = rel_error = float('inf')
+
+        name = self.task_name
+        self.task_database.set_values(self.task_path,
+                                      {name + '_count': count,
+                                       name + '_mean': mean,
+                                       name + '_std_error': std_error,
+                                       name + '_relative_error': rel_error})
+
+        if count >= self.format_and_eval_string(self.min_count) and\
+                rel_error <= self.format_and_eval_string(self.threshold):
+            raise BreakException()
+
+        if self.max_count and\
+                count >= self.format_and_eval_string(self.max_count):
+            raise BreakException()
+
+    # --- Private API ---------------------------------------------------------
+
+    #: Number of values collected during the current run of the loop.
+    _count = Int()
+
+    #: Running mean of the observed quantity.
+    _mean = Float()
+
+    #: Running sum of the squared deviations from the mean.
+    _m2 = Float()
+
+KNOWN_PY_TASKS = [BreakTask, ContinueTask, ConvergenceTask]
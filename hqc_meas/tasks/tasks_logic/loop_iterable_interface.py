@@ -10,15 +10,24 @@ from atom.api import Str
 from collections import Iterable
 
 from ..task_interface import TaskInterface
+from .loop_task import length_hint
 
 
 class IterableLoopInterface(TaskInterface):
     """ Common logic for all loop tasks.
 
+    The iterable can be an iterator (such as a generator expression) in which
+    case it is consumed lazily and never stored in memory. As the number of
+    points cannot then be known in advance a length hint can be provided.
+
     """
     #: Value at which to start the loop.
     iterable = Str('0.0').tag(pref=True)
 
+    #: Expected number of points for iterables whose length is not known
+    #: (optional).
+    length_hint = Str().tag(pref=True)
+
     def check(self, *args, **kwargs):
         """ Check evaluation of all loop parameters.
 
@@ -36,14 +45,33 @@ class IterableLoopInterface(TaskInterface):
 
             return test, traceback
 
-        if isinstance(iterable, Iterable):
-            task.write_in_database('point_number', len(iterable))
-            if 'value' in task.task_database_entries:
-                task.write_in_database('value', next(iter(iterable)))
-        else:
+        if not isinstance(iterable, Iterable):
             test = False
             traceback[err_path] = \
                 'The computed iterable is not iterable.'
+            return test, traceback
+
+        length = None
+        if self.length_hint:
+            try:
+                length = int(task.format_and_eval_string(self.length_hint))
+            except Exception as e:
+                test = False
+                mess = 'Loop task did not success to compute the length ' +\
+                    'hint: {}'
+                traceback[err_path + '-hint'] = mess.format(e)
+                return test, traceback
+
+        if length is None:
+            length = length_hint(iterable)
+        task.write_in_database('point_number', length)
+        if 'value' in task.task_database_entries:
+            # Iterators are evaluated again when performing so consuming one
+            # value here is harmless.
+            try:
+                task.write_in_database('value', next(iter(iterable)))
+            except StopIteration:
+                pass
 
         return test, traceback
 
@@ -52,7 +80,10 @@ class IterableLoopInterface(TaskInterface):
         """
         task = self.task
         iterable = task.format_and_eval_string(self.iterable)
+        length = None
+        if self.length_hint:
+            length = int(task.format_and_eval_string(self.length_hint))
 
-        task.perform_loop(iterable)
+        task.perform_loop(iterable, length)
 
 INTERFACES = {'LoopTask': [IterableLoopInterface]}
@@ -6,9 +6,17 @@
 # =============================================================================
 """
 """
-from atom.api import (Instance, Bool, set_default)
-
+from atom.api import (Instance, Bool, Int, Value, set_default)
+
+import os
+import json
+import logging
+import numpy
+from itertools import islice
+from collections import deque
 from timeit import default_timer
+from threading import Thread
+from Queue import Queue
 
 from ..base_tasks import (SimpleTask, ComplexTask)
 from ..task_interface import InterfaceableTaskMixin
@@ -16,6 +24,184 @@ from ..tools.task_decorator import handle_stop_pause
 from .loop_exceptions import BreakException, ContinueException
 
 
+def length_hint(iterable, default=0):
+    """ Get the expected length of an iterable without consuming it.
+
+    Parameters
+    ----------
+    iterable : iterable
+        Iterable whose length should be estimated.
+
+    default : int, optional
+        Value to return if the length cannot be estimated.
+
+    Returns
+    -------
+    length : int
+        Length of the iterable if it supports len, otherwise its length hint
+        (as provided by some iterators) or the default value.
+
+    """
+    try:
+        return len(iterable)
+    except TypeError:
+        pass
+
+    try:
+        hint = type(iterable).__length_hint__(iterable)
+    except (AttributeError, TypeError):
+        return default
+    if not isinstance(hint, (int, long)) or hint < 0:
+        return default
+    return hint
+
+
+class LoopStatistics(object):
+    """ Estimate the throughput of a loop at constant cost per iteration.
+
+    The iteration time is the time elapsed between two consecutive points. The
+    rate is computed on a sliding window of points while the iteration time is
+    exponentially smoothed.
+
+    Parameters
+    ----------
+    window : int, optional
+        Number of iterations over which the rate is computed.
+
+    smoothing : float, optional
+        Weight of the last iteration in the smoothed iteration time.
+
+    """
+
+    def __init__(self, window=20, smoothing=0.1):
+        self.smoothing = smoothing
+        self.times = deque(maxlen=window + 1)
+        self.iteration_time = None
+
+    def update(self, now):
+        """ Record that a new point is starting.
+
+        Parameters
+        ----------
+        now : float
+            Current time as given by timeit.default_timer.
+
+        """
+        times = self.times
+        if times:
+            delta = now - times[-1]
+            current = self.iteration_time
+            if current is None:
+                self.iteration_time = delta
+            else:
+                self.iteration_time = current + self.smoothing*(delta -
+                                                                current)
+        times.append(now)
+
+    @property
+    def rate(self):
+        """ Number of points per second over the last iterations.
+
+        """
+        times = self.times
+        span = times[-1] - times[0] if len(times) > 1 else 0
+        return (len(times) - 1)/span if span > 0 else 0.0
+
+
+class PipelineStage(object):
+    """ Background stage of a pipelined loop.
+
+    The tasks of the stage are performed in a dedicated thread, one point at
+    a time and in order. Each point is described by a snapshot of the
+    database taken when the foreground tasks completed, so that the values
+    read by the stage tasks are not affected by the acquisition of the next
+    points.
+
+    Parameters
+    ----------
+    task : LoopTask
+        Loop task owning the stage.
+
+    tasks : list
+        Tasks to perform for each point.
+
+    depth : int
+        Maximal number of points waiting to be processed. When the queue is
+        full, submitting a new point blocks.
+
+    """
+
+    def __init__(self, task, tasks, depth):
+        self.task = task
+        self.tasks = tasks
+        #: Set when a BreakException was raised by one of the stage tasks.
+        self.broken = False
+        #: Set when an unhandled exception occured in one of the stage tasks.
+        self.failed = False
+        self._queue = Queue(depth)
+        self._thread = Thread(target=self._run,
+                              name=task.task_name + '_pipeline')
+
+    def start(self):
+        """ Start the worker thread.
+
+        """
+        self._thread.start()
+
+    def submit(self, snapshot):
+        """ Add a point to process.
+
+        """
+        self._queue.put(snapshot)
+
+    def wait(self):
+        """ Wait for all the points submitted so far to be processed.
+
+        """
+        self._queue.join()
+
+    def close(self):
+        """ Wait for all the submitted points to be processed.
+
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        """ Process the points till the stage is closed.
+
+        """
+        database = self.task.task_database
+        while True:
+            snapshot = self._queue.get()
+            if snapshot is None:
+                self._queue.task_done()
+                break
+            # The points acquired after a break or a failure are discarded,
+            # the queue is drained so that submit never blocks forever.
+            if self.broken or self.failed:
+                self._queue.task_done()
+                continue
+
+            database.use_snapshot(snapshot)
+            try:
+                for child in self.tasks:
+                    child.perform_(child)
+            except BreakException:
+                self.broken = True
+            except ContinueException:
+                pass
+            except Exception:
+                log = logging.getLogger(__name__)
+                mes = 'The following unhandled exception occured in {} :'
+                log.exception(mes.format(self.task.task_name + ' pipeline'))
+                self.failed = True
+                self.task.root_task.should_stop.set()
+            finally:
+                database.use_snapshot(None)
+                self._queue.task_done()
+
+
 class LoopTask(InterfaceableTaskMixin, ComplexTask):
     """ Complex task which, at each iteration, call all its child tasks.
 
@@ -31,6 +217,37 @@ class LoopTask(InterfaceableTaskMixin, ComplexTask):
     #: is simply a convenience and can be set to None.
     task = Instance(SimpleTask).tag(child=True)
 
+    #: Flag indicating whether or not to perform the last child tasks (saving,
+    #: post-processing) in a background stage while the next point is
+    #: acquired.
+    pipelined = Bool().tag(pref=True)
+
+    #: Number of child tasks, counted from the end, performed in the
+    #: background stage when the loop is pipelined.
+    background_children = Int(1).tag(pref=True)
+
+    #: Maximal number of points waiting for the background stage. The
+    #: acquisition pauses when this number is reached.
+    pipeline_depth = Int(1).tag(pref=True)
+
+    #: Flag indicating whether or not to periodically save the progress of
+    #: the loop so that the measure can be resumed after a crash.
+    checkpoint = Bool().tag(pref=True)
+
+    #: Number of points between two checkpoints.
+    checkpoint_period = Int(10).tag(pref=True)
+
+    #: Flag indicating whether or not to resume from the last checkpoint (if
+    #: any). The completed points are skipped and the files being written are
+    #: truncated to their size at the time of the checkpoint and appended to.
+    #: The loop resumes only once per measure.
+    resume = Bool().tag(pref=True)
+
+    #: Flag indicating whether or not to maintain statistics about the loop
+    #: (points per second, smoothed iteration time, remaining time for the
+    #: loop and the whole measure) in the database.
+    statistics = Bool().tag(pref=True)
+
     task_database_entries = set_default({'point_number': 11, 'index': 1,
                                          'value': 0})
 
@@ -54,19 +271,50 @@ class LoopTask(InterfaceableTaskMixin, ComplexTask):
         traceback.update(c_traceback)
         test &= c_test
 
+        if self.pipelined:
+            err_path = self.task_path + '/' + self.task_name
+            if not 0 < self.background_children <= len(self.children_task):
+                test = False
+                traceback[err_path + '-pipeline'] = \
+                    'The number of background tasks must be between 1 and ' +\
+                    'the number of child tasks.'
+            if self.pipeline_depth < 1:
+                test = False
+                traceback[err_path + '-depth'] = \
+                    'The pipeline depth must be at least 1.'
+
+        self._resumed = False
+        if self.checkpoint and self.checkpoint_period < 1:
+            test = False
+            traceback[self.task_path + '/' + self.task_name + '-checkpoint'] =\
+                'The checkpoint period must be at least 1.'
+
         return test, traceback
 
-    def perform_loop(self, iterable):
+    def perform_loop(self, iterable, length=None):
         """ Perform the loop on the iterable calling all child tasks at each
         iteration.
 
         Parameters
         ----------
         iterable : iterable
-            Iterable on which the loop should be performed.
+            Iterable on which the loop should be performed. Iterators (such as
+            generators) are consumed lazily and never materialized.
+
+        length : int, optional
+            Expected number of points for iterables not supporting len. If
+            unspecified the length hint of the iterable is used if any. The
+            point_number entry is updated as the loop progresses if the
+            iterable turns out to be longer.
 
         """
-        if self.timing:
+        if length is None:
+            length = length_hint(iterable)
+        self._length = length
+
+        if self.pipelined:
+            self._perform_loop_pipelined(iterable)
+        elif self.timing:
             if self.task:
                 self._perform_loop_timing_task(iterable)
             else:
@@ -77,16 +325,256 @@ class LoopTask(InterfaceableTaskMixin, ComplexTask):
             else:
                 self._perform_loop(iterable)
 
+        # The loop completed (or was exited through a break), the checkpoint
+        # is useless.
+        if self.checkpoint and not self.root_task.should_stop.is_set():
+            path = self.checkpoint_path()
+            if os.path.isfile(path):
+                os.remove(path)
+
+    def checkpoint_path(self):
+        """ Path of the file in which the checkpoints are saved.
+
+        """
+        return os.path.join(self.get_from_database('default_path'),
+                            self.task_name + '.checkpoint')
+
     # --- Private API ---------------------------------------------------------
 
-    def _perform_loop(self, iterable):
+    #: Background stage of the loop when running in pipelined mode.
+    _stage = Value()
+
+    #: Expected number of points of the current loop.
+    _length = Int()
+
+    #: Flag indicating whether or not the loop already resumed from its
+    #: checkpoint during the current measure.
+    _resumed = Bool()
+
+    def _iterate(self, iterable):
+        """ Enumerate the points of the loop handling checkpoints and iterables
+        of unknown length.
+
+        When resuming the points completed before the checkpoint are skipped.
+        A point is considered complete when the next one is requested.
+
+        """
+        number = self._length
+        self.write_in_database('point_number', number)
+        sized = hasattr(iterable, '__len__')
+
+        start = 0
+        # Resume only once, nested loops must run all their points afterwards.
+        if self.resume and not self._resumed:
+            self._resumed = True
+            start = self._load_checkpoint(number)
+
+        if sized and not (self.checkpoint or self.statistics):
+            if start:
+                return enumerate(islice(iterable, start, None), start)
+            return enumerate(iterable)
+
+        return self._iterate_lazily(iterable, start, number, sized)
+
+    def _iterate_lazily(self, iterable, start, number, sized):
+        """ Generator saving checkpoints and keeping the point number up to
+        date for iterables whose length is not known in advance.
+
         """
+        period = self.checkpoint_period if self.checkpoint else 0
+        if self.statistics:
+            stats = LoopStatistics()
+            update_statistics = self._statistics_updater(stats)
+        count = start
+        for i, value in enumerate(islice(iterable, start, None), start):
+            if i >= number:
+                number = i + 1
+                self.write_in_database('point_number', number)
+            if self.statistics:
+                stats.update(default_timer())
+                update_statistics(i, number)
+            yield i, value
+            count = i + 1
+            if period and count % period == 0 and (count < number or
+                                                   not sized):
+                self._save_checkpoint(count, self._length)
+
+        # The iterable is exhausted the number of points is now known.
+        if not sized and count != number:
+            self.write_in_database('point_number', count)
+
+    def _statistics_updater(self, stats):
+        """ Build the function updating the statistics entries.
+
+        The indexes of the progress entries of the enclosing loops are looked
+        up once so that the update does not depend on the database size.
+
+        Parameters
+        ----------
+        stats : LoopStatistics
+            Object collecting the timing of the iterations.
+
+        Returns
+        -------
+        updater : callable
+            Function to call with the index of the current point (0 based) and
+            the number of points of the loop.
 
         """
-        self.write_in_database('point_number', len(iterable))
+        database = self.task_database
+        path = self.task_path
+        name = self.task_name
 
+        # Look for the enclosing tasks exposing their progress.
+        entries = []
         root = self.root_task
-        for i, value in enumerate(iterable):
+        parent = self.parent_task
+        # The root task is its own parent.
+        while parent is not None and parent is not root:
+            p_entries = parent.task_database_entries
+            if 'index' in p_entries and 'point_number' in p_entries:
+                p_name = parent.task_name
+                entries.extend([p_name + '_index', p_name + '_point_number'])
+            parent = parent.parent_task
+        indexes = database.get_entries_indexes(path, entries)
+        indexes = [indexes[e] for e in entries]
+
+        rate_entry = name + '_rate'
+        time_entry = name + '_iteration_time'
+        eta_entry = name + '_eta'
+        measure_eta_entry = name + '_measure_eta'
+
+        def updater(i, number):
+            iteration_time = stats.iteration_time
+            if iteration_time is None:
+                return
+            # Number of points of this loop remaining in the measure, the
+            # enclosing loops are visited from the innermost one.
+            remaining = number - i
+            remaining_loop = remaining
+            multiplier = number
+            progress = database.get_values_by_index(indexes)
+            for j in range(0, len(progress), 2):
+                index, p_number = progress[j], progress[j+1]
+                remaining += (p_number - index)*multiplier
+                multiplier *= p_number
+
+            database.set_values(path, {
+                rate_entry: stats.rate,
+                time_entry: iteration_time,
+                eta_entry: remaining_loop*iteration_time,
+                measure_eta_entry: remaining*iteration_time})
+
+        return updater
+
+    def _save_checkpoint(self, index, number):
+        """ Save the progress of the loop and the state of the database.
+
+        Parameters
+        ----------
+        index : int
+            Number of completed points.
+
+        number : int
+            Total number of points of the loop.
+
+        """
+        # Make sure the points are really completed.
+        if self._stage is not None:
+            self._stage.wait()
+
+        root = self.root_task
+        if root.writer is not None:
+            root.writer.wait()
+        files = {}
+        for path, file_object in root.files.snapshot().iteritems():
+            # The offsets in compressed streams do not match the size of the
+            # files, which cannot be truncated anyway, so only plain files and
+            # memory mapped arrays (whose number of rows is recorded) are
+            # resumed.
+            try:
+                if isinstance(file_object, file):
+                    if file_object.closed:
+                        files[path] = os.path.getsize(path)
+                    else:
+                        file_object.flush()
+                        files[path] = file_object.tell()
+                elif hasattr(file_object, 'rows'):
+                    file_object.flush()
+                    files[path] = file_object.rows
+            except Exception:
+                pass
+
+        entries = {}
+        for path, value in self.task_database.dump_values().iteritems():
+            if isinstance(value, numpy.generic):
+                value = value.item()
+            try:
+                json.dumps(value)
+            except (TypeError, ValueError):
+                continue
+            entries[path] = value
+
+        state = {'index': index, 'point_number': number, 'files': files,
+                 'entries': entries}
+        path = self.checkpoint_path()
+        try:
+            with open(path + '.tmp', 'wb') as f:
+                json.dump(state, f)
+            if os.path.isfile(path):
+                os.remove(path)
+            os.rename(path + '.tmp', path)
+        except Exception:
+            log = logging.getLogger(__name__)
+            log.exception('{} failed to save a checkpoint'
+                          .format(self.task_name))
+
+    def _load_checkpoint(self, number):
+        """ Restore the state saved in the last checkpoint.
+
+        Parameters
+        ----------
+        number : int
+            Number of points of the loop, used to check the checkpoint matches
+            the current loop.
+
+        Returns
+        -------
+        index : int
+            Number of points to skip.
+
+        """
+        path = self.checkpoint_path()
+        if not os.path.isfile(path):
+            return 0
+
+        log = logging.getLogger(__name__)
+        try:
+            with open(path, 'rb') as f:
+                state = json.load(f)
+        except Exception:
+            log.exception('{} failed to read the checkpoint'
+                          .format(self.task_name))
+            return 0
+
+        if state['point_number'] != number:
+            mes = '{} cannot resume : the number of points changed ({} != {})'
+            log.warning(mes.format(self.task_name, state['point_number'],
+                                   number))
+            return 0
+
+        self.task_database.load_values(state['entries'])
+        self.root_task.resumed_files = state['files']
+        log.info('{} resuming after point {}'.format(self.task_name,
+                                                     state['index']))
+        return state['index']
+
+    def _perform_loop(self, iterable):
+        """
+
+        """
+        root = self.root_task
+        for i, value in self._iterate(iterable):
 
             if handle_stop_pause(root):
                 return
@@ -105,10 +593,8 @@ class LoopTask(InterfaceableTaskMixin, ComplexTask):
         """
 
         """
-        self.write_in_database('point_number', len(iterable))
-
         root = self.root_task
-        for i, value in enumerate(iterable):
+        for i, value in self._iterate(iterable):
 
             if handle_stop_pause(root):
                 return
@@ -127,10 +613,8 @@ class LoopTask(InterfaceableTaskMixin, ComplexTask):
         """
 
         """
-        self.write_in_database('point_number', len(iterable))
-
         root = self.root_task
-        for i, value in enumerate(iterable):
+        for i, value in self._iterate(iterable):
 
             if handle_stop_pause(root):
                 return
@@ -153,10 +637,8 @@ class LoopTask(InterfaceableTaskMixin, ComplexTask):
         """
 
         """
-        self.write_in_database('point_number', len(iterable))
-
         root = self.root_task
-        for i, value in enumerate(iterable):
+        for i, value in self._iterate(iterable):
 
             if handle_stop_pause(root):
                 return
@@ -175,6 +657,58 @@ class LoopTask(InterfaceableTaskMixin, ComplexTask):
                 continue
             self.write_in_database('elapsed_time', default_timer()-tic)
 
+    def _perform_loop_pipelined(self, iterable):
+        """ Perform the loop, the last child tasks being run in a background
+        stage.
+
+        A BreakException raised in the background stage stops the loop as
+        soon as it is noticed, the points acquired after the one for which it
+        was raised are discarded without being processed (as the pending
+        points when a stage task fails). A BreakException raised by a
+        foreground task only stops the acquisition, the points already
+        acquired are processed.
+
+        """
+        split = len(self.children_task) - self.background_children
+        foreground = self.children_task[:split]
+        stage = PipelineStage(self, self.children_task[split:],
+                              self.pipeline_depth)
+        database = self.task_database
+        timing = self.timing
+
+        root = self.root_task
+        stage.start()
+        self._stage = stage
+        try:
+            for i, value in self._iterate(iterable):
+
+                if handle_stop_pause(root) or stage.broken or stage.failed:
+                    break
+
+                self.write_in_database('index', i+1)
+                tic = default_timer()
+                if self.task:
+                    self.task.perform_(self.task, value)
+                else:
+                    self.write_in_database('value', value)
+                try:
+                    for child in foreground:
+                        child.perform_(child)
+                except BreakException:
+                    break
+                except ContinueException:
+                    continue
+                finally:
+                    if timing:
+                        self.write_in_database('elapsed_time',
+                                               default_timer()-tic)
+
+                stage.submit(database.snapshot())
+
+        finally:
+            stage.close()
+            self._stage = None
+
     def _observe_task(self, change):
         """ Keep the database entries in sync with the task member.
 
@@ -201,6 +735,19 @@ class LoopTask(InterfaceableTaskMixin, ComplexTask):
             aux['value'] = 1.0
             self.task_database_entries = aux
 
+    def _observe_statistics(self, change):
+        """ Keep the database entries in sync with the statistics flag.
+
+        """
+        aux = self.task_database_entries.copy()
+        names = ('rate', 'iteration_time', 'eta', 'measure_eta')
+        if change['value']:
+            aux.update({n: 0.0 for n in names})
+        else:
+            for n in names:
+                aux.pop(n, None)
+        self.task_database_entries = aux
+
     def _observe_timing(self, change):
         """ Keep the database entries in sync with the timing flag.
 
@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : array_storage.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+"""
+"""
+import os
+import json
+import numpy as np
+from threading import Lock
+
+from .compressed_files import detect_compression, open_data_file
+
+
+class GrowingArray(object):
+    """ Structured array whose length is not known in advance.
+
+    Rows are stored in a buffer whose capacity is doubled each time it is
+    full so that appending is O(1) amortized and the unused memory never
+    exceeds the size of the stored data. When closed the buffer is trimmed to
+    the actual number of rows.
+
+    Parameters
+    ----------
+    dtype : numpy.dtype
+        Type of the rows.
+
+    capacity : int, optional
+        Initial capacity of the buffer.
+
+    on_close : callable, optional
+        Callable to which the trimmed array is passed when closing.
+
+    """
+
+    def __init__(self, dtype, capacity=64, on_close=None):
+        self.length = 0
+        self.closed = False
+        self.on_close = on_close
+        self._buffer = np.empty(max(capacity, 1), dtype=dtype)
+
+    @property
+    def capacity(self):
+        """ Number of rows which can be stored without reallocating.
+
+        """
+        return len(self._buffer)
+
+    @property
+    def view(self):
+        """ View of the stored rows (it does not copy the data).
+
+        """
+        return self._buffer[:self.length]
+
+    def append(self, row):
+        """ Append a row, growing the buffer if necessary.
+
+        """
+        if self.length == len(self._buffer):
+            buffer = np.empty(2*len(self._buffer), dtype=self._buffer.dtype)
+            buffer[:self.length] = self._buffer
+            self._buffer = buffer
+        self._buffer[self.length] = row
+        self.length += 1
+
+    def close(self):
+        """ Trim the buffer to the stored rows.
+
+        """
+        if not self.closed:
+            self._buffer = self._buffer[:self.length].copy()
+            self.closed = True
+            if self.on_close is not None:
+                self.on_close(self._buffer)
+
+
+class MappedArray(object):
+    """ Structured array stored in a .npy file mapped in memory.
+
+    The rows are written in place in the file so that the data already
+    acquired survive a crash of the process, and the file can be read using
+    numpy.load. The number of rows written is tracked by the writer so that
+    a resumed measure can reopen the file and go on after them.
+
+    Parameters
+    ----------
+    path : unicode
+        Path of the .npy file to create.
+
+    dtype : numpy.dtype
+        Type of the rows.
+
+    length : int
+        Number of rows to preallocate.
+
+    rows : int, optional
+        Number of rows already written in the file when resuming, in which
+        case the existing file is reopened instead of being overwritten.
+
+    Raises
+    ------
+    IOError :
+        If the file to resume does not exist.
+
+    ValueError :
+        If the file to resume does not match the type and length.
+
+    """
+
+    def __init__(self, path, dtype, length, rows=0):
+        self.path = path
+        self.closed = False
+        self.rows = rows
+        if not rows:
+            self.array = np.lib.format.open_memmap(path, mode='w+',
+                                                   dtype=dtype,
+                                                   shape=(length,))
+            return
+
+        if not os.path.isfile(path):
+            raise IOError('Cannot resume the missing array {}'.format(path))
+        self.array = np.lib.format.open_memmap(path, mode='r+')
+        if self.array.dtype != np.dtype(dtype) or\
+                self.array.shape != (length,) or rows > length:
+            raise ValueError('The array {} does not match the saved '
+                             'values'.format(path))
+
+    def flush(self):
+        """ Write the modified rows to the disk.
+
+        """
+        self.array.flush()
+
+    def close(self):
+        """ Flush the array, the memory map stays valid for reading.
+
+        """
+        if not self.closed:
+            self.flush()
+            self.closed = True
+
+
+class OrderedRows(object):
+    """ Thread-safe staging area releasing rows in the order of their index.
+
+    Rows can be pushed from several threads in any order, each row is passed
+    to the writing callable once all the rows of lower index have been. If a
+    row never arrives the following ones stay pending till the staging area
+    is drained (which happens when closing it).
+
+    Parameters
+    ----------
+    start : int, optional
+        Index of the first expected row.
+
+    on_close : callable, optional
+        Callable to which the staging area is passed when closing, it should
+        drain the pending rows.
+
+    """
+
+    #: Flag indicating to the root task that the object must be closed before
+    #: the files to which it writes.
+    staging = True
+
+    def __init__(self, start=0, on_close=None):
+        self.next_index = start
+        self.closed = False
+        self.on_close = on_close
+        self._pending = {}
+        self._lock = Lock()
+
+    def push(self, index, row, write):
+        """ Stage a row and write all the rows which are ready.
+
+        The writing happens under a lock so that the rows are written in
+        order even when released by different threads.
+
+        Parameters
+        ----------
+        index : int
+            Index of the row.
+
+        row : object
+            Row to write.
+
+        write : callable
+            Callable to which the rows are passed in order.
+
+        Returns
+        -------
+        written : int
+            Number of rows written during this call.
+
+        """
+        with self._lock:
+            if index < self.next_index or index in self._pending:
+                raise ValueError('Row {} has already been saved.'
+                                 .format(index))
+            self._pending[index] = row
+            written = 0
+            while self.next_index in self._pending:
+                write(self._pending.pop(self.next_index))
+                self.next_index += 1
+                written += 1
+            return written
+
+    def drain(self, write):
+        """ Write all the pending rows in order, skipping the missing ones.
+
+        Parameters
+        ----------
+        write : callable
+            Callable to which the rows are passed in order.
+
+        Returns
+        -------
+        missing : list(int)
+            Indexes of the rows which were never received.
+
+        """
+        with self._lock:
+            missing = []
+            for index in sorted(self._pending):
+                missing.extend(range(self.next_index, index))
+                write(self._pending.pop(index))
+                self.next_index = index + 1
+            return missing
+
+    def close(self):
+        """ Let the owner drain the pending rows.
+
+        """
+        if not self.closed:
+            self.closed = True
+            if self.on_close is not None:
+                self.on_close(self)
+
+    @property
+    def pending(self):
+        """ Number of rows waiting for rows of lower index.
+
+        """
+        return len(self._pending)
+
+
+def write_binary_schema(path, dtype, header=''):
+    """ Write the JSON sidecar describing a binary file of records.
+
+    Parameters
+    ----------
+    path : unicode
+        Path of the binary file, the sidecar is written next to it with an
+        additional .json extension.
+
+    dtype : numpy.dtype
+        Structured type of the records (fields should be little-endian).
+
+    header : str, optional
+        Free text describing the data.
+
+    """
+    schema = {'format': 'binary-records', 'header': header,
+              'columns': [[name, dtype.fields[name][0].str]
+                          for name in dtype.names]}
+    with open(path + '.json', 'wb') as f:
+        json.dump(schema, f)
+
+
+def load_binary_file(path):
+    """ Load a binary file of records using its JSON sidecar.
+
+    The file may have been written through a compressor.
+
+    Parameters
+    ----------
+    path : unicode
+        Path of the binary file.
+
+    Returns
+    -------
+    data : numpy.ndarray
+        Structured array holding the records.
+
+    header : unicode
+        Header stored in the sidecar.
+
+    """
+    with open(path + '.json', 'rb') as f:
+        schema = json.load(f)
+    dtype = np.dtype([(str(name), str(t)) for name, t in schema['columns']])
+    if detect_compression(path) is None:
+        return np.fromfile(path, dtype=dtype), schema['header']
+
+    with open_data_file(path) as f:
+        data = np.frombuffer(f.read(), dtype=dtype)
+    return data, schema['header']
@@ -7,12 +7,21 @@
 """
 """
 import logging
-from atom.api import (Enum, Str, set_default)
+from atom.api import (Enum, Str, Int, Float, Value, set_default)
 import numpy as np
 
 from ..base_tasks import SimpleTask
 
 
+def _base_array(array):
+    """ Get the array owning the memory of an array (or a view on it).
+
+    """
+    while isinstance(array.base, np.ndarray):
+        array = array.base
+    return array
+
+
 class ArrayExtremaTask(SimpleTask):
     """ Store the pair(s) of index/value for the extrema(s) of an array.
 
@@ -191,4 +200,199 @@ class ArrayFindValueTask(SimpleTask):
         return test, traceback
 
 
-KNOWN_PY_TASKS = [ArrayExtremaTask, ArrayFindValueTask]
+class ArrayStatisticsTask(SimpleTask):
+    """ Maintain the statistics of an array as rows are appended to it.
+
+    Only the rows added since the previous call are processed so that the
+    cost per point does not depend on the size of the array (the extrema
+    with their index, mean, variance and count being updated from the
+    statistics of the new rows). The statistics are reset when the task is
+    checked, when the number of valid rows decreases or when the array stored
+    in the database is replaced by a different one (for example when a new
+    array is started). Views on the same underlying array are considered to
+    be the same array.
+
+    Wait for any parallel operation before execution.
+
+    """
+    #: Name of the target in the database.
+    target_array = Str().tag(pref=True)
+
+    #: Name of the column on which to compute the statistics.
+    column_name = Str().tag(pref=True)
+
+    #: Formula giving the number of valid rows of the array, useful when the
+    #: array is preallocated. If empty all the rows are considered valid.
+    valid_rows = Str().tag(pref=True)
+
+    task_database_entries = set_default({'count': 0, 'mean': 0.0,
+                                         'variance': 0.0, 'min_ind': 0,
+                                         'min_value': 0.0, 'max_ind': 0,
+                                         'max_value': 0.0})
+
+    wait = set_default({'activated': True})  # Wait on all pools by default.
+
+    def perform(self):
+        """ Update the statistics with the new rows of the array.
+
+        """
+        array = self.get_from_database(self.target_array[1:-1])
+        source = _base_array(array)
+        if source is not self._source:
+            self._reset()
+            self._source = source
+        if self.column_name:
+            array = array[self.column_name]
+        if self.valid_rows:
+            length = int(self.format_and_eval_string(self.valid_rows))
+        else:
+            length = len(array)
+
+        if length < self._count:
+            self._reset()
+            self._source = source
+        start = self._count
+        if length > start:
+            self._update(array[start:length], start)
+
+        count = self._count
+        name = self.task_name
+        variance = self._m2/(count - 1) if count > 1 else 0.0
+        self.task_database.set_values(self.task_path,
+                                      {name + '_count': count,
+                                       name + '_mean': self._mean,
+                                       name + '_variance': variance,
+                                       name + '_min_ind': self._min_ind,
+                                       name + '_min_value': self._min,
+                                       name + '_max_ind': self._max_ind,
+                                       name + '_max_value': self._max})
+
+    def check(self, *args, **kwargs):
+        """ Check the target array can be found and has the right column.
+
+        """
+        test = True
+        traceback = {}
+        err_path = self.task_path + '/' + self.task_name
+        self._reset()
+
+        if self.valid_rows:
+            try:
+                self.format_and_eval_string(self.valid_rows)
+            except Exception as e:
+                traceback[err_path + '-rows'] = \
+                    'Failed to eval the number of valid rows : {}'.format(e)
+                test = False
+
+        array_entry = self.target_array[1:-1]
+        try:
+            array = self.get_from_database(array_entry)
+        except KeyError:
+            traceback[err_path + '-array'] = \
+                '''Invalid entry name for the target array'''
+            return False, traceback
+
+        if self.column_name:
+            if array.dtype.names:
+                if self.column_name not in array.dtype.names:
+                    traceback[err_path + '-column'] = \
+                        'No column named {} in array.'.format(self.column_name)
+                    return test, traceback
+            else:
+                test = False
+                traceback[err_path + '-column'] = \
+                    'Array has no named columns'
+                return test, traceback
+
+        else:
+            if array.dtype.names:
+                test = False
+                mess = 'Must provide a column name for rec arrays.'
+                traceback[err_path + '-column'] = mess
+                return test, traceback
+            elif len(array.shape) > 1:
+                test = False
+                mess = 'Must use 1d array when using non rec-arrays.'
+                traceback[err_path + '-dim'] = mess
+                return test, traceback
+
+        return test, traceback
+
+    # --- Private API ---------------------------------------------------------
+
+    #: Number of rows taken into account.
+    _count = Int()
+
+    #: Mean of the rows.
+    _mean = Float()
+
+    #: Sum of the squared deviations from the mean.
+    _m2 = Float()
+
+    #: Minimal value.
+    _min = Float()
+
+    #: Index of the minimal value.
+    _min_ind = Int()
+
+    #: Maximal value.
+    _max = Float()
+
+    #: Index of the maximal value.
+    _max_ind = Int()
+
+    #: Array whose rows were taken into account.
+    _source = Value()
+
+    def _reset(self):
+        """ Forget the statistics of the rows processed so far.
+
+        """
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._min = 0.0
+        self._min_ind = 0
+        self._max = 0.0
+        self._max_ind = 0
+        self._source = None
+
+    def _update(self, rows, start):
+        """ Merge the statistics of new rows with the current ones.
+
+        Parameters
+        ----------
+        rows : numpy.ndarray
+            New rows.
+
+        start : int
+            Index of the first new row in the array.
+
+        """
+        count = len(rows)
+        mean = float(np.mean(rows))
+        m2 = float(np.sum((rows - mean)**2))
+        min_ind = int(np.argmin(rows))
+        max_ind = int(np.argmax(rows))
+
+        if start == 0:
+            self._mean, self._m2 = mean, m2
+            self._min, self._min_ind = float(rows[min_ind]), min_ind
+            self._max, self._max_ind = float(rows[max_ind]), max_ind
+        else:
+            # Pairwise combination of the mean and squared deviations.
+            total = start + count
+            delta = mean - self._mean
+            self._mean += delta*count/total
+            self._m2 += m2 + delta**2*start*count/total
+            if rows[min_ind] < self._min:
+                self._min, self._min_ind = float(rows[min_ind]),\
+                    start + min_ind
+            if rows[max_ind] > self._max:
+                self._max, self._max_ind = float(rows[max_ind]),\
+                    start + max_ind
+
+        self._count = start + count
+
+
+KNOWN_PY_TASKS = [ArrayExtremaTask, ArrayFindValueTask, ArrayStatisticsTask]
@@ -0,0 +1,331 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : chunked_storage.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+"""
+"""
+import os
+import json
+import shutil
+import numpy as np
+
+from .sqlite_storage import _as_descr
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+
+def _check_row(name, dtype, shape, row):
+    """ Check that a row can be stored in a dataset without any loss.
+
+    Raises
+    ------
+    ValueError :
+        If the row does not have the shape of the rows of the dataset or if
+        its type cannot be safely cast to the type of the dataset.
+
+    """
+    if row.shape != shape:
+        raise ValueError('The rows of dataset {} must have the shape {}, '
+                         'got {}'.format(name, shape, row.shape))
+    if not np.can_cast(row.dtype, dtype, casting='safe'):
+        raise ValueError('The rows of dataset {} are of type {}, a row of '
+                         'type {} cannot be stored without loss'
+                         .format(name, dtype, row.dtype))
+
+
+def _as_dtype(descr):
+    """ Rebuild a type from the JSON decoded value of its descr attribute.
+
+    """
+    fields = _as_descr(descr)
+    # The descr of a simple type is a single field without name.
+    if len(fields) == 1 and not fields[0][0]:
+        return np.dtype(fields[0][1])
+    return np.dtype(fields)
+
+
+class HDF5Container(object):
+    """ Container storing the datasets in a HDF5 file.
+
+    The datasets are grown one chunk at a time and trimmed to their actual
+    length when the container is flushed or closed.
+
+    Parameters
+    ----------
+    path : unicode
+        Path of the file to create.
+
+    chunk_size : int
+        Number of rows per chunk.
+
+    """
+
+    def __init__(self, path, chunk_size):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.closed = False
+        self._file = h5py.File(path, 'w')
+        self._lengths = {}
+
+    def set_attribute(self, name, value):
+        """ Store a metadata.
+
+        """
+        self._file.attrs[name] = value
+
+    def append(self, name, row):
+        """ Append a row to a dataset, creating it if necessary.
+
+        Parameters
+        ----------
+        name : str
+            Name of the dataset.
+
+        row : numpy.ndarray
+            Row to append, all the rows of a dataset must have the same shape
+            and a type which can be safely cast to the one of the first row.
+
+        Raises
+        ------
+        ValueError :
+            If the row does not match the rows of the dataset.
+
+        """
+        f = self._file
+        if name not in f:
+            f.create_dataset(name, shape=(0,) + row.shape,
+                             maxshape=(None,) + row.shape,
+                             chunks=(self.chunk_size,) + row.shape,
+                             dtype=row.dtype)
+            self._lengths[name] = 0
+        dataset = f[name]
+        _check_row(name, dataset.dtype, dataset.shape[1:], row)
+        length = self._lengths[name]
+        if length == dataset.shape[0]:
+            dataset.resize(length + self.chunk_size, axis=0)
+        dataset[length] = row
+        self._lengths[name] = length + 1
+
+    def flush(self):
+        """ Trim the datasets and write the pending data to the disk.
+
+        """
+        for name, length in self._lengths.iteritems():
+            self._file[name].resize(length, axis=0)
+        self._file.flush()
+
+    def close(self):
+        """ Close the file.
+
+        """
+        if not self.closed:
+            self.flush()
+            self._file.close()
+            self.closed = True
+
+
+class NpyChunksContainer(object):
+    """ Container storing the datasets as chunks of .npy files.
+
+    The rows of a dataset are accumulated in memory and written to the disk
+    each time a chunk is complete (the last incomplete chunk is written when
+    closing or flushing the container).
+
+    Parameters
+    ----------
+    path : unicode
+        Path of the directory to create, an existing directory is emptied.
+
+    chunk_size : int
+        Number of rows per chunk.
+
+    """
+
+    def __init__(self, path, chunk_size):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.closed = False
+        self._attributes = {}
+        self._datasets = {}
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        os.makedirs(path)
+        self._write_metadata()
+
+    def set_attribute(self, name, value):
+        """ Store a metadata (must be JSON serializable).
+
+        """
+        self._attributes[name] = value
+        self._write_metadata()
+
+    def append(self, name, row):
+        """ Append a row to a dataset, creating it if necessary.
+
+        Parameters
+        ----------
+        name : str
+            Name of the dataset.
+
+        row : numpy.ndarray
+            Row to append, all the rows of a dataset must have the same shape
+            and a type which can be safely cast to the one of the first row.
+
+        Raises
+        ------
+        ValueError :
+            If the row does not match the rows of the dataset.
+
+        """
+        datasets = self._datasets
+        if name not in datasets:
+            folder = os.path.join(self.path, name)
+            os.mkdir(folder)
+            datasets[name] = {'buffer': np.empty((self.chunk_size,) +
+                                                 row.shape, dtype=row.dtype),
+                              'filled': 0, 'chunks': 0, 'saved': 0,
+                              'shape': list(row.shape),
+                              'dtype': row.dtype.descr}
+            self._write_metadata()
+
+        dataset = datasets[name]
+        buffer = dataset['buffer']
+        _check_row(name, buffer.dtype, buffer.shape[1:], row)
+        buffer[dataset['filled']] = row
+        dataset['filled'] += 1
+        if dataset['filled'] == self.chunk_size:
+            self._write_chunk(name)
+            dataset['chunks'] += 1
+            dataset['filled'] = 0
+            self._write_metadata()
+
+    def flush(self):
+        """ Write the incomplete chunks to the disk.
+
+        They will be rewritten once complete.
+
+        """
+        for name in self._datasets:
+            self._write_chunk(name)
+        self._write_metadata()
+
+    def close(self):
+        """ Write the pending data to the disk.
+
+        """
+        if not self.closed:
+            self.flush()
+            self.closed = True
+
+    # --- Private API ---------------------------------------------------------
+
+    def _write_chunk(self, name):
+        """ Write the current chunk of a dataset.
+
+        """
+        dataset = self._datasets[name]
+        if not dataset['filled']:
+            return
+        path = os.path.join(self.path, name,
+                            '{:06d}.npy'.format(dataset['chunks']))
+        np.save(path, dataset['buffer'][:dataset['filled']])
+        dataset['saved'] = dataset['chunks']*self.chunk_size +\
+            dataset['filled']
+
+    def _write_metadata(self):
+        """ Write the description of the container.
+
+        The length of a dataset is the number of its rows written to the
+        disk.
+
+        """
+        metadata = {'format': 'npy-chunks', 'chunk_size': self.chunk_size,
+                    'attributes': self._attributes,
+                    'datasets': {name: {'length': d['saved'],
+                                        'shape': d['shape'],
+                                        'dtype': d['dtype']}
+                                 for name, d in self._datasets.iteritems()}}
+        path = os.path.join(self.path, 'metadata.json')
+        with open(path + '.tmp', 'wb') as f:
+            json.dump(metadata, f)
+        if os.path.isfile(path):
+            os.remove(path)
+        os.rename(path + '.tmp', path)
+
+
+def open_container(path, chunk_size, backend='Auto'):
+    """ Create a new container.
+
+    Two formats are supported :
+    - HDF5 files (through h5py) in which each dataset is an extendable chunked
+      dataset and the metadata are stored as attributes of the file.
+    - a pure NumPy fallback used when h5py is not available : the container is
+      a directory holding a metadata.json file and for each dataset a
+      directory of .npy files each holding a chunk of rows.
+
+    Parameters
+    ----------
+    path : unicode
+        Path of the file (HDF5) or directory (NumPy) to create.
+
+    chunk_size : int
+        Number of rows per chunk.
+
+    backend : {'Auto', 'HDF5', 'NumPy'}
+        Format to use, 'Auto' uses HDF5 if h5py is available.
+
+    """
+    if backend == 'HDF5' or (backend == 'Auto' and h5py is not None):
+        if h5py is None:
+            raise ImportError('h5py is required to write HDF5 files.')
+        return HDF5Container(path, chunk_size)
+    return NpyChunksContainer(path, chunk_size)
+
+
+def load_container(path):
+    """ Load all the datasets and metadata of a container.
+
+    Parameters
+    ----------
+    path : unicode
+        Path of the HDF5 file or of the directory of a NumPy container.
+
+    Returns
+    -------
+    datasets : dict
+        Mapping between the datasets names and their content.
+
+    attributes : dict
+        Metadata of the container.
+
+    """
+    if os.path.isdir(path):
+        with open(os.path.join(path, 'metadata.json'), 'rb') as f:
+            metadata = json.load(f)
+        chunk_size = metadata['chunk_size']
+        datasets = {}
+        for name, infos in metadata['datasets'].iteritems():
+            # Only the rows recorded in the metadata are read, a chunk being
+            # written can hold more rows.
+            length = infos['length']
+            folder = os.path.join(path, name)
+            chunks = [np.load(os.path.join(folder, '{:06d}.npy'.format(i)))
+                      for i in range(-(-length // chunk_size))]
+            if chunks:
+                datasets[name] = np.concatenate(chunks)[:length]
+            else:
+                datasets[name] = np.empty([0] + infos['shape'],
+                                          dtype=_as_dtype(infos['dtype']))
+        return datasets, metadata['attributes']
+
+    if h5py is None:
+        raise ImportError('h5py is required to read HDF5 files.')
+    with h5py.File(path, 'r') as f:
+        datasets = {name: f[name][...] for name in f}
+        attributes = dict(f.attrs)
+    return datasets, attributes
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : compressed_files.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+"""
+"""
+import gzip
+import bz2
+
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
+
+#: Extension appended to the name of the files for each compression.
+EXTENSIONS = {'gzip': '.gz', 'bz2': '.bz2', 'lzma': '.xz'}
+
+#: Leading bytes identifying the compressed files.
+MAGIC_NUMBERS = (('\x1f\x8b', 'gzip'), ('BZh', 'bz2'),
+                 ('\xfd7zXZ\x00', 'lzma'))
+
+
+class _BZ2File(bz2.BZ2File):
+    """ BZ2File which can be used as a regular file by the save tasks.
+
+    The Python 2 BZ2File lacks a flush method, as the bz2 compressor cannot
+    be flushed without ending the stream, the data are only written when
+    a block is complete or when the file is closed.
+
+    """
+
+    def flush(self):
+        pass
+
+
+def compression_available(compression):
+    """ Check whether a compression can be used.
+
+    lzma is only part of the standard library from Python 3.3 and requires
+    the backports.lzma package otherwise.
+
+    """
+    return compression != 'lzma' or lzma is not None
+
+
+def compressed_path(path, compression):
+    """ Append the extension of the compression to a path if missing.
+
+    """
+    ext = EXTENSIONS.get(compression)
+    if ext and not path.endswith(ext):
+        return path + ext
+    return path
+
+
+def open_compressed(path, mode, compression, level=6):
+    """ Open a file writing through a streaming compressor.
+
+    Parameters
+    ----------
+    path : unicode
+        Path of the file.
+
+    mode : {'wb', 'ab'}
+        Opening mode, bz2 files cannot be appended to.
+
+    compression : {'gzip', 'bz2', 'lzma'}
+        Compression algorithm.
+
+    level : int, optional
+        Compression level (1 fastest, 9 smallest).
+
+    """
+    if compression == 'gzip':
+        return gzip.GzipFile(path, mode, compresslevel=level)
+    elif compression == 'bz2':
+        if mode.startswith('a'):
+            raise IOError('Cannot append to a bz2 file.')
+        return _BZ2File(path, mode, compresslevel=level)
+    elif compression == 'lzma':
+        if lzma is None:
+            raise IOError('lzma compression requires backports.lzma.')
+        return lzma.LZMAFile(path, mode, preset=level)
+    raise ValueError('Unknown compression {}'.format(compression))
+
+
+def detect_compression(path):
+    """ Identify the compression of a file from its first bytes.
+
+    Returns
+    -------
+    compression : str or None
+        Name of the compression or None if the file is not compressed.
+
+    """
+    with open(path, 'rb') as f:
+        start = f.read(6)
+    for magic, compression in MAGIC_NUMBERS:
+        if start.startswith(magic):
+            return compression
+    return None
+
+
+def open_data_file(path):
+    """ Open a file for reading, decompressing it transparently.
+
+    """
+    compression = detect_compression(path)
+    if compression is None:
+        return open(path, 'rb')
+    if compression == 'gzip':
+        return gzip.GzipFile(path, 'rb')
+    elif compression == 'bz2':
+        return bz2.BZ2File(path, 'rb')
+    if lzma is None:
+        raise IOError('Reading lzma files requires backports.lzma.')
+    return lzma.LZMAFile(path, 'rb')
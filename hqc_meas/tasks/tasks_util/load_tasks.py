@@ -6,13 +6,17 @@
 # =============================================================================
 """
 """
-from atom.api import (Bool, Str, Unicode, List, set_default)
+from atom.api import (Bool, Str, Unicode, List, Enum, set_default)
 import numpy as np
 from inspect import cleandoc
+from collections import OrderedDict
+from threading import Lock
+from numpy.lib._iotools import NameValidator
 import os
 
 from ..base_tasks import SimpleTask
 from ..task_interface import InterfaceableTaskMixin, TaskInterface
+from .compressed_files import open_data_file
 
 
 def _make_array(names, dtypes='f8'):
@@ -23,6 +27,86 @@ def _make_array(names, dtypes='f8'):
     return np.ones((5,), dtype=dtype)
 
 
+def _column_names(line, delimiter):
+    """ Extract the column names from a header line.
+
+    The names are sanitised as numpy.genfromtxt does (ex: 'Freq (Hz)' becomes
+    'Freq_Hz') so that they do not depend on the parser used.
+
+    """
+    names = [n.strip() for n in line.split(delimiter)]
+    return list(NameValidator()([n for n in names if n]))
+
+
+class LoadCache(object):
+    """ Cache of the arrays loaded from the disk.
+
+    Entries are identified by the path of the file, its modification time and
+    its size, and the options used to load it so that a modified file is
+    always reloaded. The least recently used entries are discarded once the
+    maximal number of entries is reached. Cached arrays are made read-only as
+    they are shared between all the tasks loading the same file. Arrays mapped
+    in memory are never cached as mapping is cheap and copy-on-write maps
+    must stay writable and private to each task.
+
+    Parameters
+    ----------
+    size : int, optional
+        Maximal number of arrays to keep.
+
+    """
+
+    def __init__(self, size=8):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+    def load(self, path, options, loader):
+        """ Get the content of a file, loading it only if necessary.
+
+        Parameters
+        ----------
+        path : unicode
+            Path of the file to load.
+
+        options : tuple
+            Hashable options affecting the result of the loader.
+
+        loader : callable
+            Callable taking the path as argument and returning the array.
+
+        """
+        stat = os.stat(path)
+        key = (path, stat.st_mtime, stat.st_size, options)
+        with self._lock:
+            if key in self._entries:
+                data = self._entries.pop(key)
+                self._entries[key] = data
+                return data
+
+        data = loader(path)
+        if isinstance(data, np.memmap):
+            return data
+        if isinstance(data, np.ndarray):
+            data.flags.writeable = False
+        with self._lock:
+            self._entries[key] = data
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+        return data
+
+    def clear(self):
+        """ Discard all the cached arrays.
+
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+#: Cache shared by all the LoadArrayTask.
+LOAD_CACHE = LoadCache()
+
+
 class LoadArrayTask(InterfaceableTaskMixin, SimpleTask):
     """ Load an array from the disc into the database.
 
@@ -36,6 +120,10 @@ class LoadArrayTask(InterfaceableTaskMixin, SimpleTask):
     #: Kind of file to load.
     selected_format = Str().tag(pref=True)
 
+    #: Whether or not to reuse the array loaded previously if the file has
+    #: not changed since. Cached arrays are read-only.
+    use_cache = Bool(False).tag(pref=True)
+
     task_database_entries = set_default({'array': _make_array(['var1',
                                                                'var2'])})
 
@@ -71,6 +159,25 @@ class LoadArrayTask(InterfaceableTaskMixin, SimpleTask):
 
         return test, traceback
 
+    def load(self, options, loader):
+        """ Load the selected file, using the cache if allowed.
+
+        Parameters
+        ----------
+        options : tuple
+            Hashable options affecting the result of the loader.
+
+        loader : callable
+            Callable taking the path as argument and returning the array.
+
+        """
+        folder = self.format_string(self.folder)
+        filename = self.format_string(self.filename)
+        full_path = os.path.join(folder, filename)
+        if self.use_cache:
+            return LOAD_CACHE.load(full_path, options, loader)
+        return loader(full_path)
+
 
 KNOWN_PY_TASKS = [LoadArrayTask]
 
@@ -99,24 +206,45 @@ class CSVLoadInterface(TaskInterface):
     def perform(self):
         """
         """
-        task = self.task
-        folder = task.format_string(task.folder)
-        filename = task.format_string(task.filename)
-        full_path = os.path.join(folder, filename)
+        options = (self.delimiter, self.comments, self.names)
+        data = self.task.load(options, self.load_file)
+        self.task.write_in_database('array', data)
 
-        comment_lines = 0
-        with open(full_path) as f:
-            while True:
-                if f.readline().startswith(self.comments):
-                    comment_lines += 1
-                else:
-                    break
+    def load_file(self, path):
+        """ Parse a file.
 
-        data = np.genfromtxt(full_path, comments=self.comments,
-                             delimiter=self.delimiter, names=self.names,
-                             skip_header=comment_lines)
+        The file is first parsed using numpy.loadtxt, assuming all the values
+        are floats, and numpy.genfromtxt (much slower but handling missing
+        values) is used as a fallback.
 
-        task.write_in_database('array', data)
+        """
+        # Compressed files are decompressed transparently.
+        with open_data_file(path) as f:
+            comment_lines = 0
+            line = f.readline()
+            while line.startswith(self.comments):
+                comment_lines += 1
+                line = f.readline()
+
+            try:
+                if self.names:
+                    names = _column_names(line, self.delimiter)
+                    dtype = [(str(n), 'f8') for n in names]
+                    data = np.loadtxt(f, dtype=dtype, comments=self.comments,
+                                      delimiter=self.delimiter, ndmin=1)
+                else:
+                    f.seek(0)
+                    data = np.loadtxt(f, comments=self.comments,
+                                      delimiter=self.delimiter,
+                                      skiprows=comment_lines)
+                return data
+            except ValueError:
+                pass
+
+        with open_data_file(path) as f:
+            return np.genfromtxt(f, comments=self.comments,
+                                 delimiter=self.delimiter, names=self.names,
+                                 skip_header=comment_lines)
 
     def check(self, *args, **kwargs):
         """
@@ -134,12 +262,11 @@ class CSVLoadInterface(TaskInterface):
         full_path = os.path.join(full_folder_path, filename)
 
         if os.path.isfile(full_path):
-            with open(full_path) as f:
+            with open_data_file(full_path) as f:
                 while True:
                     line = f.readline()
                     if not line.startswith(self.comments):
-                        names = line.split(self.delimiter)
-                        names = [n.strip() for n in names if n]
+                        names = _column_names(line, self.delimiter)
                         self.task.write_in_database('array',
                                                     _make_array(names))
                         break
@@ -153,4 +280,56 @@ class CSVLoadInterface(TaskInterface):
         if change['value']:
             self.task.write_in_database('array', _make_array(change['value']))
 
-INTERFACES = {'LoadArrayTask': [CSVLoadInterface]}
+
+class NPYLoadInterface(TaskInterface):
+    """ Load an array stored in the native numpy format (.npy).
+
+    """
+    #: Mode in which to map the file in memory rather than reading it.
+    #: 'r' is read-only, 'c' allows to modify the array without affecting
+    #: the file.
+    mmap_mode = Enum('None', 'r', 'c').tag(pref=True)
+
+    #: Class attr used in the UI.
+    file_formats = ['NPY']
+
+    has_view = True
+
+    def perform(self):
+        """
+        """
+        data = self.task.load((self.mmap_mode,), self.load_file)
+        self.task.write_in_database('array', data)
+
+    def load_file(self, path):
+        """ Load a .npy file.
+
+        """
+        mmap_mode = None if self.mmap_mode == 'None' else self.mmap_mode
+        return np.load(path, mmap_mode=mmap_mode)
+
+    def check(self, *args, **kwargs):
+        """
+        """
+        task = self.task
+        try:
+            full_folder_path = task.format_string(task.folder)
+            filename = task.format_string(task.filename)
+        except Exception:
+            return True, {}
+
+        full_path = os.path.join(full_folder_path, filename)
+
+        if os.path.isfile(full_path):
+            try:
+                # Only the header is read when mapping the file.
+                array = np.load(full_path, mmap_mode='r')
+            except Exception as e:
+                err_path = task.task_path + '/' + task.task_name
+                mess = 'Failed to read the .npy file : {}'.format(e)
+                return False, {err_path + '-npy': mess}
+            task.write_in_database('array', np.ones((5,), array.dtype))
+
+        return True, {}
+
+INTERFACES = {'LoadArrayTask': [CSVLoadInterface, NPYLoadInterface]}
@@ -6,22 +6,297 @@
 # =============================================================================
 """
 """
-from atom.api import (Tuple, ContainerList, Str, Enum, Value,
-                      Bool, Int, observe, set_default, Unicode)
+from atom.api import (Atom, Tuple, ContainerList, Str, Enum, Value,
+                      Bool, Int, Float, observe, set_default, Unicode)
 import os
 import errno
+import time
 import numpy
+import sqlite3
 import logging
 from inspect import cleandoc
+from threading import Lock
+from timeit import default_timer
 
 from ..base_tasks import SimpleTask
+from .chunked_storage import open_container, h5py
+from .sqlite_storage import (PointLog, TABLE_NAME, RESERVED_COLUMNS,
+                             table_columns)
+from .array_storage import (GrowingArray, MappedArray, OrderedRows,
+                            write_binary_schema)
+from .compressed_files import (compressed_path, compression_available,
+                               open_compressed)
 
 
-class SaveTask(SimpleTask):
+def open_save_file(root, path, mode):
+    """ Open a file in which to save data, taking a resumed measure into
+    account.
+
+    If the root task indicates the file was being written when the checkpoint
+    of a resumed measure was saved, the file is truncated to its size at that
+    time and opened for appending.
+
+    Parameters
+    ----------
+    root : RootTask
+        Root task of the hierarchy.
+
+    path : unicode
+        Path of the file to open.
+
+    mode : str
+        Mode in which to open the file if no resuming is needed.
+
+    Returns
+    -------
+    file_object : file
+        Opened file object.
+
+    resumed : bool
+        Whether or not the file has been opened to resume writing.
+
+    """
+    size = root.resumed_files.pop(path, None)
+    if size is None or not os.path.isfile(path):
+        return open(path, mode), False
+
+    file_object = open(path, 'r+b')
+    file_object.truncate(size)
+    file_object.seek(0, os.SEEK_END)
+    return file_object, True
+
+
+def _read_data_lines(path):
+    """ Read the data lines of a file written by a save task.
+
+    """
+    with open(path, 'rb') as f:
+        lines = [l for l in f if l.strip() and not l.startswith('#')]
+    # The first line holds the labels.
+    return lines[1:]
+
+
+def _parse_line(line, dtype):
+    """ Convert a line written by a save task to a row of the given type.
+
+    """
+    row = []
+    for string, name in zip(line.rstrip('\r\n').split('\t'), dtype.names):
+        kind = dtype[name].kind
+        if kind == 'c':
+            row.append(complex(string))
+        elif kind == 'b':
+            row.append(string == 'True')
+        elif kind in 'iu':
+            row.append(int(float(string)))
+        elif kind in 'SUa':
+            row.append(string)
+        else:
+            row.append(float(string))
+    return tuple(row)
+
+
+def _scalar_type(value):
+    """ Type used to store a scalar in a binary file.
+
+    Python numbers are stored as double precision values (as in text files)
+    whatever the type of the first saved value.
+
+    """
+    if isinstance(value, complex):
+        return numpy.dtype('c16')
+    if isinstance(value, (int, long, float)) and not isinstance(value, bool):
+        return numpy.dtype('f8')
+    return numpy.asarray(value).dtype
+
+
+def _checkpointed(task):
+    """ Check whether a loop enclosing a task saves checkpoints.
+
+    """
+    root = task.root_task
+    parent = task.parent_task
+    # The root task is its own parent.
+    while parent is not None and parent is not root:
+        if getattr(parent, 'checkpoint', False):
+            return True
+        parent = parent.parent_task
+    return False
+
+
+class FileWritingMixin(Atom):
+    """ Mixin class for tasks writing lines to a file controlling how often
+    the file is flushed and in which thread the lines are written.
+
+    Flushing after each line ensures no data is lost if the program crashes
+    but costs a system call (and on networked storage often a round trip) per
+    line. The file is in any case flushed when it is closed which always
+    happens at the end of the measure (even on failure) as the file is
+    registered in the files of the root task.
+
+    When writing in the background the values are evaluated by the task but
+    formatted and written by the background writer of the root task. The
+    pending lines are written before the files are closed at the end of the
+    measure.
+
+    The file can be written through a streaming compressor (the matching
+    extension is appended to its name), in which case the writing always
+    happens in the background writer. Note that flushing a compressed stream
+    degrades the compression ratio. Compressed files cannot be resumed, hence
+    compression cannot be used inside a loop saving checkpoints.
+
+    """
+    #: When to flush the written lines to the disk.
+    flush_policy = Enum('Every line', 'Every N lines', 'Every T seconds',
+                        'At close').tag(pref=True)
+
+    #: Number of lines between two flushes ('Every N lines' policy).
+    flush_lines = Int(100).tag(pref=True)
+
+    #: Time in seconds between two flushes ('Every T seconds' policy).
+    flush_interval = Float(1.0).tag(pref=True)
+
+    #: Flag indicating whether or not to format and write the lines in the
+    #: background writer thread.
+    background_writing = Bool().tag(pref=True)
+
+    #: Compression algorithm through which to write the file.
+    compression = Enum('None', 'gzip', 'bz2', 'lzma').tag(pref=True)
+
+    #: Compression level (1 fastest, 9 smallest).
+    compression_level = Int(6).tag(pref=True)
+
+    # --- Private API ---------------------------------------------------------
+
+    #: Number of lines written since the last flush.
+    _unflushed = Int()
+
+    #: Time of the last flush.
+    _last_flush = Float()
+
+    def _reset_flush(self):
+        """ Reset the flush counters, to call when opening the file.
+
+        """
+        self._unflushed = 0
+        self._last_flush = default_timer()
+
+    def _lines_written(self, file_object, number=1):
+        """ Flush the file if required by the policy.
+
+        Parameters
+        ----------
+        file_object : file
+            File to which the lines have been written.
+
+        number : int, optional
+            Number of lines which have just been written.
+
+        """
+        policy = self.flush_policy
+        if policy == 'Every line':
+            file_object.flush()
+        elif policy == 'Every N lines':
+            self._unflushed += number
+            if self._unflushed >= self.flush_lines:
+                file_object.flush()
+                self._unflushed = 0
+        elif policy == 'Every T seconds':
+            now = default_timer()
+            if now - self._last_flush >= self.flush_interval:
+                file_object.flush()
+                self._last_flush = now
+
+    def _writer(self):
+        """ Get the background writer to use if any.
+
+        """
+        if self.background_writing or self.compression != 'None':
+            return self.root_task.writer
+        return None
+
+    def _file_path(self, path):
+        """ Path of the file actually written, given the compression.
+
+        """
+        return compressed_path(path, self.compression)
+
+    def _open_file(self, path, mode):
+        """ Open the file to write, through a compressor if requested.
+
+        Returns
+        -------
+        file_object : file
+            Opened file object.
+
+        resumed : bool
+            Whether or not the file has been opened to resume writing.
+
+        """
+        if self.compression == 'None':
+            return open_save_file(self.root_task, path, mode)
+
+        if self.root_task.resumed_files.pop(path, None) is not None:
+            raise IOError('Cannot resume writing a compressed file.')
+        return open_compressed(path, mode, self.compression,
+                               self.compression_level), False
+
+    def _check_compression(self, err_path, traceback):
+        """ Check that the selected compression can be used.
+
+        """
+        if not compression_available(self.compression):
+            traceback[err_path + '-compression'] = \
+                'The {} compression is not available.'.format(self.compression)
+            return False
+        if self.compression != 'None' and self._checkpointed():
+            traceback[err_path + '-compression'] = cleandoc('''Compressed files
+                cannot be resumed, disable the checkpoints of the enclosing
+                loops.''')
+            return False
+        if self.compression == 'bz2' and getattr(self, 'file_mode',
+                                                 'New') == 'Add':
+            traceback[err_path + '-compression'] = \
+                'Cannot append to a bz2 file.'
+            return False
+        if not 1 <= self.compression_level <= 9:
+            traceback[err_path + '-compression'] = \
+                'The compression level must be between 1 and 9.'
+            return False
+        return True
+
+    def _checkpointed(self):
+        """ Check whether an enclosing loop saves checkpoints.
+
+        """
+        return _checkpointed(self)
+
+    def _submit(self, operation, *args):
+        """ Perform a writing operation, in the background if requested.
+
+        When the measure is not run by the root task no background writer
+        exists and the operation is performed immediately.
+
+        """
+        writer = self._writer()
+        if writer is not None:
+            writer.submit(operation, *args)
+        else:
+            operation(*args)
+
+
+class SaveTask(FileWritingMixin, SimpleTask):
     """ Save the specified entries either in a CSV file or an array. The file
     is closed when the line number is reached.
 
-    Wait for any parallel operation before execution.
+    Wait for any parallel operation before execution, unless concurrent
+    saving is enabled. In that case the task can be performed from several
+    threads (typically at the end of complex tasks running in parallel
+    pools) and each call provides the index of its row through the
+    row_index formula. The rows are written in the order of their index,
+    whatever the order in which they are received. The rows still waiting
+    for a missing row at the end of the measure are saved when the files are
+    closed.
 
     Notes
     -----
@@ -49,18 +324,43 @@ class SaveTask(SimpleTask):
     #: Numpy array in which data are stored (Array mode)
     array = Value()  # Array
 
-    #: Size of the data to be saved. (Evaluated at runtime)
+    #: Size of the data to be saved. (Evaluated at runtime) If empty the
+    #: array grows as needed and is trimmed at the end of the measure.
     array_size = Str().tag(pref=True)
 
     #: Computed size of the data (post evaluation)
     array_length = Int()
 
+    #: Whether or not to store the array in a .npy file (named after the task
+    #: in the default path) mapped in memory rather than in RAM. A size must
+    #: be provided.
+    memory_mapped = Bool().tag(pref=True)
+
     #: Index of the current line.
     line_index = Int(0)
 
     #: List of values to be saved store as (label, value).
     saved_values = ContainerList(Tuple()).tag(pref=True)
 
+    #: Types of the columns of the array given as comma separated
+    #: 'label: type' pairs (ex: 'index: i4, trace: c8'). The type of the
+    #: other columns is f8 or inferred from the first saved values.
+    column_types = Str().tag(pref=True)
+
+    #: Whether or not to use the type of the first saved values for the
+    #: columns whose type is not specified (Python numbers being stored as
+    #: double precision values). A later value which cannot be stored in its
+    #: column without loss stops the measure.
+    infer_types = Bool(False).tag(pref=True)
+
+    #: Whether or not the task can be performed simultaneously from several
+    #: threads, in which case it does not wait on the pools.
+    concurrent = Bool().tag(pref=True)
+
+    #: Formula giving the index (starting at 0) of the saved row, used to
+    #: order the rows when saving concurrently.
+    row_index = Str().tag(pref=True)
+
     #: Flag indicating whether or not initialisation has been performed.
     initialized = Bool(False)
 
@@ -68,73 +368,86 @@ class SaveTask(SimpleTask):
 
     wait = set_default({'activated': True})  # Wait on all pools by default.
 
-    def perform(self):
-        """ Collect all data and write them to array or file according to mode.
+    #: Lock protecting the initialisation when saving concurrently.
+    _lock = Value(factory=Lock)
 
-        On first call initialise the system by opening file and/or array. Close
-        file when the expected number of lines has been written.
+    #: Rows waiting for the rows of lower index when saving concurrently.
+    _ordered_rows = Value()
 
-        """
-        # Initialisation.
-        if not self.initialized:
+    #: Storage used when the size of the array is unknown.
+    _growing = Value()
+
+    #: Storage used when the array is mapped in memory.
+    _mapped = Value()
+
+    def array_type(self, values):
+        """ Build the type of the array rows.
+
+        Parameters
+        ----------
+        values : list
+            Values of the first row used to infer the type of the columns.
+
+        Raises
+        ------
+        ValueError :
+            If the column types cannot be parsed.
+
+        TypeError :
+            If a column type is not a valid numpy type.
 
-            self.line_index = 0
-            size_str = self.array_size
-            if size_str:
-                self.array_length = self.format_and_eval_string(size_str)
+        """
+        declared = {}
+        for column in self.column_types.split(','):
+            if column.strip():
+                label, type_str = column.split(':')
+                declared[label.strip()] = numpy.dtype(type_str.strip())
+
+        types = []
+        for (label, _), value in zip(self.saved_values, values):
+            if label in declared:
+                types.append((str(label), declared[label]))
+            elif self.infer_types:
+                types.append((str(label), _scalar_type(value)))
             else:
-                self.array_length = -1
+                types.append((str(label), numpy.dtype('f8')))
+        return numpy.dtype(types)
 
-            if self.saving_target != 'Array':
-                full_folder_path = self.format_string(self.folder)
-                filename = self.format_string(self.filename)
-                full_path = os.path.join(full_folder_path, filename)
-                mode = 'wb' if self.file_mode == 'New' else 'ab'
-
-                try:
-                    self.file_object = open(full_path, mode)
-                except IOError as e:
-                    log = logging.getLogger()
-                    mes = cleandoc('''In {}, failed to open the specified
-                                    file {}'''.format(self.task_name, e))
-                    log.error(mes)
-                    self.root_task.should_stop.set()
-
-                self.root_task.files[full_path] = self.file_object
-                if self.header:
-                    for line in self.header.split('\n'):
-                        self.file_object.write('# ' + line + '\n')
-                labels = [s[0] for s in self.saved_values]
-                self.file_object.write('\t'.join(labels) + '\n')
-                self.file_object.flush()
+    def memmap_path(self):
+        """ Path of the file in which to store a memory mapped array.
 
-            if self.saving_target != 'File':
-                # TODO add more flexibilty on the dtype (possible complex
-                # values)
-                array_type = numpy.dtype([(str(s[0]), 'f8')
-                                          for s in self.saved_values])
-                self.array = numpy.empty((self.array_length),
-                                         dtype=array_type)
-                self.write_in_database('array', self.array)
-            self.initialized = True
+        """
+        return os.path.join(self.get_from_database('default_path'),
+                            self.task_name + '.npy')
 
-        # Writing
+    def perform(self):
+        """ Collect all data and write them to array or file according to mode.
+
+        On first call initialise the system by opening file and/or array. Close
+        file when the expected number of lines has been written.
+
+        """
         values = [self.format_and_eval_string(s[1])
                   for s in self.saved_values]
-        if self.saving_target != 'Array':
-            self.file_object.write('\t'.join([str(val)
-                                              for val in values]) + '\n')
-            self.file_object.flush()
-        if self.saving_target != 'File':
-            self.array[self.line_index] = tuple(values)
-
-        self.line_index += 1
 
-        # Closing
-        if self.line_index == self.array_length:
-            if self.file_object:
-                self.file_object.close()
-            self.initialized = False
+        if self.concurrent:
+            index = self.format_and_eval_string(self.row_index)
+            with self._lock:
+                if not self.initialized:
+                    if not self._initialize(values):
+                        return
+                    self._ordered_rows = OrderedRows(self.line_index,
+                                                     self._rows_closed)
+                    rows_id = self.task_path + '/' + self.task_name + '-rows'
+                    self.root_task.files[rows_id] = self._ordered_rows
+            if self._check_row(values):
+                self._ordered_rows.push(index, values, self._save_row)
+            return
+
+        if not self.initialized and not self._initialize(values):
+            return
+        if self._check_row(values):
+            self._save_row(values)
 
     def check(self, *args, **kwargs):
         """
@@ -156,7 +469,11 @@ class SaveTask(SimpleTask):
                 traceback[err_path] = mess.format(e)
                 return False, traceback
 
-            full_path = os.path.join(full_folder_path, filename)
+            if not self._check_compression(err_path, traceback):
+                return False, traceback
+
+            full_path = self._file_path(os.path.join(full_folder_path,
+                                                     filename))
 
             overwrite = False
             if self.file_mode == 'New' and os.path.isfile(full_path):
@@ -183,28 +500,64 @@ class SaveTask(SimpleTask):
                 traceback[err_path] = mess.format(e)
                 return False, traceback
 
-        elif self.saving_target != 'File':
-            traceback[err_path] = 'A size for the array must be provided.'
+        if self.memory_mapped and self.saving_target != 'File':
+            if not self.array_size:
+                traceback[err_path] = cleandoc('''A size for the array must be
+                    provided to map it in memory.''')
+                return False, traceback
+
+            if os.path.isfile(self.memmap_path()):
+                traceback[err_path + '-memmap'] = \
+                    cleandoc('''Array file already exists, running the measure
+                    will override it.''')
+
+        if self.saving_target == 'Array' and not self.memory_mapped and\
+                self._checkpointed():
+            traceback[err_path + '-checkpoint'] = cleandoc('''An array held in
+                memory cannot be resumed, save the data to a file or map the
+                array in memory to use checkpoints.''')
             return False, traceback
 
+        if self.concurrent:
+            try:
+                self.format_and_eval_string(self.row_index)
+            except Exception as e:
+                mess = 'Failed to compute the row index: {}'
+                traceback[err_path + '-index'] = mess.format(e)
+                return False, traceback
+
         test = True
+        values = []
         for i, s in enumerate(self.saved_values):
             try:
-                self.format_and_eval_string(s[1])
+                values.append(self.format_and_eval_string(s[1]))
             except Exception as e:
+                values.append(0.0)
                 traceback[err_path + '-entry' + str(i)] = \
                     'Failed to evaluate entry {}: {}'.format(s[0], e)
                 test = False
 
         if self.saving_target != 'File':
-            data = [numpy.array([0.0, 1.0]) for s in self.saved_values]
-            names = str(','.join([s[0] for s in self.saved_values]))
-            final_arr = numpy.rec.fromarrays(data, names=names)
+            try:
+                array_type = self.array_type(values)
+            except Exception as e:
+                mess = 'Failed to interpret the column types : {}'
+                traceback[err_path + '-types'] = mess.format(e)
+                return False, traceback
 
-            self.write_in_database('array', final_arr)
+            self.write_in_database('array', numpy.ones(2, dtype=array_type))
 
         return test, traceback
 
+    def _observe_concurrent(self, change):
+        """ Stop waiting on the pools when saving concurrently.
+
+        """
+        if change['value']:
+            self.wait = {'activated': False}
+        elif change['type'] == 'update':
+            self.wait = {'activated': True}
+
     @observe('saving_target')
     def _update_database_entries(self, change):
         """
@@ -215,12 +568,218 @@ class SaveTask(SimpleTask):
         else:
             self.task_database_entries = {}
 
+    def _initialize(self, values):
+        """ Open the file and/or create the array.
+
+        Parameters
+        ----------
+        values : list
+            Values of the first row used to infer the type of the columns.
 
-class SaveFileTask(SimpleTask):
+        Returns
+        -------
+        success : bool
+            Whether or not the initialisation succeeded, if not the measure
+            is asked to stop.
+
+        """
+        # Make sure a previous file with the same name has been closed.
+        writer = self._writer()
+        if writer is not None:
+            writer.wait()
+
+        self.line_index = 0
+        size_str = self.array_size
+        if size_str:
+            self.array_length = self.format_and_eval_string(size_str)
+        else:
+            self.array_length = -1
+
+        if self.saving_target != 'Array':
+            full_folder_path = self.format_string(self.folder)
+            filename = self.format_string(self.filename)
+            full_path = self._file_path(os.path.join(full_folder_path,
+                                                     filename))
+            mode = 'wb' if self.file_mode == 'New' else 'ab'
+
+            resumed = False
+            try:
+                self.file_object, resumed = \
+                    self._open_file(full_path, mode)
+            except IOError as e:
+                log = logging.getLogger()
+                mes = cleandoc('''In {}, failed to open the specified
+                                file {}'''.format(self.task_name, e))
+                log.error(mes)
+                self.root_task.should_stop.set()
+                return False
+
+            self.root_task.files[full_path] = self.file_object
+            if resumed:
+                resumed_lines = _read_data_lines(full_path)
+                self.line_index = len(resumed_lines)
+            else:
+                resumed_lines = []
+                if self.header:
+                    for line in self.header.split('\n'):
+                        self.file_object.write('# ' + line + '\n')
+                labels = [s[0] for s in self.saved_values]
+                self.file_object.write('\t'.join(labels) + '\n')
+                self.file_object.flush()
+            self._reset_flush()
+
+        if self.saving_target != 'File':
+            array_type = self.array_type(values)
+            if self.array_length < 0:
+                self._growing = GrowingArray(array_type,
+                                             on_close=self._array_closed)
+                array_id = self.task_path + '/' + self.task_name +\
+                    '-array'
+                self.root_task.files[array_id] = self._growing
+                if self.saving_target != 'Array':
+                    for line in resumed_lines:
+                        self._growing.append(_parse_line(line,
+                                                         array_type))
+                self.array = self._growing.view
+            else:
+                self._growing = None
+                if self.memory_mapped:
+                    path = self.memmap_path()
+                    # When resuming the number of rows is recorded in place of
+                    # the size of the file.
+                    rows = self.root_task.resumed_files.pop(path, 0)
+                    try:
+                        self._mapped = MappedArray(path, array_type,
+                                                   self.array_length, rows)
+                    except (IOError, ValueError) as e:
+                        log = logging.getLogger()
+                        mes = cleandoc('''In {}, failed to map the array
+                                        {}'''.format(self.task_name, e))
+                        log.error(mes)
+                        self.root_task.should_stop.set()
+                        return False
+                    if self.saving_target == 'Array':
+                        self.line_index = rows
+                    self.root_task.files[path] = self._mapped
+                    self.array = self._mapped.array
+                else:
+                    self._mapped = None
+                    self.array = numpy.empty((self.array_length),
+                                             dtype=array_type)
+                if self.saving_target != 'Array':
+                    for i, line in enumerate(resumed_lines):
+                        self.array[i] = _parse_line(line, array_type)
+            self.write_in_database('array', self.array)
+        self.initialized = True
+        return True
+
+    def _check_row(self, values):
+        """ Check that a row can be stored in the array without any loss.
+
+        If not the measure is asked to stop.
+
+        Returns
+        -------
+        valid : bool
+            Whether or not the row can be saved.
+
+        """
+        if self.saving_target == 'File':
+            return True
+        row_type = self.array.dtype
+        for name, value in zip(row_type.names, values):
+            dtype = row_type[name]
+            # Python numbers are checked using their value.
+            if not isinstance(value, (bool, int, long, float, complex)):
+                value = numpy.asarray(value)
+                if dtype.subdtype:
+                    dtype, shape = dtype.subdtype
+                    if value.shape != shape:
+                        break
+                if not value.shape:
+                    value = value.dtype
+            if not numpy.can_cast(value, dtype, casting='safe'):
+                break
+        else:
+            return True
+
+        log = logging.getLogger()
+        mes = cleandoc('''In {}, the value of {} cannot be stored in a
+                        column of type {} without loss
+                        '''.format(self.task_name, name, dtype))
+        log.error(mes)
+        self.root_task.should_stop.set()
+        return False
+
+    def _save_row(self, values):
+        """ Write a row to the file and/or the array.
+
+        """
+        if self.saving_target != 'Array':
+            self._submit(self._write_line, self.file_object, values)
+        if self.saving_target != 'File':
+            if self._growing is not None:
+                self._growing.append(tuple(values))
+                self.array = self._growing.view
+                self.write_in_database('array', self.array)
+            else:
+                self.array[self.line_index] = tuple(values)
+
+        self.line_index += 1
+        if self._mapped is not None:
+            self._mapped.rows = self.line_index
+
+        # Closing
+        if self.line_index == self.array_length:
+            if self.file_object:
+                self._submit(self.file_object.close)
+            if self._mapped is not None:
+                self._mapped.flush()
+            self.initialized = False
+
+    def _rows_closed(self, rows):
+        """ Save the rows still waiting for a missing row at the end of the
+        measure.
+
+        The rows are saved one after the other, the missing ones being
+        skipped.
+
+        """
+        missing = rows.drain(self._save_row)
+        if missing:
+            log = logging.getLogger()
+            mes = cleandoc('''In {}, the rows {} were never received, the
+                            following rows have been saved without gaps
+                            '''.format(self.task_name, missing))
+            log.warning(mes)
+
+    def _array_closed(self, array):
+        """ Update the array once trimmed to its final length.
+
+        """
+        self.array = array
+        self.write_in_database('array', array)
+
+    def _write_line(self, file_object, values):
+        """ Format and write a line of values to the file.
+
+        """
+        file_object.write('\t'.join([str(val) for val in values]) + '\n')
+        self._lines_written(file_object)
+
+
+class SaveFileTask(FileWritingMixin, SimpleTask):
     """ Save the specified entries in a CSV file. 
 
     Wait for any parallel operation before execution.
 
+    In binary format the rows are written as raw little-endian records using
+    ndarray.tofile and the header and the columns types are stored in a JSON
+    sidecar (same path with an additional .json extension), see
+    load_binary_file. The columns types are those of the first saved values
+    (Python numbers being stored as double precision values), a value which
+    cannot be safely cast to the type of its column stops the measure.
+
     Notes
     -----
     Currently only support saving floats and arrays of floats (record arrays
@@ -248,10 +807,20 @@ class SaveFileTask(SimpleTask):
     #: Column indices identified as arrays.
     array_values = Value()
 
+    #: Format of the file.
+    file_format = Enum('Text', 'Binary').tag(pref=True)
+
     task_database_entries = set_default({'file': None})
 
     wait = set_default({'activated': True})  # Wait on all pools by default.
 
+    #: Type of the records written in binary format.
+    _row_type = Value()
+
+    #: Buffer in which the records are assembled in binary format (reused
+    #: as long as the length of the arrays does not change).
+    _rows = Value()
+
     def perform(self):
         """ Collect all data and write them to file.
 
@@ -261,23 +830,28 @@ class SaveFileTask(SimpleTask):
 
             full_folder_path = self.format_string(self.folder)
             filename = self.format_string(self.filename)
-            full_path = os.path.join(full_folder_path, filename)
+            full_path = self._file_path(os.path.join(full_folder_path,
+                                                     filename))
+            resumed = False
             try:
-                self.file_object = open(full_path, 'wb')
+                self.file_object, resumed = self._open_file(full_path, 'wb')
             except IOError as e:
                 log = logging.getLogger()
                 mes = cleandoc('''In {}, failed to open the specified
                                 file {}'''.format(self.task_name, e))
                 log.error(mes)
                 self.root_task.should_stop.set()
+                return
 
             self.root_task.files[full_path] = self.file_object
+            binary = self.file_format == 'Binary'
 
-            if self.header:
+            if self.header and not resumed and not binary:
                 for line in self.header.split('\n'):
                     self.file_object.write('# ' + line + '\n')
 
             labels = []
+            types = []
             self.array_values = set()
             for i, s in enumerate(self.saved_values):
                 value = self.format_and_eval_string(s[1])
@@ -286,22 +860,36 @@ class SaveFileTask(SimpleTask):
                     self.array_values.add(i)
                     if names:
                         labels.extend([s[0] + '_' + m for m in names])
+                        types.extend([value.dtype[m] for m in names])
                     else:
                         labels.append(s[0])
+                        types.append(value.dtype)
                 else:
                     labels.append(s[0])
-            self.file_object.write('\t'.join(labels) + '\n')
-            self.file_object.flush()
+                    types.append(_scalar_type(value))
+            if binary:
+                self._row_type = numpy.dtype([(str(l), t.newbyteorder('<'))
+                                              for l, t in zip(labels, types)])
+                self._rows = None
+                write_binary_schema(full_path, self._row_type, self.header)
+            elif not resumed:
+                self.file_object.write('\t'.join(labels) + '\n')
+                self.file_object.flush()
+            self._reset_flush()
 
             self.initialized = True
 
         lengths = set()
         values = []
+        copy = self._writer() is not None
         for i, s in enumerate(self.saved_values):
             value = self.format_and_eval_string(s[1])
-            values.append(value)
             if i in self.array_values:
                 lengths.add(value.shape[0])
+                # The array could be modified before being written.
+                if copy:
+                    value = value.copy()
+            values.append(value)
 
         if lengths:
             if len(lengths) > 1:
@@ -311,13 +899,60 @@ class SaveFileTask(SimpleTask):
                                 '''.format(self.task_name))
                 log.error(mes)
                 self.root_task.should_stop.set()
+                return
             else:
                 length = lengths.pop()
+        else:
+            length = 1
+
+        if self.file_format == 'Binary':
+            field = self._mismatching_field(values)
+            if field:
+                log = logging.getLogger()
+                mes = cleandoc('''In {}, the type of {} changed and the value
+                                cannot be saved without loss
+                                '''.format(self.task_name, field))
+                log.error(mes)
+                self.root_task.should_stop.set()
+                return
+
+        self._submit(self._write_values, self.file_object, values, length)
+
+    def _mismatching_field(self, values):
+        """ Look for a value which cannot be safely cast to the type of its
+        field in the binary records.
 
-        if not self.array_values:
-            self.file_object.write('\t'.join([str(val) for val in values]) +
-                                   '\n')
-            self.file_object.flush()
+        Returns
+        -------
+        field : str or None
+            Name of the first field whose value does not match.
+
+        """
+        row_type = self._row_type
+        fields = iter(row_type.names)
+        for i, val in enumerate(values):
+            if i in self.array_values:
+                names = val.dtype.names
+                types = [val.dtype[m] for m in names] if names else\
+                    [val.dtype]
+            else:
+                types = [_scalar_type(val)]
+            for t in types:
+                field = next(fields, None)
+                if field is None or not numpy.can_cast(t, row_type[field],
+                                                       casting='safe'):
+                    return field or str(self.saved_values[i][0])
+        return None
+
+    def _write_values(self, file_object, values, length):
+        """ Format and write the values to the file.
+
+        """
+        if self.file_format == 'Binary':
+            self._write_records(file_object, values, length)
+        elif not self.array_values:
+            file_object.write('\t'.join([str(val) for val in values]) + '\n')
+            self._lines_written(file_object)
         else:
             columns = []
             for i, val in enumerate(values):
@@ -329,8 +964,34 @@ class SaveFileTask(SimpleTask):
                 else:
                     columns.append(numpy.ones(length)*val)
             array_to_save = numpy.rec.fromarrays(columns)
-            numpy.savetxt(self.file_object, array_to_save, delimiter='\t')
-            self.file_object.flush()
+            numpy.savetxt(file_object, array_to_save, delimiter='\t')
+            self._lines_written(file_object, length)
+
+    def _write_records(self, file_object, values, length):
+        """ Write the values as raw records to the file.
+
+        Scalar values are broadcast when assigned to their field, so no
+        temporary array is allocated.
+
+        """
+        rows = self._rows
+        if rows is None or len(rows) != length:
+            rows = self._rows = numpy.empty(length, dtype=self._row_type)
+
+        fields = iter(self._row_type.names)
+        for i, val in enumerate(values):
+            if i in self.array_values and val.dtype.names:
+                for m in val.dtype.names:
+                    rows[next(fields)] = val[m]
+            else:
+                rows[next(fields)] = val
+
+        if isinstance(file_object, file):
+            rows.tofile(file_object)
+        else:
+            # Compressed streams are not real files.
+            file_object.write(rows.tostring())
+        self._lines_written(file_object, length)
 
     def check(self, *args, **kwargs):
         """
@@ -351,7 +1012,10 @@ class SaveFileTask(SimpleTask):
             traceback[err_path] = mess.format(e)
             return False, traceback
 
-        full_path = os.path.join(full_folder_path, filename)
+        if not self._check_compression(err_path, traceback):
+            return False, traceback
+
+        full_path = self._file_path(os.path.join(full_folder_path, filename))
 
         overwrite = False
         if os.path.isfile(full_path):
@@ -528,4 +1192,335 @@ class SaveArrayTask(SimpleTask):
 
         return True, traceback
 
-KNOWN_PY_TASKS = [SaveTask, SaveFileTask, SaveArrayTask]
+class SaveChunkedTask(SimpleTask):
+    """ Save the specified entries in a chunked binary container.
+
+    Each saved value becomes an extendable dataset to which a row is appended
+    at each call, arrays are stored without any text conversion. The header
+    and the configuration of the measure are stored as metadata. The data are
+    written in a HDF5 file if h5py is available, otherwise in a directory of
+    .npy chunks (see chunked_storage.load_container to read them back).
+
+    The type and shape of a dataset are those of its first row, Python
+    numbers being stored as floats. A later row which does not match (or
+    whose type cannot be safely cast) stops the measure. As the container is
+    created anew at each run the task cannot be used inside a loop saving
+    checkpoints.
+
+    Wait for any parallel operation before execution.
+
+    """
+    #: Folder in which to save the data.
+    folder = Unicode('{default_path}').tag(pref=True)
+
+    #: Name of the file (or directory for the NumPy format) in which to write
+    #: the data.
+    filename = Unicode().tag(pref=True)
+
+    #: Format of the container.
+    backend = Enum('Auto', 'HDF5', 'NumPy').tag(pref=True)
+
+    #: Number of rows per chunk.
+    chunk_size = Int(256).tag(pref=True)
+
+    #: Header to store as metadata.
+    header = Str().tag(pref=True)
+
+    #: List of values to be saved store as (label, value).
+    saved_values = ContainerList(Tuple()).tag(pref=True)
+
+    #: Currently opened container.
+    file_object = Value()
+
+    #: Flag indicating whether or not initialisation has been performed.
+    initialized = Bool(False)
+
+    wait = set_default({'activated': True})  # Wait on all pools by default.
+
+    def perform(self):
+        """ Collect all data and append them to the datasets.
+
+        """
+        if not self.initialized:
+            full_folder_path = self.format_string(self.folder)
+            filename = self.format_string(self.filename)
+            full_path = os.path.join(full_folder_path, filename)
+            try:
+                self.file_object = open_container(full_path, self.chunk_size,
+                                                  self.backend)
+            except (IOError, OSError) as e:
+                log = logging.getLogger()
+                mes = cleandoc('''In {}, failed to open the specified
+                                file {}'''.format(self.task_name, e))
+                log.error(mes)
+                self.root_task.should_stop.set()
+                return
+
+            self.root_task.files[full_path] = self.file_object
+            if self.header:
+                self.file_object.set_attribute('header', self.header)
+            config = self.root_task.task_preferences
+            if config:
+                self.file_object.set_attribute('measure_config',
+                                               '\n'.join(config.write()))
+            self.initialized = True
+
+        container = self.file_object
+        for label, formula in self.saved_values:
+            value = self.format_and_eval_string(formula)
+            # Python numbers are stored as floats so that a first integer
+            # value does not lead to truncate the following ones.
+            if isinstance(value, (int, long, float)) and\
+                    not isinstance(value, bool):
+                value = float(value)
+            try:
+                container.append(label, numpy.asarray(value))
+            except ValueError as e:
+                log = logging.getLogger()
+                mes = cleandoc('''In {}, failed to save {} : {}
+                                '''.format(self.task_name, label, e))
+                log.error(mes)
+                self.root_task.should_stop.set()
+                return
+
+    def check(self, *args, **kwargs):
+        """
+        """
+        err_path = self.task_path + '/' + self.task_name
+        traceback = {}
+        try:
+            full_folder_path = self.format_string(self.folder)
+        except Exception as e:
+            mess = 'Failed to format the folder path: {}'
+            traceback[err_path] = mess.format(e)
+            return False, traceback
+
+        try:
+            filename = self.format_string(self.filename)
+        except Exception as e:
+            mess = 'Failed to format the filename: {}'
+            traceback[err_path] = mess.format(e)
+            return False, traceback
+
+        if self.backend == 'HDF5' and h5py is None:
+            traceback[err_path + '-backend'] = \
+                'h5py is required to write HDF5 files.'
+            return False, traceback
+
+        if _checkpointed(self):
+            traceback[err_path + '-checkpoint'] = cleandoc('''Chunked
+                containers cannot be resumed, disable the checkpoints of the
+                enclosing loops.''')
+            return False, traceback
+
+        full_path = os.path.join(full_folder_path, filename)
+        if os.path.exists(full_path):
+            traceback[err_path + '-file'] = \
+                cleandoc('''File already exists, running the measure will
+                override it.''')
+
+        if self.chunk_size < 1:
+            traceback[err_path + '-chunk'] = \
+                'The chunk size must be at least 1.'
+            return False, traceback
+
+        test = True
+        labels = set()
+        for i, s in enumerate(self.saved_values):
+            if s[0] in labels or not s[0]:
+                traceback[err_path + '-entry' + str(i)] = \
+                    'Labels must be non empty and unique: {}'.format(s[0])
+                test = False
+            labels.add(s[0])
+            try:
+                self.format_and_eval_string(s[1])
+            except Exception as e:
+                traceback[err_path + '-entry' + str(i)] = \
+                    'Failed to evaluate entry {}: {}'.format(s[0], e)
+                test = False
+
+        return test, traceback
+
+
+class SaveSQLiteTask(SimpleTask):
+    """ Log the specified entries as points in a SQLite database.
+
+    Each call appends a row holding the current time, the loop index and the
+    saved values to a table indexed on the time and the loop index. The
+    database uses the write-ahead log mode and the points are committed in
+    batches so that the data can be queried while the measure runs at a low
+    cost per point. The header and the configuration of the measure are
+    stored in a metadata table (under the names 'header:<table>' and
+    'measure_config:<table>'), as the type and shape of the saved arrays
+    (see sqlite_storage.array_from_blob). Missing columns are added when
+    appending to an existing table. As the points logged before a crash
+    would be logged again when resuming, the task cannot be used inside a
+    loop saving checkpoints.
+
+    Wait for any parallel operation before execution.
+
+    """
+    #: Folder in which to save the data.
+    folder = Unicode('{default_path}').tag(pref=True)
+
+    #: Name of the database file.
+    filename = Unicode().tag(pref=True)
+
+    #: Name of the table in which to log the points.
+    table = Str('points').tag(pref=True)
+
+    #: Formula giving the loop index of the point (optional).
+    loop_index = Str().tag(pref=True)
+
+    #: Maximal number of points waiting to be committed.
+    batch_size = Int(100).tag(pref=True)
+
+    #: Maximal time in seconds between two commits.
+    commit_interval = Float(1.0).tag(pref=True)
+
+    #: Header to store as metadata.
+    header = Str().tag(pref=True)
+
+    #: List of values to be saved store as (label, value).
+    saved_values = ContainerList(Tuple()).tag(pref=True)
+
+    #: Currently opened point log.
+    file_object = Value()
+
+    #: Flag indicating whether or not initialisation has been performed.
+    initialized = Bool(False)
+
+    wait = set_default({'activated': True})  # Wait on all pools by default.
+
+    def perform(self):
+        """ Collect all data and log them as a new point.
+
+        """
+        if not self.initialized:
+            full_folder_path = self.format_string(self.folder)
+            filename = self.format_string(self.filename)
+            full_path = os.path.join(full_folder_path, filename)
+            try:
+                self.file_object = PointLog(full_path, self.table,
+                                            [s[0] for s in self.saved_values],
+                                            self.batch_size,
+                                            self.commit_interval)
+            except sqlite3.Error as e:
+                log = logging.getLogger()
+                mes = cleandoc('''In {}, failed to open the specified
+                                database {}'''.format(self.task_name, e))
+                log.error(mes)
+                self.root_task.should_stop.set()
+                return
+
+            self.root_task.files[full_path] = self.file_object
+            if self.header:
+                self.file_object.set_attribute('header', self.header)
+            config = self.root_task.task_preferences
+            if config:
+                self.file_object.set_attribute('measure_config',
+                                               '\n'.join(config.write()))
+            self.initialized = True
+
+        index = None
+        if self.loop_index:
+            index = int(self.format_and_eval_string(self.loop_index))
+        values = [self.format_and_eval_string(s[1])
+                  for s in self.saved_values]
+        try:
+            self.file_object.append(time.time(), index, values)
+        except ValueError as e:
+            log = logging.getLogger()
+            mes = cleandoc('''In {}, failed to log the point : {}
+                            '''.format(self.task_name, e))
+            log.error(mes)
+            self.root_task.should_stop.set()
+
+    def check(self, *args, **kwargs):
+        """
+        """
+        err_path = self.task_path + '/' + self.task_name
+        traceback = {}
+        try:
+            full_folder_path = self.format_string(self.folder)
+        except Exception as e:
+            mess = 'Failed to format the folder path: {}'
+            traceback[err_path] = mess.format(e)
+            return False, traceback
+
+        try:
+            filename = self.format_string(self.filename)
+        except Exception as e:
+            mess = 'Failed to format the filename: {}'
+            traceback[err_path] = mess.format(e)
+            return False, traceback
+
+        if not TABLE_NAME.match(self.table):
+            traceback[err_path + '-table'] = \
+                'Invalid table name: {}'.format(self.table)
+            return False, traceback
+
+        if self.batch_size < 1:
+            traceback[err_path + '-batch'] = \
+                'The batch size must be at least 1.'
+            return False, traceback
+
+        if _checkpointed(self):
+            traceback[err_path + '-checkpoint'] = cleandoc('''Points logged
+                before resuming would be logged twice, disable the checkpoints
+                of the enclosing loops.''')
+            return False, traceback
+
+        full_path = os.path.join(full_folder_path, filename)
+        if os.path.exists(full_path):
+            try:
+                columns = table_columns(full_path, self.table)
+            except sqlite3.Error as e:
+                mess = 'Failed to read the existing database: {}'
+                traceback[err_path + '-file'] = mess.format(e)
+                return False, traceback
+
+            if columns and any(c not in columns for c in RESERVED_COLUMNS):
+                traceback[err_path + '-table'] = \
+                    'The existing table {} is not a point log.'\
+                    .format(self.table)
+                return False, traceback
+
+            mess = cleandoc('''Database already exists, the points will be
+                appended to the table.''')
+            missing = [s[0] for s in self.saved_values
+                       if s[0] not in columns]
+            if columns and missing:
+                mess += ' The columns {} will be added.'.format(missing)
+            traceback[err_path + '-file'] = mess
+
+        test = True
+        if self.loop_index:
+            try:
+                self.format_and_eval_string(self.loop_index)
+            except Exception as e:
+                mess = 'Failed to compute the loop index: {}'
+                traceback[err_path + '-index'] = mess.format(e)
+                test = False
+
+        labels = set()
+        for i, s in enumerate(self.saved_values):
+            if (s[0] in labels or not s[0] or '"' in s[0] or
+                    s[0] in RESERVED_COLUMNS):
+                traceback[err_path + '-entry' + str(i)] = \
+                    'Labels must be non empty, unique and not reserved: ' +\
+                    s[0]
+                test = False
+            labels.add(s[0])
+            try:
+                self.format_and_eval_string(s[1])
+            except Exception as e:
+                traceback[err_path + '-entry' + str(i)] = \
+                    'Failed to evaluate entry {}: {}'.format(s[0], e)
+                test = False
+
+        return test, traceback
+
+
+KNOWN_PY_TASKS = [SaveTask, SaveFileTask, SaveArrayTask, SaveChunkedTask,
+                  SaveSQLiteTask]
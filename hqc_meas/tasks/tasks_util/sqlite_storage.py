@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : sqlite_storage.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+"""
+"""
+import re
+import json
+import sqlite3
+import numpy as np
+from timeit import default_timer
+
+
+#: Pattern a table name must match.
+TABLE_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+#: Names of the columns always present in a point log table.
+RESERVED_COLUMNS = ('id', 'time', 'loop_index')
+
+
+def _to_sql(value):
+    """ Convert a value to a type supported by sqlite.
+
+    Arrays are stored as blobs of their raw bytes.
+
+    """
+    if isinstance(value, np.ndarray):
+        return sqlite3.Binary(value.tostring())
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _array_format(array):
+    """ Describe the type and shape of an array stored as a blob.
+
+    """
+    return {'dtype': np.lib.format.dtype_to_descr(array.dtype),
+            'shape': list(array.shape)}
+
+
+def _array_key(table, column):
+    """ Name under which the format of the arrays of a column is stored.
+
+    """
+    return 'array:{}.{}'.format(table, column)
+
+
+def _as_descr(descr):
+    """ Convert a JSON decoded type description to a numpy one.
+
+    """
+    if isinstance(descr, basestring):
+        return str(descr)
+    fields = []
+    for field in descr:
+        converted = (str(field[0]), _as_descr(field[1]))
+        if len(field) > 2:
+            converted += (tuple(field[2]),)
+        fields.append(converted)
+    return fields
+
+
+def table_columns(path, table):
+    """ Get the names of the columns of a table.
+
+    Parameters
+    ----------
+    path : unicode
+        Path of the database.
+
+    table : str
+        Name of the table.
+
+    Returns
+    -------
+    columns : list(str)
+        Names of the columns, empty if the table does not exist.
+
+    """
+    connection = sqlite3.connect(path)
+    try:
+        return [str(r[1]) for r in
+                connection.execute('PRAGMA table_info({})'.format(table))]
+    finally:
+        connection.close()
+
+
+def array_from_blob(blob, array_format):
+    """ Rebuild an array stored in a point log.
+
+    Parameters
+    ----------
+    blob : buffer
+        Raw bytes of the array.
+
+    array_format : unicode
+        Format of the column stored in the metadata table (under the name
+        'array:<table>.<column>').
+
+    """
+    array_format = json.loads(array_format)
+    dtype = np.dtype(_as_descr(array_format['dtype']))
+    return np.frombuffer(blob, dtype=dtype).reshape(array_format['shape'])
+
+
+class PointLog(object):
+    """ Append-only table of points stored in a SQLite database.
+
+    Each point is stored with its time and loop index, both indexed so that
+    the log can be efficiently queried while being written. The database
+    uses the write-ahead log mode so that readers do not block the writer.
+    The points are buffered and inserted in a single transaction once the
+    batch is full or the commit interval has elapsed.
+
+    The metadata of a table are stored in the metadata table under the name
+    '<name>:<table>'. When appending to an existing table the missing columns
+    are added. Arrays are stored as raw bytes, their type and shape is stored
+    as JSON in the metadata table under the name 'array:<table>.<column>'
+    (see array_from_blob). All the arrays of a column must have the same type
+    and shape, including the ones saved when the table was created.
+
+    Parameters
+    ----------
+    path : unicode
+        Path of the database (created if necessary).
+
+    table : str
+        Name of the table in which to store the points.
+
+    columns : list(str)
+        Names of the saved values.
+
+    batch_size : int, optional
+        Maximal number of points waiting to be committed.
+
+    interval : float, optional
+        Maximal time in seconds between two commits.
+
+    Raises
+    ------
+    sqlite3.DatabaseError :
+        If the table exists but is not a point log.
+
+    """
+
+    def __init__(self, path, table, columns, batch_size=100, interval=1.0):
+        self.path = path
+        self.table = table
+        self.batch_size = batch_size
+        self.interval = interval
+        self.closed = False
+        self._pending = []
+        self._last_commit = default_timer()
+
+        # The database is closed by the root task at the end of the measure,
+        # possibly from another thread.
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        cursor = self._connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        quoted = ', '.join('"{}"'.format(c) for c in columns)
+        cursor.execute('CREATE TABLE IF NOT EXISTS {} (id INTEGER PRIMARY '
+                       'KEY, time REAL NOT NULL, loop_index INTEGER, {})'
+                       .format(table, quoted))
+        existing = [r[1] for r in
+                    cursor.execute('PRAGMA table_info({})'.format(table))]
+        if any(c not in existing for c in RESERVED_COLUMNS):
+            self._connection.close()
+            raise sqlite3.DatabaseError('The table {} is not a point '
+                                        'log'.format(table))
+        for column in columns:
+            if column not in existing:
+                cursor.execute('ALTER TABLE {} ADD COLUMN "{}"'
+                               .format(table, column))
+        cursor.execute('CREATE INDEX IF NOT EXISTS {0}_time ON {0} (time)'
+                       .format(table))
+        cursor.execute('CREATE INDEX IF NOT EXISTS {0}_loop_index ON {0} '
+                       '(loop_index)'.format(table))
+        cursor.execute('CREATE TABLE IF NOT EXISTS metadata (name TEXT '
+                       'PRIMARY KEY, value TEXT)')
+        self._connection.commit()
+        self._insert = 'INSERT INTO {} (time, loop_index, {}) VALUES ({})'\
+            .format(table, quoted, ', '.join(['?']*(len(columns) + 2)))
+        self.columns = list(columns)
+        self._array_formats = {}
+        for column in columns:
+            stored = cursor.execute('SELECT value FROM metadata WHERE name=?',
+                                    (_array_key(table, column),)).fetchone()
+            if stored:
+                self._array_formats[column] = json.loads(stored[0])
+
+    def set_attribute(self, name, value):
+        """ Store a metadata of the table in the metadata table.
+
+        """
+        self._set_metadata('{}:{}'.format(name, self.table), value)
+
+    def append(self, time, loop_index, values):
+        """ Add a point, committing the pending points if necessary.
+
+        Parameters
+        ----------
+        time : float
+            Time of the point (seconds since the epoch).
+
+        loop_index : int or None
+            Index of the point in the loop.
+
+        values : list
+            Saved values in the order of the columns.
+
+        Raises
+        ------
+        ValueError :
+            If an array does not have the type and shape of the previous
+            arrays of its column.
+
+        """
+        for column, value in zip(self.columns, values):
+            if isinstance(value, np.ndarray):
+                self._check_array(column, value)
+        self._pending.append([time, loop_index] +
+                             [_to_sql(v) for v in values])
+        if (len(self._pending) >= self.batch_size or
+                default_timer() - self._last_commit >= self.interval):
+            self.flush()
+
+    def flush(self):
+        """ Insert all the pending points in a single transaction.
+
+        """
+        if self._pending:
+            with self._connection:
+                self._connection.executemany(self._insert, self._pending)
+            self._pending = []
+        self._last_commit = default_timer()
+
+    def close(self):
+        """ Commit the pending points and close the database.
+
+        """
+        if not self.closed:
+            self.flush()
+            self._connection.close()
+            self.closed = True
+
+    # --- Private API ---------------------------------------------------------
+
+    def _check_array(self, column, array):
+        """ Record the format of the arrays of a column or check it matches.
+
+        """
+        # Round trip through JSON to compare with the stored formats.
+        array_format = json.loads(json.dumps(_array_format(array)))
+        known = self._array_formats.get(column)
+        if known is None:
+            self._array_formats[column] = array_format
+            self._set_metadata(_array_key(self.table, column),
+                               json.dumps(array_format))
+        elif known != array_format:
+            raise ValueError('The arrays saved in column {} must keep the '
+                             'same type and shape ({} != {})'
+                             .format(column, known, array_format))
+
+    def _set_metadata(self, name, value):
+        """ Store a value in the metadata table.
+
+        """
+        self._connection.execute('INSERT OR REPLACE INTO metadata VALUES '
+                                 '(?, ?)', (name, value))
+        self._connection.commit()
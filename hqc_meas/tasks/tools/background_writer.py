@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : background_writer.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+"""
+"""
+import logging
+from threading import Thread
+from Queue import Queue
+
+
+class BackgroundWriter(object):
+    """ Thread performing the writing operations submitted by save tasks.
+
+    Operations are executed in the order in which they were submitted. The
+    queue of pending operations is bounded, submitting blocks when it is full
+    so that the measure cannot outrun the disk by more than a bounded amount.
+    If an operation fails the error is logged, the measure is asked to stop
+    and the following operations are discarded.
+
+    Parameters
+    ----------
+    root : RootTask
+        Root task of the measure whose should_stop event is set on failure.
+
+    size : int, optional
+        Maximal number of pending operations.
+
+    """
+
+    def __init__(self, root, size=1000):
+        self.root = root
+        self.failed = False
+        self._queue = Queue(size)
+        self._thread = Thread(target=self._run, name='BackgroundWriter')
+        self._thread.daemon = True
+
+    def start(self):
+        """ Start the writing thread.
+
+        """
+        self._thread.start()
+
+    def submit(self, operation, *args):
+        """ Submit an operation to be performed in the writing thread.
+
+        Parameters
+        ----------
+        operation : callable
+            Callable to call with the provided arguments. The arguments must
+            not be modified afterwards.
+
+        """
+        self._queue.put((operation, args))
+
+    def wait(self):
+        """ Wait for all the operations submitted so far to be performed.
+
+        """
+        self._queue.join()
+
+    def close(self):
+        """ Perform all the pending operations and stop the thread.
+
+        """
+        self._queue.put(None)
+        self._thread.join()
+
+    # --- Private API ---------------------------------------------------------
+
+    def _run(self):
+        """ Perform the submitted operations till a None is received.
+
+        """
+        queue = self._queue
+        while True:
+            item = queue.get()
+            try:
+                if item is None:
+                    break
+                # Keep draining the queue so that submit never blocks forever.
+                if self.failed:
+                    continue
+                operation, args = item
+                try:
+                    operation(*args)
+                except Exception:
+                    log = logging.getLogger(__name__)
+                    log.exception('The background writer failed :')
+                    self.failed = True
+                    self.root.should_stop.set()
+            finally:
+                queue.task_done()
@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : lock_monitoring.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+"""Opt-in instrumentation of the synchronisation primitives used when running
+a measure.
+
+"""
+from threading import Lock, Condition
+from timeit import default_timer
+
+
+class InstrumentedLock(object):
+    """ Wrapper around a Lock or RLock recording contention statistics.
+
+    The statistics are only updated while the underlying lock is held so that
+    no additional synchronisation is needed.
+
+    Parameters
+    ----------
+    lock : Lock or RLock
+        Lock to wrap.
+
+    name : str
+        Name under which the statistics are reported.
+
+    """
+    __slots__ = ('name', 'lock', 'count', 'wait_time', 'max_wait',
+                 'max_hold', '_depth', '_acquired_at')
+
+    def __init__(self, lock, name):
+        self.name = name
+        self.lock = lock
+        self.count = 0
+        self.wait_time = 0.0
+        self.max_wait = 0.0
+        self.max_hold = 0.0
+        self._depth = 0
+        self._acquired_at = 0.0
+
+    def acquire(self, blocking=True):
+        tic = default_timer()
+        res = self.lock.acquire(blocking)
+        if res:
+            toc = default_timer()
+            wait = toc - tic
+            self.count += 1
+            self.wait_time += wait
+            if wait > self.max_wait:
+                self.max_wait = wait
+            # For re-entrant locks only the outermost acquisition counts for
+            # the hold time.
+            if self._depth == 0:
+                self._acquired_at = toc
+            self._depth += 1
+        return res
+
+    def release(self):
+        self._depth -= 1
+        if self._depth == 0:
+            hold = default_timer() - self._acquired_at
+            if hold > self.max_hold:
+                self.max_hold = hold
+        self.lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
+
+
+class LockMonitor(object):
+    """ Collect the statistics of instrumented locks and of thread joins.
+
+    """
+
+    def __init__(self):
+        self.locks = []
+        self.waits = {}
+        self._lock = Lock()
+
+    def wrap(self, lock, name):
+        """ Wrap a lock into an InstrumentedLock tracked by this monitor.
+
+        """
+        instrumented = InstrumentedLock(lock, name)
+        self.locks.append(instrumented)
+        return instrumented
+
+    def record_wait(self, name, duration):
+        """ Record the time spent waiting on other threads (make_wait joins).
+
+        """
+        with self._lock:
+            count, total, max_wait = self.waits.get(name, (0, 0.0, 0.0))
+            self.waits[name] = (count + 1, total + duration,
+                                max(max_wait, duration))
+
+    def format_report(self):
+        """ Format the collected statistics as a human readable table.
+
+        """
+        line = '{:<40} {:>12} {:>14} {:>12} {:>12}'
+        lines = ['Lock contention statistics :',
+                 line.format('Name', 'Acquisitions', 'Total wait (s)',
+                             'Max wait (s)', 'Max hold (s)')]
+        for lock in sorted(self.locks, key=lambda l: -l.wait_time):
+            lines.append(line.format(lock.name, lock.count,
+                                     '{:.6f}'.format(lock.wait_time),
+                                     '{:.6f}'.format(lock.max_wait),
+                                     '{:.6f}'.format(lock.max_hold)))
+
+        if self.waits:
+            lines.append('Thread joins statistics (make_wait) :')
+            lines.append(line.format('Task', 'Waits', 'Total wait (s)',
+                                     'Max wait (s)', ''))
+            for name, (count, total, max_wait) in sorted(self.waits.items()):
+                lines.append(line.format(name, count,
+                                         '{:.6f}'.format(total),
+                                         '{:.6f}'.format(max_wait), ''))
+
+        return '\n'.join(lines)
+
+
+def install_lock_monitor(root):
+    """ Replace the locks used by a root task by instrumented ones.
+
+    This should be called once the database is in running mode.
+
+    Parameters
+    ----------
+    root : RootTask
+        Root of the hierarchy about to be performed.
+
+    Returns
+    -------
+    monitor : LockMonitor
+        Monitor collecting the statistics.
+
+    """
+    monitor = LockMonitor()
+    database = root.task_database
+    if database._lock is not None:
+        database._lock = monitor.wrap(database._lock, 'TaskDatabase')
+
+    for name in ('threads', 'instrs', 'files'):
+        shared = getattr(root, name)
+        shared._lock = monitor.wrap(shared._lock, 'SharedDict ' + name)
+
+    counter = root.threads_counter
+    lock = monitor.wrap(Lock(), 'ThreadsCounter')
+    counter._condition = Condition(lock)
+
+    return monitor
@@ -6,54 +6,132 @@
 # =============================================================================
 """
 """
-from atom.api import Atom, Instance, Value, Int
+from atom.api import Atom, Instance, Value
 from contextlib import contextmanager
-from collections import defaultdict
-from threading import RLock, Lock
+from threading import RLock, Lock, Condition
 
 
-class SharedCounter(Atom):
-    """ Thread-safe counter object.
+class ThreadsCounter(object):
+    """ Thread-safe accounting of the active and paused threads.
+
+    The counts are plain integers protected by a condition variable, no
+    notification is emitted when they change. The callbacks are only called
+    on the transitions which matter (with the lock held) :
+    - all_paused when the number of paused threads reaches the number of
+      active threads.
+    - all_resumed when the last paused thread resumes.
+
+    Parameters
+    ----------
+    active : int, optional
+        Initial number of active threads.
+
+    all_paused : callable, optional
+        Callable taking no argument called when all threads are paused.
+
+    all_resumed : callable, optional
+        Callable taking no argument called when no thread is paused anymore.
 
     """
 
-    # --- Public API ----------------------------------------------------------
+    def __init__(self, active=1, all_paused=None, all_resumed=None):
+        self.all_paused = all_paused
+        self.all_resumed = all_resumed
+        self._active = active
+        self._paused = 0
+        self._condition = Condition(Lock())
 
-    #: Current count of the counter. User should not manipulate this directly.
-    count = Int()
+    @property
+    def active_count(self):
+        """ Current number of active threads.
 
-    def increment(self):
         """
+        return self._active
 
-        """
-        self._lock.acquire()
-        self.count += 1
-        self._lock.release()
+    @property
+    def paused_count(self):
+        """ Current number of paused threads.
 
-    def decrement(self):
         """
+        return self._paused
+
+    def increment_active(self):
+        with self._condition:
+            self._active += 1
+
+    def decrement_active(self):
+        with self._condition:
+            self._active -= 1
+            self._check_all_paused()
+
+    def increment_paused(self):
+        with self._condition:
+            self._paused += 1
+            self._check_all_paused()
+
+    def decrement_paused(self):
+        with self._condition:
+            self._paused -= 1
+            if self._paused == 0:
+                if self.all_resumed:
+                    self.all_resumed()
+                self._condition.notify_all()
+
+    def wait_all_paused(self, timeout=None):
+        """ Block till all the active threads are paused.
+
+        Parameters
+        ----------
+        timeout : float, optional
+            Maximum time to wait for.
+
+        Returns
+        -------
+        paused : bool
+            Whether or not all threads are paused.
 
         """
-        self._lock.acquire()
-        self.count += -1
-        self._lock.release()
+        with self._condition:
+            if not self._all_paused():
+                self._condition.wait(timeout)
+            return self._all_paused()
 
     # --- Private API ---------------------------------------------------------
 
-    _lock = Value()
+    def _all_paused(self):
+        return self._paused != 0 and self._paused == self._active
 
-    def _default__lock(self):
-        return Lock()
+    def _check_all_paused(self):
+        """ Signal that all threads are paused.
+
+        Must be called while holding the lock.
+
+        """
+        if self._all_paused():
+            if self.all_paused:
+                self.all_paused()
+            self._condition.notify_all()
 
 
 class SharedDict(Atom):
-    """ Dict wrapper using a lock to protect access to its values.
+    """ Dict wrapper using a lock to protect modifications of its content.
+
+    The dict uses a copy-on-write strategy : the underlying dict is never
+    mutated once it has been published, writers build a new dict under the
+    instance lock and swap the reference. Reads, membership tests, iteration
+    and length hence never need to acquire the lock and iteration always
+    happens on a consistent snapshot even if other threads keep modifying the
+    dict. Writes cost a shallow copy of the dict which is fine for the small
+    dicts (pools, instruments, files) used during a measure.
+
+    Note that the values themselves are not protected, mutable values should
+    be manipulated using safe_access.
 
     Parameters
     ----------
     default : callable, optional
-        Callable to use as argument for defaultdict, if unspecified a regular
-        dict is used.
+        Callable used to create the value of a missing key (as for
+        defaultdict), if unspecified accessing a missing key raises a KeyError.
 
     """
 
@@ -61,10 +139,7 @@ class SharedDict(Atom):
 
     def __init__(self, default=None):
         super(SharedDict, self).__init__()
-        if default is not None:
-            self._dict = defaultdict(default)
-        else:
-            self._dict = {}
+        self._default = default
 
     @contextmanager
     def safe_access(self, key):
@@ -73,74 +148,137 @@ class SharedDict(Atom):
         """
         lock = self._lock
         lock.acquire()
-
-        yield self._dict[key]
-
-        lock.release()
+        try:
+            yield self._get_or_create(key)
+        finally:
+            lock.release()
 
     @contextmanager
     def locked(self):
         """ Freeze the dict by acquiring the instance lock.
 
+        Reads are not blocked, only writers.
+
         """
-        self._lock.acquire()
+        lock = self._lock
+        lock.acquire()
+        try:
+            yield
+        finally:
+            lock.release()
 
-        yield
+    def get(self, key, default=None):
+        """ Access a value without creating it if it does not exist.
 
-        self._lock.release()
+        """
+        return self._dict.get(key, default)
 
-    def get(self, key, default=None):
-        self._lock.acquire()
+    def setdefault(self, key, default=None):
+        """ Atomically insert a value if the key does not exist yet.
 
-        aux = self._dict.get(key, default)
+        Returns
+        -------
+        value :
+            The value stored in the dict under key once the call completes.
 
-        self._lock.release()
+        """
+        try:
+            return self._dict[key]
+        except KeyError:
+            lock = self._lock
+            lock.acquire()
+            try:
+                if key not in self._dict:
+                    self._set(key, default)
+                return self._dict[key]
+            finally:
+                lock.release()
+
+    def snapshot(self):
+        """ Get a shallow copy of the current content of the dict.
 
-        return aux
+        """
+        return self._dict.copy()
 
     # --- Private API ---------------------------------------------------------
 
-    _dict = Instance((dict, defaultdict))
+    #: Current snapshot of the dict content, never mutated in place.
+    _dict = Instance(dict, ())
 
+    #: Callable used to create values for missing keys.
+    _default = Value()
+
+    #: Lock serializing the writers.
     _lock = Value()
 
     def __getitem__(self, key):
 
-        lock = self._lock
-        lock.acquire()
-
-        aux = self._dict[key]
-
-        lock.release()
-
-        return aux
+        try:
+            return self._dict[key]
+        except KeyError:
+            if self._default is None:
+                raise
+            lock = self._lock
+            lock.acquire()
+            try:
+                return self._get_or_create(key)
+            finally:
+                lock.release()
 
     def __setitem__(self, key, value):
 
         lock = self._lock
         lock.acquire()
-
-        self._dict[key] = value
-
-        lock.release()
+        try:
+            self._set(key, value)
+        finally:
+            lock.release()
 
     def __delitem__(self, key):
 
         lock = self._lock
         lock.acquire()
-
-        del self._dict[key]
-
-        lock.release()
+        try:
+            new = self._dict.copy()
+            del new[key]
+            self._dict = new
+        finally:
+            lock.release()
 
     def __contains__(self, key):
         return key in self._dict
 
     def __iter__(self):
+        # Iterating on the current snapshot, which is never mutated.
         return iter(self._dict)
 
     def __len__(self):
         return len(self._dict)
 
+    def _get_or_create(self, key):
+        """ Get the value associated to key creating it if necessary.
+
+        Must be called while holding the lock.
+
+        """
+        try:
+            return self._dict[key]
+        except KeyError:
+            if self._default is None:
+                raise
+            value = self._default()
+            self._set(key, value)
+            return value
+
+    def _set(self, key, value):
+        """ Copy the dict, set the value and publish the new dict.
+
+        Must be called while holding the lock.
+
+        """
+        new = self._dict.copy()
+        new[key] = value
+        self._dict = new
+
     def _default__lock(self):
         return RLock()
@@ -7,7 +7,10 @@
 """
 """
 from atom.api import Atom, Dict, Bool, Value, Event, List, Str, Typed
-from threading import Lock
+from threading import Lock, local
+from timeit import default_timer
+
+from ...utils.tracing import get_tracer
 
 
 class DatabaseNode(Atom):
@@ -72,10 +75,18 @@ class TaskDatabase(Atom):
         if self.running:
             full_path = node_path + '/' + value_name
             index = self._entry_index_map[full_path]
+            tracer = get_tracer()
+            if tracer is not None:
+                tic = default_timer()
             self._lock.acquire()
             self._flat_database[index] = value
             self.notifier = (node_path + '/' + value_name, value)
             self._lock.release()
+            snapshot = getattr(self._local, 'snapshot', None)
+            if snapshot is not None:
+                snapshot[index] = value
+            if tracer is not None:
+                tracer.add(full_path, 'database', tic, default_timer())
         else:
             node = self._go_to_path(node_path)
             if value_name not in node.data:
@@ -86,6 +97,53 @@ class TaskDatabase(Atom):
 
         return new_val
 
+    def set_values(self, node_path, values):
+        """Set several values of a node at once.
+
+        In running mode the lock is only acquired once for all the values.
+
+        Parameters
+        ----------
+        node_path : str
+            Path to the node holding the values to be set.
+
+        values : dict
+            Mapping between the names of the entries and their new values.
+
+        Returns
+        -------
+        new_val : bool
+            Boolean indicating whether or not a new entry has been created in
+            the database.
+
+        """
+        if not self.running:
+            news = [self.set_value(node_path, name, value)
+                    for name, value in values.iteritems()]
+            return any(news)
+
+        index_map = self._entry_index_map
+        items = [(node_path + '/' + name, value)
+                 for name, value in values.iteritems()]
+        indexes = [index_map[path] for path, _ in items]
+        tracer = get_tracer()
+        if tracer is not None:
+            tic = default_timer()
+        flat = self._flat_database
+        self._lock.acquire()
+        for index, item in zip(indexes, items):
+            flat[index] = item[1]
+            self.notifier = item
+        self._lock.release()
+        snapshot = getattr(self._local, 'snapshot', None)
+        if snapshot is not None:
+            for index, item in zip(indexes, items):
+                snapshot[index] = item[1]
+        if tracer is not None:
+            tracer.add(node_path, 'database', tic, default_timer())
+
+        return False
+
     def get_value(self, assumed_path, value_name):
         """Method to get a value from the database from its name and a path
 
@@ -109,7 +167,10 @@ class TaskDatabase(Atom):
         """
         if self.running:
             index = self._find_index(assumed_path, value_name)
-            return self._flat_database[index]
+            flat = getattr(self._local, 'snapshot', None)
+            if flat is None:
+                flat = self._flat_database
+            return flat[index]
 
         else:
             node = self._go_to_path(assumed_path)
@@ -180,10 +241,73 @@ class TaskDatabase(Atom):
             prefix was not None.
 
         """
+        flat = getattr(self._local, 'snapshot', None)
+        if flat is None:
+            flat = self._flat_database
         if prefix is None:
-            return [self._flat_database[i] for i in indexes]
+            return [flat[i] for i in indexes]
         else:
-            return {prefix + str(i): self._flat_database[i] for i in indexes}
+            return {prefix + str(i): flat[i] for i in indexes}
+
+    def snapshot(self):
+        """ Copy the current values of the flat database.
+
+        Only to be used in running mode.
+
+        """
+        with self._lock:
+            return list(self._flat_database)
+
+    def use_snapshot(self, snapshot):
+        """ Make the current thread read its values from a snapshot.
+
+        The values written by the current thread are written both in the
+        database and in the snapshot. This allows to process a point of a loop
+        while the next one is already being acquired.
+
+        Parameters
+        ----------
+        snapshot : list or None
+            Snapshot created using the snapshot method or None to read again
+            from the database.
+
+        """
+        self._local.snapshot = snapshot
+
+    def dump_values(self):
+        """ Get the values of all the entries of the flat database.
+
+        Only to be used in running mode.
+
+        Returns
+        -------
+        values : dict
+            Mapping between the full paths of the entries and their values.
+
+        """
+        flat = self._flat_database
+        with self._lock:
+            return {path: flat[index]
+                    for path, index in self._entry_index_map.iteritems()}
+
+    def load_values(self, values):
+        """ Set the values of entries of the flat database.
+
+        Only to be used in running mode. Unknown entries are ignored and no
+        notification is emitted.
+
+        Parameters
+        ----------
+        values : dict
+            Mapping between the full paths of the entries and their values.
+
+        """
+        index_map = self._entry_index_map
+        flat = self._flat_database
+        with self._lock:
+            for path, value in values.iteritems():
+                if path in index_map:
+                    flat[index_map[path]] = value
 
     def get_entries_indexes(self, assumed_path, entries):
         """ Access to the index in the flattened database for some entries.
@@ -473,6 +597,9 @@ class TaskDatabase(Atom):
     #: Lock to make the database thread safe in running mode.
     _lock = Value()
 
+    #: Thread local storage holding the snapshot used by a thread if any.
+    _local = Value(factory=local)
+
     def _go_to_path(self, path):
         """Method used to reach a node specified by a path.
 
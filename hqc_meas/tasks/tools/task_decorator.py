@@ -9,9 +9,12 @@
 
 import logging
 from time import sleep
+from timeit import default_timer
 from threading import Thread, current_thread
 from itertools import chain
 
+from ...utils.tracing import get_tracer
+
 
 def handle_stop_pause(root):
     """ Check the state of the stop and pause event and handle the pause.
@@ -37,30 +40,47 @@ def handle_stop_pause(root):
 
     pause_flag = root.should_pause
     if pause_flag.is_set():
-        root.resume.clear()
-        root.paused_threads_counter.increment()
-        while True:
-            sleep(0.05)
-            if stop_flag.is_set():
-                root.paused_threads_counter.decrement()
-                return True
-            if not pause_flag.is_set():
-                if current_thread().name == 'MainThread':
-                    # Prevent some issues if a stupid user changes a
-                    # value on an instr previously set by a task.
-                    instrs = root.instrs
-                    for instr_id in instrs:
-                        instrs[instr_id].owner = ''
-                        instrs[instr_id].clear_cache()
-                    root.resume.set()
-                    root.paused_threads_counter.decrement()
-                    break
-                else:
-                    # Safety here ensuring the main thread finished
-                    # re-initializing the instr.
-                    root.resume.wait()
-                    root.paused_threads_counter.decrement()
-                    break
+        tic = default_timer()
+        try:
+            return _handle_pause(root)
+        finally:
+            profiler = root.profiler
+            if profiler is not None:
+                profiler.record_pause(current_thread().name,
+                                      default_timer() - tic)
+
+
+def _handle_pause(root):
+    """ Wait for the pause to end. See handle_stop_pause.
+
+    """
+    stop_flag = root.should_stop
+    pause_flag = root.should_pause
+    root.resume.clear()
+    counter = root.threads_counter
+    counter.increment_paused()
+    while True:
+        sleep(0.05)
+        if stop_flag.is_set():
+            counter.decrement_paused()
+            return True
+        if not pause_flag.is_set():
+            if current_thread().name == 'MainThread':
+                # Prevent some issues if a stupid user changes a
+                # value on an instr previously set by a task.
+                instrs = root.instrs
+                for instr_id in instrs:
+                    instrs[instr_id].owner = ''
+                    instrs[instr_id].clear_cache()
+                root.resume.set()
+                counter.decrement_paused()
+                break
+            else:
+                # Safety here ensuring the main thread finished
+                # re-initializing the instr.
+                root.resume.wait()
+                counter.decrement_paused()
+                break
 
 
 def make_stoppable(function_to_decorate):
@@ -134,15 +154,90 @@ def make_parallel(perform, pool):
         with pools.safe_access(pool) as threads:
             threads.append(thread)
 
-        root.active_threads_counter.increment()
+        counter = root.threads_counter
+        counter.increment_active()
         thread.start()
-        root.active_threads_counter.decrement()
+        counter.decrement_active()
 
     wrapper.__name__ = perform.__name__
     wrapper.__doc__ = perform.__doc__
     return wrapper
 
 
+def make_profiled(perform, name):
+    """ Machinery to time the execution of perform_.
+
+    Parameters
+    ----------
+    perform : method
+        Method whose execution time should be recorded.
+
+    name : str
+        Name under which the timing are stored in the profiler of the root
+        task.
+
+    """
+    def wrapper(*args, **kwargs):
+
+        profiler = args[0].root_task.profiler
+        tic = default_timer()
+        try:
+            return perform(*args, **kwargs)
+        finally:
+            profiler.record_task(name, default_timer() - tic)
+
+    wrapper.__name__ = perform.__name__
+    wrapper.__doc__ = perform.__doc__
+    return wrapper
+
+
+def make_traced(perform, name):
+    """ Machinery to record the execution of perform_ in the active tracer.
+
+    Parameters
+    ----------
+    perform : method
+        Method whose execution should be traced.
+
+    name : str
+        Name of the events recorded in the tracer.
+
+    """
+    def wrapper(*args, **kwargs):
+
+        tracer = get_tracer()
+        if tracer is None:
+            return perform(*args, **kwargs)
+        tic = default_timer()
+        try:
+            return perform(*args, **kwargs)
+        finally:
+            tracer.add(name, 'task', tic, default_timer())
+
+    wrapper.__name__ = perform.__name__
+    wrapper.__doc__ = perform.__doc__
+    return wrapper
+
+
+def _record_wait(task, tic):
+    """ Report the time spent by a task waiting on other threads.
+
+    Only used when the lock monitoring or the profiling is enabled on the root
+    task.
+
+    """
+    root = task.root_task
+    monitor = root.lock_monitor
+    profiler = root.profiler
+    if monitor is not None or profiler is not None:
+        name = task.task_path + '/' + task.task_name
+        duration = default_timer() - tic
+        if monitor is not None:
+            monitor.record_wait(name, duration)
+        if profiler is not None:
+            profiler.record_wait(name, duration)
+
+
 # XXXX should now support nested wait in parallel
 def make_wait(perform, wait, no_wait):
     """ Machinery to make perform_ wait on other tasks execution.
@@ -172,6 +267,7 @@ def make_wait(perform, wait, no_wait):
 
             obj = args[0]
             all_threads = obj.root_task.threads
+            tic = default_timer()
             while True:
                 # Get all the threads we should be waiting upon.
                 threads = chain.from_iterable([all_threads[w]
@@ -194,6 +290,7 @@ def make_wait(perform, wait, no_wait):
 
                 # Start over till no thread remain in the pool in wait.
 
+            _record_wait(obj, tic)
             return perform(*args, **kwargs)
 
     elif no_wait:
@@ -204,6 +301,7 @@ def make_wait(perform, wait, no_wait):
             # threads.
             all_threads = obj.root_task.threads
             pools = [k for k in all_threads if k not in no_wait]
+            tic = default_timer()
             while True:
                 # Get all the threads we should be waiting upon.
                 threads = chain.from_iterable([all_threads[p]
@@ -226,12 +324,14 @@ def make_wait(perform, wait, no_wait):
 
                 # Start over till no thread remain in the pool in wait.
 
+            _record_wait(obj, tic)
             return perform(*args, **kwargs)
     else:
         def wrapper(*args, **kwargs):
 
             obj = args[0]
             all_threads = obj.root_task.threads
+            tic = default_timer()
             while True:
                 # Get all the threads we should be waiting upon.
                 threads = chain.from_iterable([all_threads[p]
@@ -251,6 +351,8 @@ def make_wait(perform, wait, no_wait):
                     for p in all_threads:
                         all_threads[p] = [t for t in all_threads[p]
                                           if t.is_alive()]
+
+            _record_wait(obj, tic)
             return perform(*args, **kwargs)
 
     wrapper.__name__ = perform.__name__
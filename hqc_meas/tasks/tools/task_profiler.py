@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : task_profiler.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+"""Opt-in timing of the tasks performed during a measure.
+
+"""
+import json
+from math import log, floor
+from threading import Lock
+
+#: Number of histogram bins per octave used to estimate the percentiles.
+BINS_PER_OCTAVE = 8
+
+#: Shortest duration resolved by the histogram (2**-24 s ~ 60 ns).
+MIN_OCTAVE = -24
+
+#: Longest duration resolved by the histogram (2**20 s ~ 12 days).
+MAX_OCTAVE = 20
+
+
+class TimingStatistics(object):
+    """ Aggregated statistics about a set of durations.
+
+    Durations are not stored, only the count, total, min and max are kept
+    exactly, the percentiles are estimated from a logarithmic histogram (the
+    relative error is below 5 %) so that the memory use does not depend on
+    the number of calls.
+
+    """
+    __slots__ = ('count', 'total', 'min', 'max', 'bins')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.bins = [0]*((MAX_OCTAVE - MIN_OCTAVE)*BINS_PER_OCTAVE + 1)
+
+    def add(self, duration):
+        """ Add a new duration (in seconds).
+
+        """
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        if duration < self.min:
+            self.min = duration
+
+        if duration > 0:
+            index = int(floor(log(duration, 2)*BINS_PER_OCTAVE))
+            index -= MIN_OCTAVE*BINS_PER_OCTAVE
+            index = min(max(index, 0), len(self.bins) - 1)
+        else:
+            index = 0
+        self.bins[index] += 1
+
+    def percentile(self, fraction):
+        """ Estimate the duration below which a fraction of the calls lie.
+
+        """
+        if not self.count:
+            return 0.0
+        threshold = fraction*self.count
+        cumulated = 0
+        for index, number in enumerate(self.bins):
+            cumulated += number
+            if cumulated >= threshold:
+                break
+        # Use the geometric center of the bin.
+        exponent = (index + 0.5)/BINS_PER_OCTAVE + MIN_OCTAVE
+        return min(max(2**exponent, self.min), self.max)
+
+    def summary(self):
+        """ Summarize the statistics in a dict.
+
+        """
+        count = self.count
+        return {'count': count,
+                'total': self.total,
+                'mean': self.total/count if count else 0.0,
+                'p50': self.percentile(0.5),
+                'p99': self.percentile(0.99),
+                'max': self.max}
+
+
+class TaskProfiler(object):
+    """ Collect the execution time of tasks and the time spent waiting.
+
+    Three categories are kept separate :
+    - tasks : time spent in the perform method of each task (identified by
+      its path), excluding the time spent waiting on other threads.
+    - waits : time each task spent waiting on other threads (make_wait).
+    - pauses : time each thread spent paused (handle_stop_pause).
+
+    """
+
+    def __init__(self):
+        self.tasks = {}
+        self.waits = {}
+        self.pauses = {}
+        self._lock = Lock()
+
+    def record_task(self, name, duration):
+        self._record(self.tasks, name, duration)
+
+    def record_wait(self, name, duration):
+        self._record(self.waits, name, duration)
+
+    def record_pause(self, name, duration):
+        self._record(self.pauses, name, duration)
+
+    def summary(self):
+        """ Get a dict summarizing all the collected statistics.
+
+        """
+        return {kind: {name: stats.summary()
+                       for name, stats in getattr(self, kind).items()}
+                for kind in ('tasks', 'waits', 'pauses')}
+
+    def format_report(self):
+        """ Format the collected statistics as a human readable table.
+
+        """
+        line = '{:<40} {:>8} {:>12} {:>12} {:>12} {:>12} {:>12}'
+        num = '{:.6f}'
+        header = line.format('Name', 'Count', 'Total (s)', 'Mean (s)',
+                             'P50 (s)', 'P99 (s)', 'Max (s)')
+        titles = {'tasks': 'Tasks execution statistics :',
+                  'waits': 'Time spent waiting on other threads :',
+                  'pauses': 'Time spent paused :'}
+        lines = []
+        summary = self.summary()
+        for kind in ('tasks', 'waits', 'pauses'):
+            stats = summary[kind]
+            if not stats:
+                continue
+            lines.extend((titles[kind], header))
+            for name in sorted(stats, key=lambda n: -stats[n]['total']):
+                s = stats[name]
+                lines.append(line.format(name, s['count'],
+                                         num.format(s['total']),
+                                         num.format(s['mean']),
+                                         num.format(s['p50']),
+                                         num.format(s['p99']),
+                                         num.format(s['max'])))
+
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        """ Write the summary as JSON in the specified file.
+
+        """
+        with open(path, 'wb') as f:
+            json.dump(self.summary(), f, indent=2, sort_keys=True)
+
+    # --- Private API ---------------------------------------------------------
+
+    def _record(self, category, name, duration):
+        with self._lock:
+            try:
+                stats = category[name]
+            except KeyError:
+                stats = category[name] = TimingStatistics()
+            stats.add(duration)
+
+
+def iter_tasks(root):
+    """ Iterate over all the tasks of a hierarchy (root excluded).
+
+    """
+    tasks = list(root._gather_children_task())
+    while tasks:
+        task = tasks.pop(0)
+        yield task
+        if hasattr(task, '_gather_children_task'):
+            tasks.extend(task._gather_children_task())
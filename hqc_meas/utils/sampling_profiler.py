@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : sampling_profiler.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+"""Statistical profiler sampling the call stacks of all the running threads.
+
+Contrary to cProfile the overhead does not depend on the number of function
+calls and the threads started by the tasks executed in parallel are profiled
+too. A background thread periodically inspects the frames of all the other
+threads (sys._current_frames) so that no signal is needed and the profiler
+works on all platforms. The threads blocked waiting on a condition, an event
+or another thread (such as the logging and writing threads waiting for work)
+are idle and are not sampled so that they do not dilute the report.
+
+"""
+import os
+import sys
+from time import sleep
+from threading import Thread, Event, Condition
+try:
+    from thread import get_ident
+except ImportError:
+    from threading import get_ident
+
+
+def _code(method):
+    """ Get the code object of a method.
+
+    """
+    return getattr(method, '__func__', method).__code__
+
+
+#: Code of the functions in which a thread waits without doing any work.
+IDLE_CODES = frozenset(_code(m) for m in (type(Condition()).wait,
+                                          type(Event()).wait,
+                                          Thread.join))
+
+
+class SamplingProfiler(object):
+    """ Periodically record the call stack of all the non idle threads.
+
+    Parameters
+    ----------
+    interval : float, optional
+        Time in seconds between two samples.
+
+    Attributes
+    ----------
+    stacks : dict
+        Number of time each call stack (tuple of frame labels from the
+        outermost to the innermost call) was observed.
+
+    samples : int
+        Number of samples taken.
+
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self._labels = {}
+        self._stop = Event()
+        self._thread = None
+
+    def start(self):
+        """ Start sampling in a background thread.
+
+        """
+        self._stop.clear()
+        self._thread = Thread(target=self._run, name='SamplingProfiler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """ Stop sampling and wait for the background thread to exit.
+
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def sample(self, ignore=None):
+        """ Record the current call stack of all the non idle threads.
+
+        Parameters
+        ----------
+        ignore : int, optional
+            Id of a thread which should not be sampled.
+
+        """
+        stacks = self.stacks
+        for ident, frame in sys._current_frames().items():
+            if ident == ignore or frame.f_code in IDLE_CODES:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            key = tuple(reversed(stack))
+            stacks[key] = stacks.get(key, 0) + 1
+        self.samples += 1
+
+    def functions_statistics(self):
+        """ Count the samples in which each function appears.
+
+        Returns
+        -------
+        own : dict
+            Number of samples in which the function was executing.
+
+        total : dict
+            Number of samples in which the function was on the stack.
+
+        """
+        own = {}
+        total = {}
+        for stack, count in self.stacks.items():
+            own[stack[-1]] = own.get(stack[-1], 0) + count
+            for label in set(stack):
+                total[label] = total.get(label, 0) + count
+        return own, total
+
+    def format_report(self, limit=20):
+        """ Format the functions in which most of the time was spent.
+
+        """
+        own, total = self.functions_statistics()
+        norm = float(sum(self.stacks.values()) or 1)
+        line = '{:>8} {:>8}  {}'
+        lines = ['Sampling profiler ({} samples, one every {} s) :'
+                 .format(self.samples, self.interval),
+                 line.format('Own %', 'Total %', 'Function')]
+        for label in sorted(own, key=lambda l: -own[l])[:limit]:
+            lines.append(line.format('{:.1f}'.format(100*own[label]/norm),
+                                     '{:.1f}'.format(100*total[label]/norm),
+                                     label))
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        """ Save the stacks in the 'folded' format used by flame graph tools.
+
+        """
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write('{} {}\n'.format(';'.join(stack), count))
+
+    # --- Private API ---------------------------------------------------------
+
+    def _run(self):
+        """ Sample the threads till asked to stop.
+
+        """
+        own = get_ident()
+        while not self._stop.is_set():
+            sleep(self.interval)
+            self.sample(own)
+
+    def _label(self, code):
+        """ Get the label used to identify a code object (cached).
+
+        """
+        try:
+            return self._labels[code]
+        except KeyError:
+            label = '{} ({}:{})'.format(code.co_name,
+                                        os.path.basename(code.co_filename),
+                                        code.co_firstlineno)
+            self._labels[code] = label
+            return label
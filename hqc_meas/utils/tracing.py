@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : tracing.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+"""Timeline tracing of a measure execution in the Chrome trace event format.
+
+A single tracer can be active in a process at a time. When no tracer is
+active the instrumented code only pays for a global lookup.
+
+The produced files can be opened in chrome://tracing or any viewer supporting
+the trace event format.
+
+"""
+import os
+import json
+from functools import wraps
+from threading import current_thread
+from timeit import default_timer
+try:
+    from thread import get_ident
+except ImportError:
+    from threading import get_ident
+
+
+#: Currently active tracer.
+_tracer = None
+
+
+def get_tracer():
+    """ Get the currently active tracer or None.
+
+    """
+    return _tracer
+
+
+def set_tracer(tracer):
+    """ Set the active tracer. Use None to disable tracing.
+
+    """
+    global _tracer
+    _tracer = tracer
+
+
+class Tracer(object):
+    """ Collect timed events and save them in the Chrome trace event format.
+
+    """
+
+    def __init__(self):
+        self.events = []
+        self._origin = default_timer()
+        self._pid = os.getpid()
+        self._threads = {}
+
+    def add(self, name, category, start, end):
+        """ Record an event.
+
+        Parameters
+        ----------
+        name : str
+            Name of the event.
+
+        category : str
+            Category of the event ('task', 'instrument', 'database').
+
+        start : float
+            Time at which the event started as returned by default_timer.
+
+        end : float
+            Time at which the event ended as returned by default_timer.
+
+        """
+        ident = get_ident()
+        if ident not in self._threads:
+            self._threads[ident] = current_thread().name
+        # List.append is atomic so no lock is needed here.
+        self.events.append((name, category, start, end, ident))
+
+    def dump(self, path):
+        """ Write the collected events in a json file.
+
+        """
+        origin = self._origin
+        pid = self._pid
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                   'args': {'name': name}}
+                  for tid, name in self._threads.items()]
+        # Use complete events ('X') which hold both the beginning and the end
+        # of an event.
+        events.extend({'name': name, 'cat': cat, 'ph': 'X', 'pid': pid,
+                       'tid': tid, 'ts': (start - origin)*1e6,
+                       'dur': (end - start)*1e6}
+                      for name, cat, start, end, tid in self.events)
+        with open(path, 'wb') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def traced(category):
+    """ Decorator recording the execution of a method in the active tracer.
+
+    The event is named after the class of the object and the method name.
+
+    """
+    def decorator(function):
+        name = function.__name__
+
+        @wraps(function)
+        def wrapper(self, *args, **kwargs):
+            tracer = _tracer
+            if tracer is None:
+                return function(self, *args, **kwargs)
+            start = default_timer()
+            try:
+                return function(self, *args, **kwargs)
+            finally:
+                tracer.add(type(self).__name__ + '.' + name, category,
+                           start, default_timer())
+
+        return wrapper
+
+    return decorator
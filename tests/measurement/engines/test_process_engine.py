@@ -167,6 +167,32 @@ class TestProcessEngine(object):
         # Check the presence of the dock item.
         assert_false(plugin.workspace.dock_area.find('process_log'))
 
+    def test_profiling_settings(self):
+        """ Test setting the profiling options through the command.
+
+        """
+        plugin = self.workbench.get_plugin(u'hqc_meas.measure')
+        engine_id = u'hqc_meas.measure.engines.process_engine'
+        plugin.selected_engine = engine_id
+        engine_plugin = self.workbench.get_plugin(engine_id)
+
+        core = self.workbench.get_plugin(u'enaml.workbench.core')
+        cmd = u'hqc_meas.measure.engines.process_engine.set_profiling'
+        core.invoke_command(cmd, {'profiling': 'sampling',
+                                  'sampling_interval': 0.01}, self)
+        assert_equal(engine_plugin.profiling, 'sampling')
+
+        decl = plugin.engines[plugin.selected_engine]
+        engine = decl.factory(decl, self.workbench)
+        assert_equal(engine.profiling, 'sampling')
+        assert_equal(engine.sampling_interval, 0.01)
+
+        # Settings modified after the creation of the engine are forwarded.
+        core.invoke_command(cmd, {'profiling': 'deterministic'}, self)
+        assert_equal(engine.profiling, 'deterministic')
+        assert_equal(engine_plugin.preferences_from_members()['profiling'],
+                     'deterministic')
+
     def test_measure_processing1(self):
         """ Test the processing of a single measure (using the plugin).
 
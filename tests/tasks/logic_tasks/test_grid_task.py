@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : test_grid_task.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+"""
+"""
+from nose.tools import (assert_equal, assert_true, assert_false, assert_in)
+from nose.plugins.attrib import attr
+from multiprocessing import Event
+from enaml.workbench.api import Workbench
+from atom.api import List
+from numpy.testing import assert_array_equal
+
+from hqc_meas.tasks.api import RootTask
+from hqc_meas.tasks.tasks_logic.grid_task import GridTask, grid_indexes
+from hqc_meas.tasks.tasks_logic.loop_exceptions_tasks import BreakTask
+
+import enaml
+with enaml.imports():
+    from enaml.workbench.core.core_manifest import CoreManifest
+    from hqc_meas.utils.state.manifest import StateManifest
+    from hqc_meas.utils.preferences.manifest import PreferencesManifest
+    from hqc_meas.tasks.manager.manifest import TaskManagerManifest
+
+    from hqc_meas.tasks.tasks_logic.views.grid_task_view\
+        import GridView
+
+from ...util import process_app_events, close_all_windows
+from ..testing_utilities import CheckTask
+
+
+class PointTask(CheckTask):
+    """ Task recording the values of the grid axes at each call.
+
+    """
+    points = List()
+
+    def perform(self, value=None):
+        super(PointTask, self).perform(value)
+        self.points.append((self.get_from_database('Test_x'),
+                            self.get_from_database('Test_y'),
+                            self.get_from_database('Test_progress')))
+
+
+def test_grid_indexes():
+    # Test the ordering of the points with and without snake ordering.
+    assert_array_equal(grid_indexes((2, 3)),
+                       [[0, 0], [0, 1], [0, 2], [1, 0], [1, 1], [1, 2]])
+    assert_array_equal(grid_indexes((2, 3), True),
+                       [[0, 0], [0, 1], [0, 2], [1, 2], [1, 1], [1, 0]])
+
+    # In snake ordering consecutive points are always neighbours.
+    indexes = grid_indexes((3, 2, 4), True)
+    assert_equal(len(indexes), 24)
+    assert_equal(len(set(map(tuple, indexes))), 24)
+    steps = abs(indexes[1:] - indexes[:-1]).sum(axis=1)
+    assert_true((steps == 1).all())
+
+
+class TestGridTask(object):
+
+    def setup(self):
+        self.root = RootTask(should_stop=Event(), should_pause=Event())
+        self.task = GridTask(task_name='Test')
+        self.root.children_task.append(self.task)
+        self.check = PointTask(task_name='check')
+        self.task.children_task.append(self.check)
+
+    def test_database_entries(self):
+        # Test that the axes are reflected in the database entries.
+        self.task.axes = [('x', 'range(2)')]
+        self.task.axes.append(('y', 'range(3)'))
+        assert_equal(sorted(self.task.task_database_entries),
+                     sorted(['point_number', 'index', 'progress', 'x',
+                             'x_index', 'y', 'y_index']))
+
+    def test_check1(self):
+        # Simply test that everything is ok when the axes can be evaluated.
+        self.task.axes = [('x', 'range(2)'), ('y', 'np.linspace(0, 1, 3)')]
+
+        test, traceback = self.task.check()
+        assert_true(test)
+        assert_false(traceback)
+        assert_true(self.check.check_called)
+        assert_equal(self.task.get_from_database('Test_point_number'), 6)
+
+    def test_check2(self):
+        # Test handling a wrong axis formula.
+        self.task.axes = [('x', '*range(2)'), ('y', '1.0')]
+
+        test, traceback = self.task.check(test_instr=True)
+        assert_false(test)
+        assert_equal(len(traceback), 2)
+        assert_in('root/Test-x', traceback)
+        assert_in('root/Test-y', traceback)
+
+    def test_check3(self):
+        # Test handling duplicate labels and missing axes.
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_in('root/Test', traceback)
+
+        self.task.axes = [('x', 'range(2)'), ('x', 'range(3)')]
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_in('root/Test-labels', traceback)
+
+    def test_check4(self):
+        # Test checking an axis given by a generator.
+        self.task.axes = [('x', '(i for i in range(2))'), ('y', '[]')]
+
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_equal(list(traceback), ['root/Test-y'])
+        assert_equal(self.task.get_from_database('Test_x'), 0)
+
+    def test_perform1(self):
+        # Test performing a grid in the standard order.
+        self.task.axes = [('x', 'range(2)'), ('y', '[0.5, 1.5, 2.5]')]
+        self.root.task_database.prepare_for_running()
+
+        self.task.perform()
+        assert_equal(self.check.perform_called, 6)
+        assert_equal([p[:2] for p in self.check.points],
+                     [(0, 0.5), (0, 1.5), (0, 2.5),
+                      (1, 0.5), (1, 1.5), (1, 2.5)])
+        assert_equal(self.check.points[-1][2], 1.0)
+        assert_equal(self.task.get_from_database('Test_index'), 6)
+        assert_equal(self.task.get_from_database('Test_y_index'), 3)
+
+    def test_perform2(self):
+        # Test performing a grid in snake order.
+        self.task.axes = [('x', 'range(2)'), ('y', '[0.5, 1.5, 2.5]')]
+        self.task.snake = True
+        self.root.task_database.prepare_for_running()
+
+        self.task.perform()
+        assert_equal([p[:2] for p in self.check.points],
+                     [(0, 0.5), (0, 1.5), (0, 2.5),
+                      (1, 2.5), (1, 1.5), (1, 0.5)])
+        assert_equal(self.task.get_from_database('Test_y_index'), 1)
+
+    def test_perform3(self):
+        # Test performing when the stop event is set.
+        self.task.axes = [('x', 'range(2)'), ('y', 'range(3)')]
+        self.root.should_stop.set()
+        self.root.task_database.prepare_for_running()
+
+        self.task.perform()
+        assert_equal(self.check.perform_called, 0)
+
+    def test_perform4(self):
+        # Test breaking out of the grid.
+        self.task.axes = [('x', 'range(2)'), ('y', 'range(3)')]
+        self.task.children_task.append(BreakTask(task_name='break',
+                                                 condition='True'))
+        test, traceback = self.task.check()
+        assert_true(test)
+        self.root.task_database.prepare_for_running()
+
+        self.task.perform()
+        assert_equal(self.check.perform_called, 1)
+
+
+@attr('ui')
+class TestGridView(object):
+
+    def setup(self):
+        self.workbench = Workbench()
+        self.workbench.register(CoreManifest())
+        self.workbench.register(StateManifest())
+        self.workbench.register(PreferencesManifest())
+        self.workbench.register(TaskManagerManifest())
+
+        self.root = RootTask(should_stop=Event(), should_pause=Event())
+        self.task = GridTask(task_name='Test', axes=[('x', 'range(2)')])
+        self.root.children_task.append(self.task)
+
+    def teardown(self):
+        close_all_windows()
+
+        self.workbench.unregister(u'hqc_meas.task_manager')
+        self.workbench.unregister(u'hqc_meas.preferences')
+        self.workbench.unregister(u'hqc_meas.state')
+        self.workbench.unregister(u'enaml.workbench.core')
+
+    def test_view(self):
+        # Intantiate a view and toggle the snake ordering.
+        window = enaml.widgets.api.Window()
+        core = self.workbench.get_plugin('enaml.workbench.core')
+        view = GridView(window, task=self.task, core=core)
+        window.show()
+
+        process_app_events()
+
+        view.widgets()[0].checked = True
+        process_app_events()
+        assert_true(self.task.snake)
@@ -11,12 +11,15 @@ from nose.tools import (assert_equal, assert_true, assert_false, assert_in,
 from nose.plugins.attrib import attr
 from multiprocessing import Event
 from enaml.workbench.api import Workbench
+import numpy as np
 
 from hqc_meas.tasks.api import RootTask
 from hqc_meas.tasks.tasks_logic.loop_task import LoopTask
 from hqc_meas.tasks.tasks_logic.while_task import WhileTask
+from hqc_meas.tasks.tasks_logic.loop_iterable_interface\
+    import IterableLoopInterface
 from hqc_meas.tasks.tasks_logic.loop_exceptions_tasks\
-    import BreakTask, ContinueTask
+    import BreakTask, ContinueTask, ConvergenceTask
 
 import enaml
 with enaml.imports():
@@ -96,6 +99,63 @@ class TestContinueTask(BaseExceptionTest):
     excep_class = ContinueTask
 
 
+class TestConvergenceTask(object):
+
+    def setup(self):
+        self.root = RootTask(should_stop=Event(), should_pause=Event())
+        self.task = ConvergenceTask(task_name='Test')
+        self.loop = LoopTask(task_name='Loop', children_task=[self.task])
+        self.loop.interface = IterableLoopInterface(iterable='range(100)')
+        self.root.children_task.append(self.loop)
+        self.task.observed = '1.0 + 0.1*(-1)**{Loop_index}'
+
+    def test_check1(self):
+        # Simply test that everything is ok if all formulas can be evaluated.
+        test, traceback = self.task.check()
+        assert_true(test)
+        assert_false(traceback)
+
+    def test_check2(self):
+        # Test handling wrong formulas.
+        self.task.observed = '*1'
+        self.task.max_count = '1*'
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_in('root/Loop/Test-observed', traceback)
+        assert_in('root/Loop/Test-max_count', traceback)
+
+    def test_perform1(self):
+        # Test breaking once the relative error is small enough.
+        self.task.threshold = '0.02'
+        self.root.task_database.prepare_for_running()
+
+        self.loop.perform()
+        count = self.task.get_from_database('Test_count')
+        values = 1.0 + 0.1*(-1)**np.arange(1, count + 1)
+        rel_error = np.std(values, ddof=1)/np.sqrt(count)/np.mean(values)
+        assert_true(rel_error <= 0.02)
+        previous = values[:-1]
+        assert_true(np.std(previous, ddof=1)/np.sqrt(count - 1) /
+                    np.mean(previous) > 0.02)
+        assert_equal(self.loop.get_from_database('Loop_index'), count)
+        assert_true(abs(self.task.get_from_database('Test_mean') -
+                        np.mean(values)) < 1e-12)
+        assert_true(abs(self.task.get_from_database('Test_relative_error') -
+                        rel_error) < 1e-12)
+
+    def test_perform2(self):
+        # Test breaking once the maximal number of points is reached and
+        # resetting when the loop starts again.
+        self.task.threshold = '1e-6'
+        self.task.max_count = '10'
+        self.root.task_database.prepare_for_running()
+
+        self.loop.perform()
+        assert_equal(self.task.get_from_database('Test_count'), 10)
+        self.loop.perform()
+        assert_equal(self.task.get_from_database('Test_count'), 10)
+
+
 @nottest
 class BaseTestExceptionView(object):
 
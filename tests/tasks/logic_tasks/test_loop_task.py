@@ -11,14 +11,23 @@ from nose.tools import (assert_equal, assert_true, assert_false, assert_in,
                         assert_is_instance)
 from nose.plugins.attrib import attr
 from multiprocessing import Event
+from time import sleep
+from tempfile import mkdtemp
+import os
+import json
+import shutil
+from atom.api import List, Int
 from enaml.workbench.api import Workbench
 
 from hqc_meas.tasks.api import RootTask
-from hqc_meas.tasks.tasks_logic.loop_task import LoopTask
+from hqc_meas.tasks.tasks_logic.loop_task import (LoopTask, length_hint,
+                                                  LoopStatistics)
 from hqc_meas.tasks.tasks_logic.loop_iterable_interface\
     import IterableLoopInterface
 from hqc_meas.tasks.tasks_logic.loop_linspace_interface\
     import LinspaceLoopInterface
+from hqc_meas.tasks.tasks_logic.loop_adaptive_interface\
+    import AdaptiveLoopInterface, AdaptiveSampler
 from hqc_meas.tasks.tasks_logic.loop_exceptions_tasks\
     import BreakTask, ContinueTask
 
@@ -33,7 +42,65 @@ with enaml.imports():
         import LoopView
 
 from ...util import process_app_events, close_all_windows
-from ..testing_utilities import CheckTask
+from ..testing_utilities import CheckTask, ExceptionTask
+
+
+class RecordTask(CheckTask):
+    """ Task recording the loop value after some delay.
+
+    """
+    values = List()
+
+    def perform(self, value=None):
+        super(RecordTask, self).perform(value)
+        sleep(self.time)
+        self.values.append(self.get_from_database('Test_value'))
+
+
+class StopTask(RecordTask):
+    """ Task stopping the measure when the loop reaches a given value.
+
+    """
+    stop_value = Int()
+
+    def perform(self, value=None):
+        super(StopTask, self).perform(value)
+        if self.values[-1] == self.stop_value:
+            self.root_task.should_stop.set()
+
+
+class PointNumberTask(CheckTask):
+    """ Task recording the point number of the loop at each call.
+
+    """
+    numbers = List()
+
+    def perform(self, value=None):
+        super(PointNumberTask, self).perform(value)
+        self.numbers.append(self.get_from_database('Test_point_number'))
+
+
+def test_length_hint():
+    # Test estimating the length of iterables.
+    assert_equal(length_hint(range(5)), 5)
+    assert_equal(length_hint(iter(range(5))), 5)
+    assert_equal(length_hint((i for i in range(5))), 0)
+    assert_equal(length_hint((i for i in range(5)), 3), 3)
+
+
+def test_loop_statistics():
+    # Test the rate and smoothed iteration time computation.
+    stats = LoopStatistics(window=2, smoothing=0.5)
+    stats.update(0.0)
+    assert_equal(stats.iteration_time, None)
+    assert_equal(stats.rate, 0.0)
+    stats.update(1.0)
+    assert_equal(stats.iteration_time, 1.0)
+    stats.update(4.0)
+    assert_equal(stats.iteration_time, 2.0)
+    assert_equal(stats.rate, 0.5)
+    stats.update(5.0)
+    assert_equal(stats.rate, 0.5)
 
 
 class TestLoopTask(object):
@@ -178,6 +245,48 @@ class TestLoopTask(object):
         assert_equal(len(traceback), 1)
         assert_in('root/Test', traceback)
 
+    def test_check_adaptive_interface1(self):
+        # Simply test that everything is ok when all formulas are true.
+        interface = AdaptiveLoopInterface(observed='{Test_value}**2')
+        self.task.interface = interface
+
+        test, traceback = self.task.check()
+        assert_true(test)
+        assert_false(traceback)
+        assert_equal(self.task.get_from_database('Test_point_number'), 101)
+
+    def test_check_adaptive_interface2(self):
+        # Test handling wrong formulas and an inconsistent number of points.
+        interface = AdaptiveLoopInterface(observed='*1', start='1*')
+        self.task.interface = interface
+
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_equal(len(traceback), 2)
+        assert_in('root/Test-start', traceback)
+        assert_in('root/Test-observed', traceback)
+
+        interface.observed = '1.0'
+        interface.start = '0.0'
+        interface.max_points = '5'
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_in('root/Test-points', traceback)
+
+    def test_check_adaptive_interface3(self):
+        # Test that pipelining and checkpoints are refused.
+        interface = AdaptiveLoopInterface(observed='{Test_value}**2')
+        self.task.interface = interface
+        self.task.pipelined = True
+        self.task.checkpoint = True
+        self.task.resume = True
+
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_in('root/Test-pipelined', traceback)
+        assert_in('root/Test-checkpoint', traceback)
+        assert_in('root/Test-resume', traceback)
+
     def test_check_execution_order(self):
         # Test that the interface checks are run before the children checks.
         interface = IterableLoopInterface()
@@ -201,6 +310,91 @@ class TestLoopTask(object):
         self.task.perform()
         assert_equal(self.root.get_from_database('Test_value'), 10)
 
+    def test_check_generator(self):
+        # Test checking a loop on a generator with and without length hint.
+        interface = IterableLoopInterface()
+        interface.iterable = '(i for i in range(5))'
+        self.task.interface = interface
+
+        test, traceback = self.task.check()
+        assert_true(test)
+        assert_equal(self.task.get_from_database('Test_point_number'), 0)
+        assert_equal(self.task.get_from_database('Test_value'), 0)
+
+        interface.length_hint = '2*2'
+        test, traceback = self.task.check()
+        assert_true(test)
+        assert_equal(self.task.get_from_database('Test_point_number'), 4)
+
+        interface.length_hint = '2*'
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_in('root/Test-hint', traceback)
+
+    def test_perform_generator1(self):
+        # Test performing a loop on a generator without length hint.
+        interface = IterableLoopInterface()
+        interface.iterable = '(i for i in range(5))'
+        self.task.interface = interface
+        check = PointNumberTask(task_name='check', time=0)
+        self.task.children_task.append(check)
+
+        self.root.task_database.prepare_for_running()
+
+        self.task.perform()
+        assert_equal(check.perform_called, 5)
+        assert_equal(check.numbers, [1, 2, 3, 4, 5])
+        assert_equal(self.root.get_from_database('Test_point_number'), 5)
+        assert_equal(self.root.get_from_database('Test_value'), 4)
+
+    def test_perform_generator2(self):
+        # Test performing a loop on a generator with a wrong length hint.
+        interface = IterableLoopInterface()
+        interface.iterable = '(i for i in range(5))'
+        interface.length_hint = '10'
+        self.task.interface = interface
+        check = PointNumberTask(task_name='check', time=0)
+        self.task.children_task.append(check)
+
+        self.root.task_database.prepare_for_running()
+
+        self.task.perform()
+        assert_equal(check.numbers, [10]*5)
+        assert_equal(self.root.get_from_database('Test_point_number'), 5)
+
+    def test_statistics_entries(self):
+        # Test that the statistics entries are added and removed.
+        self.task.statistics = True
+        for e in ('rate', 'iteration_time', 'eta', 'measure_eta'):
+            assert_in(e, self.task.task_database_entries)
+        self.task.statistics = False
+        assert_not_in('eta', self.task.task_database_entries)
+
+    def test_perform_statistics(self):
+        # Test computing the remaining time in nested loops.
+        interface = IterableLoopInterface()
+        interface.iterable = 'range(3)'
+        self.task.interface = interface
+        inner = LoopTask(task_name='Inner', statistics=True)
+        inner_interface = IterableLoopInterface()
+        inner_interface.iterable = 'range(4)'
+        inner.interface = inner_interface
+        self.task.children_task.append(inner)
+        check = CheckTask(task_name='check', time=0.01)
+        inner.children_task.append(check)
+
+        self.root.task_database.prepare_for_running()
+
+        self.task.perform()
+        assert_equal(check.perform_called, 12)
+        # Last point of the measure.
+        eta = inner.get_from_database('Inner_eta')
+        iteration_time = inner.get_from_database('Inner_iteration_time')
+        assert_true(iteration_time > 0.005)
+        assert_equal(eta, iteration_time)
+        assert_equal(inner.get_from_database('Inner_measure_eta'), eta)
+        assert_true(inner.get_from_database('Inner_rate') > 0)
+
     def test_perform2(self):
         # Test performing a simple loop no timing. Linspace interface.
         interface = LinspaceLoopInterface()
@@ -293,6 +487,179 @@ class TestLoopTask(object):
         assert_equal(self.task.task.perform_value, 10)
         assert_false(self.task.children_task[1].perform_called)
 
+    def test_perform_adaptive(self):
+        # Test performing an adaptive loop.
+        interface = AdaptiveLoopInterface(max_points='31',
+                                          observed='{Test_value}')
+        self.task.interface = interface
+        self.task.children_task.append(CheckTask(task_name='check'))
+
+        self.root.task_database.prepare_for_running()
+
+        self.task.perform()
+        number = self.root.get_from_database('Test_point_number')
+        assert_true(11 <= number <= 31)
+        assert_equal(self.task.children_task[0].perform_called, number)
+        assert_equal(self.root.get_from_database('Test_index'), number)
+
+    def test_adaptive_sampler(self):
+        # Test that the points are concentrated where the observed value
+        # varies the most and that the tolerance is respected.
+        class FakeTask(object):
+            x = None
+            number = None
+
+            def format_and_eval_string(self, string):
+                return float(self.x > 0.52)
+
+            def write_in_database(self, name, value):
+                self.number = value
+
+        task = FakeTask()
+        sampler = AdaptiveSampler(task, 0.0, 1.0, 11, 41, 0.01, '')
+        values = []
+        for x in sampler:
+            task.x = x
+            values.append(x)
+
+        assert_equal(len(values), 41)
+        assert_equal(task.number, 41)
+        refined = values[11:]
+        assert_true(sum(1 for x in refined if 0.5 < x < 0.6) > 20)
+
+        # For a linear variation the coarse intervals are already below the
+        # tolerance (normalized length 0.14).
+        task = FakeTask()
+        task.format_and_eval_string = lambda string: task.x
+        sampler = AdaptiveSampler(task, 0.0, 1.0, 11, 41, 0.2, '')
+        for x in sampler:
+            task.x = x
+        assert_equal(task.number, 11)
+
+    def test_perform_pipelined1(self):
+        # Test that the background stage sees the values of its own point.
+        interface = IterableLoopInterface()
+        interface.iterable = 'range(10)'
+        self.task.interface = interface
+        self.task.pipelined = True
+        self.task.pipeline_depth = 2
+        foreground = CheckTask(task_name='fore', time=0.001)
+        background = RecordTask(task_name='back', time=0.01)
+        self.task.children_task.extend([foreground, background])
+
+        test, traceback = self.task.check()
+        assert_true(test)
+        self.root.task_database.prepare_for_running()
+
+        self.task.perform()
+        assert_equal(foreground.perform_called, 10)
+        assert_equal(background.values, range(10))
+        assert_false(self.root.should_stop.is_set())
+
+    def test_perform_pipelined2(self):
+        # Test breaking from the background stage.
+        interface = IterableLoopInterface()
+        interface.iterable = 'range(100)'
+        self.task.interface = interface
+        self.task.pipelined = True
+        self.task.background_children = 2
+        background = RecordTask(task_name='back')
+        self.task.children_task.extend([
+            CheckTask(task_name='fore'), background,
+            BreakTask(task_name='break', condition='{Test_value} == 2')])
+
+        self.root.task_database.prepare_for_running()
+
+        self.task.perform()
+        assert_equal(background.values, [0, 1, 2])
+        assert_true(self.task.children_task[0].perform_called < 100)
+
+    def test_perform_pipelined3(self):
+        # Test handling an error in the background stage.
+        interface = IterableLoopInterface()
+        interface.iterable = 'range(10)'
+        self.task.interface = interface
+        self.task.pipelined = True
+        self.task.children_task.extend([CheckTask(task_name='fore'),
+                                        ExceptionTask(task_name='back')])
+
+        self.root.task_database.prepare_for_running()
+
+        self.task.perform()
+        assert_true(self.root.should_stop.is_set())
+        assert_true(self.task.children_task[0].perform_called < 10)
+
+    def test_check_pipelined(self):
+        # Test checking the number of tasks in the background stage.
+        interface = IterableLoopInterface()
+        interface.iterable = 'range(10)'
+        self.task.interface = interface
+        self.task.pipelined = True
+        self.task.background_children = 2
+        self.task.children_task.append(CheckTask(task_name='fore'))
+
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_in('root/Test-pipeline', traceback)
+
+    def test_checkpoint_resume(self):
+        # Test saving checkpoints and resuming a stopped loop.
+        self.root.default_path = mkdtemp()
+        try:
+            interface = IterableLoopInterface()
+            interface.iterable = 'range(10)'
+            self.task.interface = interface
+            self.task.checkpoint = True
+            self.task.checkpoint_period = 3
+            stop = StopTask(task_name='stop', time=0, stop_value=7)
+            self.task.children_task.append(stop)
+            self.root.task_database.prepare_for_running()
+
+            self.task.perform()
+            assert_equal(stop.values, range(8))
+            path = self.task.checkpoint_path()
+            with open(path, 'rb') as f:
+                state = json.load(f)
+            assert_equal(state['index'], 6)
+            assert_equal(state['entries']['root/Test_value'], 5)
+
+            # Resume the loop.
+            self.root.should_stop.clear()
+            stop.values = []
+            stop.stop_value = -1
+            self.task.resume = True
+            self.task.perform()
+            assert_equal(stop.values, range(6, 10))
+            assert_true(self.task.resume)
+            assert_false(os.path.isfile(path))
+
+            # The loop resumes only once per measure.
+            stop.values = []
+            self.task._save_checkpoint(6, 10)
+            self.task.perform()
+            assert_equal(stop.values, range(10))
+
+            # Checking the measure allows to resume again.
+            self.task._save_checkpoint(6, 10)
+            self.task.check()
+            stop.values = []
+            self.task.perform()
+            assert_equal(stop.values, range(6, 10))
+        finally:
+            shutil.rmtree(self.root.default_path)
+
+    def test_check_checkpoint(self):
+        # Test checking the checkpoint period.
+        interface = IterableLoopInterface()
+        interface.iterable = 'range(10)'
+        self.task.interface = interface
+        self.task.checkpoint = True
+        self.task.checkpoint_period = 0
+
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_in('root/Test-checkpoint', traceback)
+
     def test_perform_timing1(self):
         # Test performing a simple loop timing.
         interface = IterableLoopInterface()
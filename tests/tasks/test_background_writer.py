@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : test_background_writer.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+from nose.tools import assert_equal, assert_true, assert_false
+from multiprocessing import Event
+from threading import Thread
+from time import sleep
+
+from hqc_meas.tasks.api import RootTask
+from hqc_meas.tasks.tools.background_writer import BackgroundWriter
+
+
+def test_writer_order():
+    # Test that operations are performed in order and drained on close.
+    root = RootTask(should_stop=Event(), should_pause=Event())
+    writer = BackgroundWriter(root)
+    done = []
+    writer.start()
+    for i in range(100):
+        writer.submit(done.append, i)
+    writer.close()
+    assert_equal(done, range(100))
+    assert_false(root.should_stop.is_set())
+
+
+def test_writer_backpressure():
+    # Test that submitting blocks when the queue is full.
+    root = RootTask(should_stop=Event(), should_pause=Event())
+    writer = BackgroundWriter(root, size=1)
+    writer.start()
+    writer.submit(sleep, 0.1)
+    writer.submit(sleep, 0)
+
+    submitted = []
+    thread = Thread(target=lambda: submitted.append(writer.submit(sleep, 0)))
+    thread.start()
+    sleep(0.05)
+    assert_false(submitted)
+    thread.join()
+    writer.wait()
+    writer.close()
+
+
+def test_writer_failure():
+    # Test that a failure stops the measure and that the following operations
+    # are discarded.
+    root = RootTask(should_stop=Event(), should_pause=Event())
+    writer = BackgroundWriter(root)
+    done = []
+    writer.start()
+    writer.submit(lambda: 1/0)
+    writer.submit(done.append, 1)
+    writer.close()
+    assert_true(writer.failed)
+    assert_true(root.should_stop.is_set())
+    assert_false(done)
@@ -6,7 +6,9 @@
 # =============================================================================
 from nose.tools import (raises, assert_equal, assert_false, assert_true,
                         assert_raises)
+from threading import Thread
 from hqc_meas.tasks.tools.task_database import TaskDatabase
+from hqc_meas.utils.tracing import Tracer, set_tracer
 
 from ..util import complete_line
 
@@ -257,3 +259,87 @@ def test_get_set_on_flat_database3():
 
     assert_false(database.set_value('root/node1', 'val2', 2))
     assert_equal(database.get_value('root/node1', 'val2'), 2)
+
+
+def test_set_on_flat_database_traced():
+    # Test that the writes are recorded by the active tracer.
+    database = TaskDatabase()
+    database.set_value('root', 'val1', 1)
+    database.prepare_for_running()
+
+    tracer = Tracer()
+    set_tracer(tracer)
+    try:
+        database.set_value('root', 'val1', 2)
+    finally:
+        set_tracer(None)
+    assert_equal(len(tracer.events), 1)
+    assert_equal(tracer.events[0][:2], ('root/val1', 'database'))
+
+
+def test_set_values():
+    # Test setting several values at once in both modes.
+    database = TaskDatabase()
+    database.set_value('root', 'val1', 1)
+    assert_true(database.set_values('root', {'val1': 2, 'val2': 'a'}))
+    assert_equal(database.get_value('root', 'val1'), 2)
+    assert_equal(database.get_value('root', 'val2'), 'a')
+
+    notifications = []
+    database.observe('notifier', lambda change: notifications.append(
+        change['value']))
+    database.prepare_for_running()
+    assert_false(database.set_values('root', {'val1': 3, 'val2': 'b'}))
+    assert_equal(database.get_value('root', 'val1'), 3)
+    assert_equal(database.get_value('root', 'val2'), 'b')
+    assert_equal(sorted(notifications), [('root/val1', 3), ('root/val2', 'b')])
+
+
+def test_snapshot():
+    # Test reading and writing values through a thread local snapshot.
+    database = TaskDatabase()
+    database.set_value('root', 'val1', 1)
+    database.set_value('root', 'val2', 'a')
+    database.prepare_for_running()
+
+    snapshot = database.snapshot()
+    database.set_value('root', 'val1', 2)
+    database.use_snapshot(snapshot)
+    try:
+        assert_equal(database.get_value('root', 'val1'), 1)
+        index = database.get_entries_indexes('root', ['val1'])['val1']
+        assert_equal(database.get_values_by_index([index]), [1])
+
+        database.set_value('root', 'val2', 'b')
+        assert_equal(database.get_value('root', 'val2'), 'b')
+
+        seen = []
+        thread = Thread(target=lambda: seen.append(database.get_value('root',
+                                                                      'val1')))
+        thread.start()
+        thread.join()
+        assert_equal(seen, [2])
+    finally:
+        database.use_snapshot(None)
+
+    assert_equal(database.get_value('root', 'val1'), 2)
+    assert_equal(database.get_value('root', 'val2'), 'b')
+
+
+def test_dump_load_values():
+    # Test dumping and restoring the values of the flat database.
+    database = TaskDatabase()
+    database.set_value('root', 'val1', 1)
+    database.create_node('root', 'node1')
+    database.set_value('root/node1', 'val2', 'a')
+    database.prepare_for_running()
+
+    values = database.dump_values()
+    assert_equal(values, {'root/val1': 1, 'root/node1/val2': 'a'})
+
+    notifications = []
+    database.observe('notifier', lambda change:
+                     notifications.append(change['value']))
+    database.load_values({'root/val1': 2, 'root/unknown': 3})
+    assert_equal(database.get_value('root', 'val1'), 2)
+    assert_false(notifications)
@@ -5,10 +5,19 @@
 # license : MIT license
 # =============================================================================
 from hqc_meas.tasks.api import RootTask
-from nose.tools import assert_true, assert_false
+from hqc_meas.tasks.tasks_util.save_tasks import SaveTask
+from hqc_meas.tasks.tasks_logic.loop_task import LoopTask
+from hqc_meas.tasks.tasks_logic.loop_iterable_interface\
+    import IterableLoopInterface
+from hqc_meas.utils.tracing import get_tracer
+from nose.tools import (assert_true, assert_false, assert_in, assert_equal,
+                        assert_is_none)
 from multiprocessing import Event
 from threading import Thread
 from time import sleep
+from tempfile import mkdtemp
+from shutil import rmtree
+import os
 
 from ..util import complete_line
 from.testing_utilities import CheckTask, ExceptionTask
@@ -188,3 +197,114 @@ class TestTaskExecution(object):
         assert_true(root.should_stop.is_set())
         assert_true(par.perform_called)
         assert_false(par2.perform_called)
+
+    def test_lock_monitoring(self):
+        # Test that the locks statistics are collected when asked to.
+        root = self.root
+        root.monitor_locks = True
+        par = CheckTask(task_name='test', time=0.1)
+        par.parallel = {'activated': True, 'pool': 'test'}
+        aux = CheckTask(task_name='wait')
+        aux.wait = {'activated': True}
+        root.children_task.extend([par, aux])
+
+        root.perform()
+
+        monitor = root.lock_monitor
+        assert_true(monitor)
+        locks = {l.name: l for l in monitor.locks}
+        assert_true(locks['SharedDict threads'].count)
+        assert_in('root/wait', monitor.waits)
+        assert_true(monitor.waits['root/wait'][1] > 0.05)
+        assert_in('root/wait', monitor.format_report())
+
+    def test_task_profiling(self):
+        # Test that the execution times are collected when asked to.
+        root = self.root
+        root.profile_tasks = True
+        par = CheckTask(task_name='test', time=0.1)
+        par.parallel = {'activated': True, 'pool': 'test'}
+        aux = CheckTask(task_name='wait')
+        aux.wait = {'activated': True}
+        root.children_task.extend([par, aux])
+
+        root.perform()
+
+        summary = root.profiler.summary()
+        assert_true(summary['tasks']['root/test']['total'] > 0.05)
+        assert_equal(summary['tasks']['root/wait']['count'], 1)
+        # The wait time should not be counted in the execution time.
+        assert_true(summary['tasks']['root/wait']['total'] < 0.05)
+        assert_true(summary['waits']['root/wait']['total'] > 0.05)
+
+        # The perform_ methods should have been restored.
+        root.profiler = None
+        root.profile_tasks = False
+        root.perform()
+        assert_false(root.should_stop.is_set())
+        assert_equal(par.perform_called, 2)
+
+    def test_task_tracing(self):
+        # Test that a timeline is recorded when asked to.
+        root = self.root
+        root.trace_execution = True
+        par = CheckTask(task_name='test')
+        par.parallel = {'activated': True, 'pool': 'test'}
+        aux = CheckTask(task_name='wait')
+        aux.wait = {'activated': True}
+        root.children_task.extend([par, aux])
+
+        root.perform()
+
+        tasks = [e for e in root.tracer.events if e[1] == 'task']
+        assert_equal(sorted(e[0] for e in tasks), ['root/test', 'root/wait'])
+        # The parallel task should have been recorded in its own thread.
+        assert_equal(len(set(e[4] for e in tasks)), 2)
+        assert_is_none(get_tracer())
+
+    def test_background_writing(self):
+        # Test that the lines written in the background are all written
+        # before the file is closed.
+        root = self.root
+        root.default_path = mkdtemp()
+        try:
+            save = SaveTask(task_name='save', saving_target='File',
+                            folder=root.default_path, filename='test.txt',
+                            saved_values=[('val', '{loop_value}')],
+                            flush_policy='At close', background_writing=True)
+            loop = LoopTask(task_name='loop', children_task=[save])
+            loop.interface = IterableLoopInterface(iterable='range(50)')
+            root.children_task.append(loop)
+
+            root.perform()
+            assert_false(root.should_stop.is_set())
+            assert_is_none(root.writer)
+            with open(os.path.join(root.default_path, 'test.txt')) as f:
+                lines = f.readlines()
+            assert_equal(lines, ['val\n'] + [str(i) + '\n'
+                                             for i in range(50)])
+        finally:
+            rmtree(root.default_path)
+
+    def test_concurrent_saving_missing_row(self):
+        # Test that the rows waiting for a missing row are written before the
+        # file is closed.
+        root = self.root
+        root.default_path = mkdtemp()
+        try:
+            save = SaveTask(task_name='save', saving_target='File',
+                            folder=root.default_path, filename='test.txt',
+                            saved_values=[('val', '{loop_value}')],
+                            concurrent=True,
+                            row_index='{loop_value} + ({loop_value} > 1)')
+            loop = LoopTask(task_name='loop', children_task=[save])
+            loop.interface = IterableLoopInterface(iterable='range(5)')
+            root.children_task.append(loop)
+
+            root.perform()
+            with open(os.path.join(root.default_path, 'test.txt')) as f:
+                lines = f.readlines()
+            assert_equal(lines, ['val\n'] + [str(i) + '\n'
+                                             for i in range(5)])
+        finally:
+            rmtree(root.default_path)
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : test_lock_monitoring.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+from nose.tools import assert_equal, assert_true, assert_in
+from threading import Thread, RLock, Lock, Event
+from time import sleep
+
+from hqc_meas.tasks.tools.lock_monitoring import LockMonitor
+
+
+def test_instrumented_lock():
+    # Test the statistics collected when two threads compete for a lock.
+    monitor = LockMonitor()
+    lock = monitor.wrap(Lock(), 'test')
+    acquired = Event()
+
+    def holder():
+        with lock:
+            acquired.set()
+            sleep(0.05)
+
+    t = Thread(target=holder)
+    t.start()
+    acquired.wait()
+    with lock:
+        pass
+    t.join()
+
+    assert_equal(lock.count, 2)
+    assert_true(lock.wait_time > 0.02)
+    assert_true(lock.max_hold > 0.02)
+    assert_in('test', monitor.format_report())
+
+
+def test_instrumented_rlock():
+    # Test that only the outermost acquisition counts for the hold time.
+    monitor = LockMonitor()
+    lock = monitor.wrap(RLock(), 'test')
+    with lock:
+        with lock:
+            pass
+        sleep(0.02)
+
+    assert_equal(lock.count, 2)
+    assert_true(lock.max_hold > 0.01)
+
+
+def test_record_wait():
+    monitor = LockMonitor()
+    monitor.record_wait('root/task', 1.0)
+    monitor.record_wait('root/task', 2.0)
+    assert_equal(monitor.waits['root/task'], (2, 3.0, 2.0))
+    assert_in('root/task', monitor.format_report())
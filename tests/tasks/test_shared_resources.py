@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : test_shared_resources.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+from nose.tools import (assert_equal, assert_true, assert_false, assert_in,
+                        assert_not_in, assert_raises)
+from threading import Thread, Event
+from timeit import default_timer
+
+from hqc_meas.tasks.tools.shared_resources import SharedDict, ThreadsCounter
+
+
+def test_shared_dict_basic():
+    # Test the dict like interface.
+    shared = SharedDict()
+    shared['a'] = 1
+    assert_equal(shared['a'], 1)
+    assert_in('a', shared)
+    assert_equal(len(shared), 1)
+    assert_equal(list(shared), ['a'])
+    assert_equal(shared.get('b', 2), 2)
+    assert_raises(KeyError, shared.__getitem__, 'b')
+
+    del shared['a']
+    assert_not_in('a', shared)
+    assert_equal(len(shared), 0)
+
+
+def test_shared_dict_default():
+    # Test that missing values are created only when accessed by item.
+    shared = SharedDict(list)
+    assert_equal(shared.get('a'), None)
+    assert_not_in('a', shared)
+    assert_equal(shared['a'], [])
+    assert_in('a', shared)
+
+    with shared.safe_access('b') as val:
+        val.append(1)
+    assert_equal(shared['b'], [1])
+
+
+def test_shared_dict_setdefault():
+    shared = SharedDict()
+    assert_equal(shared.setdefault('a', 1), 1)
+    assert_equal(shared.setdefault('a', 2), 1)
+
+
+def test_shared_dict_safe_access_exception():
+    # Test that the lock is released even if an error occurs.
+    shared = SharedDict(list)
+
+    def aux():
+        with shared.safe_access('a'):
+            raise ValueError()
+
+    assert_raises(ValueError, aux)
+
+    t = Thread(target=shared.__setitem__, args=('b', 1))
+    t.start()
+    t.join(1)
+    assert_false(t.is_alive())
+
+
+def test_shared_dict_iteration_snapshot():
+    # Test that iterating while modifying the dict does not crash and that
+    # the iteration sees a consistent state.
+    shared = SharedDict()
+    for i in range(10):
+        shared[i] = i
+
+    keys = []
+    for key in shared:
+        shared[key + 100] = key
+        keys.append(key)
+
+    assert_equal(keys, range(10))
+    assert_equal(len(shared), 20)
+
+
+def test_shared_dict_lock_free_reads():
+    # Test that reads are not blocked by a writer holding the lock.
+    shared = SharedDict()
+    shared['a'] = 1
+    locked = Event()
+    release = Event()
+
+    def writer():
+        with shared.locked():
+            locked.set()
+            release.wait()
+
+    t = Thread(target=writer)
+    t.start()
+    locked.wait()
+    try:
+        res = []
+        reader = Thread(target=lambda: res.append((shared['a'], 'a' in shared,
+                                                   len(shared), list(shared))))
+        reader.start()
+        reader.join(1)
+        assert_false(reader.is_alive())
+        assert_equal(res, [(1, True, 1, ['a'])])
+    finally:
+        release.set()
+        t.join()
+
+
+def test_shared_dict_stress():
+    # Test many threads reading, iterating and writing concurrently.
+    shared = SharedDict(list)
+    n_threads = 20
+    n_ops = 500
+    errors = []
+
+    def writer(i):
+        try:
+            for j in range(n_ops):
+                with shared.safe_access(i) as val:
+                    val.append(j)
+                shared[(i, j % 10)] = j
+        except Exception as e:
+            errors.append(e)
+
+    def reader():
+        try:
+            for j in range(n_ops):
+                for key in shared:
+                    assert_in(key, shared)
+                len(shared)
+                shared.get(0)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [Thread(target=writer, args=(i,)) for i in range(n_threads)]
+    threads += [Thread(target=reader) for i in range(n_threads)]
+    tic = default_timer()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = default_timer() - tic
+
+    assert_false(errors)
+    for i in range(n_threads):
+        assert_equal(shared[i], range(n_ops))
+    assert_equal(len(shared), n_threads*11)
+    # Very loose bound only here to catch a dead lock like behaviour.
+    assert_true(elapsed < 60)
+
+
+def test_threads_counter_transitions():
+    # Test that the callbacks are only called on the relevant transitions.
+    calls = []
+    counter = ThreadsCounter(1, lambda: calls.append('paused'),
+                             lambda: calls.append('resumed'))
+    counter.increment_active()
+    counter.decrement_active()
+    assert_false(calls)
+
+    counter.increment_active()
+    counter.increment_paused()
+    assert_false(calls)
+    counter.increment_paused()
+    assert_equal(calls, ['paused'])
+    assert_true(counter.wait_all_paused(0))
+
+    counter.decrement_paused()
+    assert_equal(calls, ['paused'])
+    counter.decrement_paused()
+    assert_equal(calls, ['paused', 'resumed'])
+    assert_false(counter.wait_all_paused(0))
+
+
+def test_threads_counter_wait():
+    # Test waiting for all threads to pause.
+    counter = ThreadsCounter(2)
+    counter.increment_paused()
+    t = Thread(target=counter.increment_paused)
+    t.start()
+    assert_true(counter.wait_all_paused(1))
+    t.join()
+    assert_equal(counter.paused_count, 2)
+    assert_equal(counter.active_count, 2)
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : test_task_profiler.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+from nose.tools import assert_equal, assert_true, assert_in
+import os
+import json
+from tempfile import mkdtemp
+from shutil import rmtree
+
+from hqc_meas.tasks.tools.task_profiler import (TimingStatistics,
+                                                TaskProfiler)
+
+
+def test_timing_statistics():
+    # Test the aggregated statistics and the percentiles estimation.
+    stats = TimingStatistics()
+    for i in range(1, 1001):
+        stats.add(i*1e-3)
+
+    summary = stats.summary()
+    assert_equal(summary['count'], 1000)
+    assert_true(abs(summary['total'] - 500.5) < 1e-9)
+    assert_true(abs(summary['mean'] - 0.5005) < 1e-9)
+    assert_equal(summary['max'], 1.0)
+    assert_true(abs(summary['p50'] - 0.5) < 0.05*0.5)
+    assert_true(abs(summary['p99'] - 0.99) < 0.05*0.99)
+
+
+def test_timing_statistics_short_durations():
+    # Test that durations below one second fall in the right bin.
+    for duration in (0.3, 3e-5, 1.7):
+        stats = TimingStatistics()
+        for i in range(10):
+            stats.add(duration)
+        assert_true(abs(stats.percentile(0.5) - duration) < 0.05*duration)
+
+
+def test_timing_statistics_empty():
+    summary = TimingStatistics().summary()
+    assert_equal(summary['count'], 0)
+    assert_equal(summary['p99'], 0.0)
+
+
+def test_profiler_report_and_dump():
+    profiler = TaskProfiler()
+    profiler.record_task('root/a', 0.1)
+    profiler.record_wait('root/b', 0.2)
+    profiler.record_pause('MainThread', 0.3)
+
+    report = profiler.format_report()
+    for name in ('root/a', 'root/b', 'MainThread'):
+        assert_in(name, report)
+
+    directory = mkdtemp()
+    try:
+        path = os.path.join(directory, 'test_profile.json')
+        profiler.dump(path)
+        with open(path) as f:
+            data = json.load(f)
+        assert_equal(data['tasks']['root/a']['count'], 1)
+        assert_equal(data['waits']['root/b']['max'], 0.2)
+        assert_equal(data['pauses']['MainThread']['total'], 0.3)
+    finally:
+        rmtree(directory)
@@ -7,7 +7,7 @@
 """
 """
 from nose.tools import (assert_equal, assert_true, assert_false, assert_in,
-                        assert_not_in)
+                        assert_not_in, assert_almost_equal)
 from nose.plugins.attrib import attr
 from multiprocessing import Event
 from enaml.workbench.api import Workbench
@@ -15,7 +15,8 @@ import numpy as np
 
 from hqc_meas.tasks.api import RootTask
 from hqc_meas.tasks.tasks_util.array_tasks import (ArrayExtremaTask,
-                                                   ArrayFindValueTask)
+                                                   ArrayFindValueTask,
+                                                   ArrayStatisticsTask)
 
 import enaml
 with enaml.imports():
@@ -188,6 +189,119 @@ class TestArrayExtremaTask(object):
         assert_equal(self.task.get_from_database('Test_max_value'), 0.0)
 
 
+class TestArrayStatisticsTask(object):
+
+    def setup(self):
+        self.root = RootTask(should_stop=Event(), should_pause=Event())
+        self.task = ArrayStatisticsTask(task_name='Test')
+        self.root.children_task.append(self.task)
+        array = np.zeros((5,), dtype=[('var1', 'f8'), ('var2', 'f8')])
+        self.root.write_in_database('array', array)
+        self.root.write_in_database('rows', 0)
+
+    def test_check1(self):
+        # Simply test that everything is ok if the array exists.
+        self.task.target_array = '{Root_array}'
+        self.task.column_name = 'var1'
+        self.task.valid_rows = '{Root_rows}'
+
+        test, traceback = self.task.check()
+        assert_true(test)
+        assert_false(traceback)
+
+    def test_check2(self):
+        # Test handling a wrong formula and a missing column.
+        self.task.target_array = '{Root_array}'
+        self.task.valid_rows = '{Root_rows*}'
+
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_in('root/Test-rows', traceback)
+        assert_in('root/Test-column', traceback)
+
+    def test_perform1(self):
+        # Test updating the statistics of a preallocated array.
+        data = np.random.rand(50)
+        array = np.zeros((50,), dtype=[('var1', 'f8')])
+        self.root.write_in_database('array', array)
+        self.task.target_array = '{Root_array}'
+        self.task.column_name = 'var1'
+        self.task.valid_rows = '{Root_rows}'
+        self.root.task_database.prepare_for_running()
+
+        for i in (1, 2, 10, 11, 50):
+            array['var1'][:i] = data[:i]
+            self.root.write_in_database('rows', i)
+            self.task.perform()
+            get = self.task.get_from_database
+            assert_equal(get('Test_count'), i)
+            assert_almost_equal(get('Test_mean'), np.mean(data[:i]))
+            assert_almost_equal(get('Test_variance'),
+                                np.var(data[:i], ddof=1) if i > 1 else 0)
+            assert_equal(get('Test_min_ind'), np.argmin(data[:i]))
+            assert_equal(get('Test_max_ind'), np.argmax(data[:i]))
+            assert_equal(get('Test_max_value'), np.max(data[:i]))
+
+        # Only the new rows are processed.
+        array['var1'][:] = 0
+        self.task.perform()
+        assert_equal(self.task.get_from_database('Test_max_value'),
+                     np.max(data))
+
+    def test_perform2(self):
+        # Test resetting the statistics when a new array is started.
+        self.task.target_array = '{Root_array}'
+        self.root.task_database.prepare_for_running()
+
+        self.root.write_in_database('array', np.array([1.0, 5.0, 3.0]))
+        self.task.perform()
+        assert_equal(self.task.get_from_database('Test_max_ind'), 1)
+
+        self.root.write_in_database('array', np.array([-1.0]))
+        self.task.perform()
+        assert_equal(self.task.get_from_database('Test_count'), 1)
+        assert_equal(self.task.get_from_database('Test_max_value'), -1.0)
+        assert_equal(self.task.get_from_database('Test_mean'), -1.0)
+
+    def test_perform3(self):
+        # Test resetting the statistics when an array of the same length
+        # replaces the previous one.
+        self.task.target_array = '{Root_array}'
+        self.root.task_database.prepare_for_running()
+
+        self.root.write_in_database('array', np.array([1.0, 5.0, 3.0]))
+        self.task.perform()
+
+        self.root.write_in_database('array', np.array([-1.0, -2.0, -3.0]))
+        self.task.perform()
+        get = self.task.get_from_database
+        assert_equal(get('Test_count'), 3)
+        assert_equal(get('Test_mean'), -2.0)
+        assert_equal(get('Test_max_value'), -1.0)
+        assert_equal(get('Test_min_ind'), 2)
+
+    def test_perform4(self):
+        # Test that checking the task resets all the statistics.
+        self.task.target_array = '{Root_array}'
+        self.task.column_name = 'var1'
+        self.task.valid_rows = '{Root_rows}'
+        self.root.task_database.prepare_for_running()
+
+        array = self.root.get_from_database('Root_array')
+        array['var1'][:] = [1.0, 5.0, 3.0, 2.0, 4.0]
+        self.root.write_in_database('rows', 5)
+        self.task.perform()
+
+        self.task.check()
+        self.root.write_in_database('rows', 0)
+        self.task.perform()
+        get = self.task.get_from_database
+        assert_equal(get('Test_count'), 0)
+        assert_equal(get('Test_mean'), 0.0)
+        assert_equal(get('Test_max_value'), 0.0)
+        assert_equal(get('Test_max_ind'), 0)
+
+
 @attr('ui')
 class TestArrayExtremaView(object):
 
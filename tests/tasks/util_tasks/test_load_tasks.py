@@ -7,16 +7,19 @@
 """
 """
 from nose.tools import (assert_equal, assert_true, assert_false, assert_in,
-                        assert_is, assert_is_instance)
+                        assert_is, assert_is_not, assert_is_instance)
 from nose.plugins.attrib import attr
 from multiprocessing import Event
 from enaml.workbench.api import Workbench
 import numpy as np
 import os
+import gzip
 
 from hqc_meas.tasks.api import RootTask
 from hqc_meas.tasks.tasks_util.load_tasks import (LoadArrayTask,
-                                                  CSVLoadInterface)
+                                                  CSVLoadInterface,
+                                                  NPYLoadInterface,
+                                                  LoadCache, LOAD_CACHE)
 
 import enaml
 with enaml.imports():
@@ -54,6 +57,7 @@ class TestLoadArrayTaskCSVInterface(object):
             os.remove(full_path)
 
     def setup(self):
+        LOAD_CACHE.clear()
         self.root = RootTask(should_stop=Event(), should_pause=Event())
         self.task = LoadArrayTask(task_name='Test')
         self.task.interface = CSVLoadInterface()
@@ -90,6 +94,167 @@ class TestLoadArrayTaskCSVInterface(object):
         array = self.task.get_from_database('Test_array')
         np.testing.assert_array_equal(array, self.data)
 
+    def test_perform2(self):
+        # Test loading a gzip compressed csv file.
+        full_path = os.path.join(FOLDER_PATH, 'fake_comp.dat.gz')
+        with open(os.path.join(FOLDER_PATH, 'fake.dat'), 'rb') as f:
+            content = f.read()
+        with gzip.open(full_path, 'wb') as f:
+            f.write(content)
+
+        self.task.filename = 'fake_comp.dat.gz'
+        try:
+            test, traceback = self.task.check()
+            assert_true(test)
+            array = self.task.get_from_database('Test_array')
+            assert_equal(array.dtype.names, ('Freq', 'Log'))
+
+            self.task.perform()
+            array = self.task.get_from_database('Test_array')
+            np.testing.assert_array_equal(array, self.data)
+        finally:
+            os.remove(full_path)
+
+
+    def test_perform3(self):
+        # Test that unchanged files are not parsed again.
+        self.task.perform()
+        array = self.task.get_from_database('Test_array')
+        assert_true(array.flags.writeable)
+
+        self.task.use_cache = True
+        self.task.perform()
+        array = self.task.get_from_database('Test_array')
+        assert_false(array.flags.writeable)
+        self.task.perform()
+        assert_is(self.task.get_from_database('Test_array'), array)
+
+        self.task.use_cache = False
+        self.task.perform()
+        assert_is_not(self.task.get_from_database('Test_array'), array)
+
+    def test_perform4(self):
+        # Test falling back on genfromtxt when values are missing.
+        full_path = os.path.join(FOLDER_PATH, 'fake_missing.dat')
+        with open(full_path, 'wb') as f:
+            f.write('# this is a comment \nFreq\tLog\n1.0\t2.0\n3.0\t\n')
+
+        self.task.filename = 'fake_missing.dat'
+        try:
+            self.task.perform()
+        finally:
+            os.remove(full_path)
+        array = self.task.get_from_database('Test_array')
+        np.testing.assert_array_equal(array['Freq'], [1.0, 3.0])
+        assert_true(np.isnan(array['Log'][1]))
+
+
+def test_column_names():
+    # Test that the names are the same whatever the parser used.
+    full_path = os.path.join(FOLDER_PATH, 'fake_names.dat')
+    task = LoadArrayTask(task_name='Test', folder=FOLDER_PATH,
+                         filename='fake_names.dat')
+    interface = CSVLoadInterface()
+    task.interface = interface
+    try:
+        with open(full_path, 'wb') as f:
+            f.write('Freq (Hz)\tLog\n1.0\t2.0\n')
+        fast = interface.load_file(full_path)
+        with open(full_path, 'wb') as f:
+            f.write('Freq (Hz)\tLog\n1.0\t\n')
+        slow = interface.load_file(full_path)
+    finally:
+        os.remove(full_path)
+    assert_equal(fast.dtype.names, ('Freq_Hz', 'Log'))
+    assert_equal(slow.dtype.names, fast.dtype.names)
+
+
+def test_load_cache():
+    # Test the invalidation and the size limit of the cache.
+    full_path = os.path.join(FOLDER_PATH, 'fake_cache.dat')
+    with open(full_path, 'wb') as f:
+        f.write('1')
+    calls = []
+
+    def loader(path):
+        calls.append(path)
+        return np.array([len(calls)])
+
+    cache = LoadCache(size=1)
+    try:
+        assert_equal(cache.load(full_path, (), loader), [1])
+        assert_equal(cache.load(full_path, (), loader), [1])
+        assert_equal(cache.load(full_path, ('opt',), loader), [2])
+        # The first entry has been discarded.
+        assert_equal(cache.load(full_path, (), loader), [3])
+
+        with open(full_path, 'wb') as f:
+            f.write('12')
+        assert_equal(cache.load(full_path, (), loader), [4])
+    finally:
+        os.remove(full_path)
+
+
+class TestLoadArrayTaskNPYInterface(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.data = np.rec.fromarrays([np.arange(5.), np.ones(5)],
+                                     names=['Freq', 'Log'])
+        np.save(os.path.join(FOLDER_PATH, 'fake.npy'), cls.data)
+
+    @classmethod
+    def teardown_class(cls):
+        full_path = os.path.join(FOLDER_PATH, 'fake.npy')
+        if os.path.isfile(full_path):
+            os.remove(full_path)
+
+    def setup(self):
+        LOAD_CACHE.clear()
+        self.root = RootTask(should_stop=Event(), should_pause=Event())
+        self.task = LoadArrayTask(task_name='Test')
+        self.task.interface = NPYLoadInterface()
+        self.task.folder = FOLDER_PATH
+        self.task.filename = 'fake.npy'
+        self.root.children_task.append(self.task)
+
+    def test_check(self):
+        # Test that the check reads the dtype of the array.
+        test, traceback = self.task.check()
+        assert_true(test)
+        assert_false(traceback)
+        array = self.task.get_from_database('Test_array')
+        assert_equal(array.dtype.names, ('Freq', 'Log'))
+
+    def test_perform1(self):
+        # Test loading the array in memory.
+        self.task.perform()
+        array = self.task.get_from_database('Test_array')
+        assert_false(isinstance(array, np.memmap))
+        np.testing.assert_array_equal(array, self.data)
+
+    def test_perform2(self):
+        # Test mapping the array in memory.
+        self.task.interface.mmap_mode = 'r'
+        self.task.perform()
+        array = self.task.get_from_database('Test_array')
+        assert_is_instance(array, np.memmap)
+        np.testing.assert_array_equal(array['Freq'], self.data['Freq'])
+
+    def test_perform3(self):
+        # Test that copy-on-write maps stay writable when using the cache.
+        self.task.interface.mmap_mode = 'c'
+        self.task.use_cache = True
+        self.task.perform()
+        array = self.task.get_from_database('Test_array')
+        assert_true(array.flags.writeable)
+        array['Freq'][0] = 10
+
+        self.task.perform()
+        new = self.task.get_from_database('Test_array')
+        assert_is_not(new, array)
+        assert_equal(new['Freq'][0], 0)
+
 
 @attr('ui')
 class TestLoadArrayView(object):
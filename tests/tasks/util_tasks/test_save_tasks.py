@@ -7,17 +7,35 @@
 """
 """
 from nose.tools import (assert_equal, assert_true, assert_false, assert_in,
-                        assert_not_in, assert_raises)
+                        assert_not_in, assert_raises, assert_is)
 from nose.plugins.attrib import attr
+from nose.plugins.skip import SkipTest
 from multiprocessing import Event
 from enaml.workbench.api import Workbench
 import os
+import json
 import shutil
+import random
+import sqlite3
 import numpy as np
+from threading import Thread, local
+from tempfile import mkdtemp
 
 from hqc_meas.tasks.api import RootTask
+from hqc_meas.tasks.tasks_logic.loop_task import LoopTask
 from hqc_meas.tasks.tasks_util.save_tasks import (SaveTask, SaveArrayTask,
-                                                  SaveFileTask)
+                                                  SaveFileTask,
+                                                  SaveChunkedTask,
+                                                  SaveSQLiteTask)
+from hqc_meas.tasks.tasks_util.chunked_storage import (load_container,
+                                                       NpyChunksContainer,
+                                                       HDF5Container, h5py)
+from hqc_meas.tasks.tasks_util.array_storage import (GrowingArray,
+                                                     OrderedRows,
+                                                     load_binary_file)
+from hqc_meas.tasks.tasks_util.compressed_files import open_data_file
+from hqc_meas.tasks.tasks_util.sqlite_storage import array_from_blob
+from hqc_meas.tasks.tools.background_writer import BackgroundWriter
 
 import enaml
 with enaml.imports():
@@ -208,17 +226,16 @@ class TestSaveTask(object):
                      np.array([1.0]))
 
     def test_check8(self):
-        # Test check issues in array mode : absent array_size.
+        # Test check in array mode : absent array_size (growing array).
         task = self.task
         task.saving_target = 'Array'
-        task.saved_values = [('toto', '{Root_str}'), ('tata', '{Root_float}')]
+        task.saved_values = [('toto', '{Root_int}'), ('tata', '{Root_float}')]
 
         test, traceback = task.check()
-        assert_false(test)
-        assert_true(traceback)
-        assert_equal(len(traceback), 1)
-        assert_equal(self.task.get_from_database('Test_array'),
-                     np.array([1.0]))
+        assert_true(test)
+        assert_false(traceback)
+        array = task.get_from_database('Test_array')
+        assert_equal(array.dtype.names, ('toto', 'tata'))
 
     def test_check9(self):
         # Test check issues in entrie.
@@ -296,6 +313,51 @@ class TestSaveTask(object):
             assert_equal(a, ['test\n', '# test\n', 'toto\ttata\n', 'a\t2.0\n',
                              'a\t2.0\n', 'a\t2.0\n'])
 
+    def test_perform_flush1(self):
+        # Test flushing the file every N lines.
+        task = self.task
+        task.saving_target = 'File'
+        task.folder = self.test_dir
+        task.filename = 'test_flush.txt'
+        task.array_size = '5'
+        task.saved_values = [('toto', '{Root_str}'), ('tata', '{Root_float}')]
+        task.flush_policy = 'Every N lines'
+        task.flush_lines = 2
+        file_path = os.path.join(self.test_dir, 'test_flush.txt')
+
+        task.perform()
+        with open(file_path) as f:
+            assert_equal(f.readlines(), ['toto\ttata\n'])
+        task.perform()
+        with open(file_path) as f:
+            assert_equal(len(f.readlines()), 3)
+        task.perform()
+        with open(file_path) as f:
+            assert_equal(len(f.readlines()), 3)
+
+        # Closing through the root task files flushes the remaining lines.
+        self.root.files[file_path].close()
+        with open(file_path) as f:
+            assert_equal(len(f.readlines()), 4)
+
+    def test_perform_flush2(self):
+        # Test flushing the file only when closing it.
+        task = self.task
+        task.saving_target = 'File'
+        task.folder = self.test_dir
+        task.filename = 'test_flush.txt'
+        task.array_size = '2'
+        task.saved_values = [('toto', '{Root_str}')]
+        task.flush_policy = 'At close'
+        file_path = os.path.join(self.test_dir, 'test_flush.txt')
+
+        task.perform()
+        with open(file_path) as f:
+            assert_equal(len(f.readlines()), 1)
+        task.perform()
+        with open(file_path) as f:
+            assert_equal(f.readlines(), ['toto\n', 'a\n', 'a\n'])
+
     def test_perform2(self):
         # Test performing in array mode. (Call three times perform)
         task = self.task
@@ -326,6 +388,435 @@ class TestSaveTask(object):
         array[2] = (1, 2.0)
         np.testing.assert_array_equal(task.array, array)
 
+    def test_perform_growing(self):
+        # Test performing in array mode without a size.
+        task = self.task
+        task.saving_target = 'Array'
+        task.saved_values = [('toto', '{Root_int}'), ('tata', '{Root_float}')]
+
+        for i in range(100):
+            self.root.write_in_database('float', float(i))
+            task.perform()
+
+        assert_true(task.initialized)
+        assert_equal(task.line_index, 100)
+        array = task.get_from_database('Test_array')
+        assert_equal(len(array), 100)
+        np.testing.assert_array_equal(array['tata'], np.arange(100.))
+        growing = self.root.files['root/Test-array']
+        assert_equal(growing.capacity, 128)
+
+        growing.close()
+        array = task.get_from_database('Test_array')
+        assert_equal(len(array), 100)
+        assert_true(array.flags['OWNDATA'])
+        np.testing.assert_array_equal(task.array['toto'], np.ones(100))
+
+    def test_check_types(self):
+        # Test checking the column types.
+        task = self.task
+        task.saving_target = 'Array'
+        task.array_size = '3'
+        task.saved_values = [('toto', '{Root_int}'), ('tata', '{Root_float}')]
+        task.column_types = 'toto: i4'
+
+        test, traceback = task.check()
+        assert_true(test)
+        array = task.get_from_database('Test_array')
+        assert_equal(array.dtype, np.dtype([('toto', 'i4'), ('tata', 'f8')]))
+
+        task.column_types = 'toto: i4, tata'
+        test, traceback = task.check()
+        assert_false(test)
+        assert_in('root/Test-types', traceback)
+
+        task.column_types = 'toto: i9'
+        test, traceback = task.check()
+        assert_false(test)
+        assert_in('root/Test-types', traceback)
+
+    def test_perform_types(self):
+        # Test performing with declared and inferred column types.
+        task = self.task
+        task.saving_target = 'File and array'
+        task.folder = self.test_dir
+        task.filename = 'test_types.txt'
+        task.array_size = '2'
+        task.saved_values = [('toto', '{Root_int}'),
+                             ('tata', 'np.float32({Root_float})'),
+                             ('titi', '1j*{Root_float}')]
+        task.column_types = 'toto: u1'
+        task.infer_types = True
+
+        task.perform()
+        task.perform()
+        assert_equal(task.array.dtype,
+                     np.dtype([('toto', 'u1'), ('tata', 'f4'),
+                               ('titi', 'c16')]))
+        np.testing.assert_array_equal(task.array['titi'], [2j, 2j])
+
+        # Test resuming a file containing complex values.
+        file_path = os.path.join(self.test_dir, 'test_types.txt')
+        with open(file_path) as f:
+            content = f.readlines()
+        self.root.resumed_files = {file_path: len(''.join(content[:-1]))}
+        task.perform()
+        assert_equal(task.line_index, 2)
+        np.testing.assert_array_equal(task.array['titi'], [2j, 2j])
+        np.testing.assert_array_equal(task.array['toto'], [1, 1])
+
+    def test_perform_inferred_types(self):
+        # Test that Python numbers are inferred as doubles and that values
+        # which cannot be stored without loss stop the measure.
+        task = self.task
+        task.saving_target = 'Array'
+        task.array_size = '3'
+        task.saved_values = [('toto', '{Root_int}'), ('tata', '{Root_str}')]
+        task.infer_types = True
+
+        task.perform()
+        self.root.write_in_database('int', 2.5)
+        task.perform()
+        assert_equal(task.array.dtype,
+                     np.dtype([('toto', 'f8'), ('tata', 'S1')]))
+        np.testing.assert_array_equal(task.array['toto'][:2], [1.0, 2.5])
+        assert_false(self.root.should_stop.is_set())
+
+        self.root.write_in_database('str', 'abc')
+        task.perform()
+        assert_true(self.root.should_stop.is_set())
+        assert_equal(task.line_index, 2)
+
+    def test_concurrent_observer(self):
+        # Test that concurrent saving does not wait on the pools.
+        self.task.concurrent = True
+        assert_false(self.task.wait['activated'])
+        self.task.concurrent = False
+        assert_true(self.task.wait['activated'])
+
+    def test_check_concurrent(self):
+        # Test checking the row index formula.
+        task = self.task
+        task.saving_target = 'Array'
+        task.array_size = '3'
+        task.saved_values = [('toto', '{Root_int}')]
+        task.concurrent = True
+        task.row_index = '{Root_index*}'
+
+        test, traceback = task.check()
+        assert_false(test)
+        assert_in('root/Test-index', traceback)
+
+    def test_perform_concurrent(self):
+        # Test that rows received out of order are saved in order.
+        task = self.task
+        task.saving_target = 'File and array'
+        task.folder = self.test_dir
+        task.filename = 'test_concurrent.txt'
+        task.array_size = '3'
+        task.concurrent = True
+        task.row_index = '{Root_index}'
+        task.saved_values = [('toto', '{Root_index}')]
+        file_path = os.path.join(self.test_dir, 'test_concurrent.txt')
+
+        for i in (2, 0):
+            self.root.write_in_database('index', i)
+            task.perform()
+        assert_equal(task.line_index, 1)
+        assert_equal(task._ordered_rows.pending, 1)
+
+        self.root.write_in_database('index', 1)
+        task.perform()
+        assert_false(task.initialized)
+        np.testing.assert_array_equal(task.array['toto'], [0, 1, 2])
+        with open(file_path) as f:
+            assert_equal(f.readlines(), ['toto\n', '0\n', '1\n', '2\n'])
+
+    def test_perform_concurrent_threads(self):
+        # Test saving rows from several threads.
+        task = self.task
+        task.saving_target = 'File and array'
+        task.folder = self.test_dir
+        task.filename = 'test_concurrent.txt'
+        task.array_size = '40'
+        task.concurrent = True
+        task.row_index = '{Root_index}.value'
+        task.saved_values = [('toto', '{Root_index}.value')]
+        file_path = os.path.join(self.test_dir, 'test_concurrent.txt')
+        self.root.write_in_database('index', local())
+        self.root.task_database.prepare_for_running()
+        indexes = range(40)
+        random.shuffle(indexes)
+
+        def save(indexes):
+            index = self.root.get_from_database('Root_index')
+            for i in indexes:
+                index.value = i
+                task.perform()
+
+        threads = [Thread(target=save, args=(indexes[i::4],))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert_false(task.initialized)
+        np.testing.assert_array_equal(task.array['toto'], range(40))
+        with open(file_path) as f:
+            assert_equal(f.readlines()[1:], ['%d\n' % i for i in range(40)])
+
+    def test_perform_concurrent_missing(self):
+        # Test that the rows following a missing one are saved on closing.
+        task = self.task
+        task.saving_target = 'File and array'
+        task.folder = self.test_dir
+        task.filename = 'test_concurrent.txt'
+        task.array_size = '4'
+        task.concurrent = True
+        task.row_index = '{Root_index}'
+        task.saved_values = [('toto', '{Root_index}')]
+        file_path = os.path.join(self.test_dir, 'test_concurrent.txt')
+
+        for i in (0, 2, 3):
+            self.root.write_in_database('index', i)
+            task.perform()
+        assert_equal(task._ordered_rows.pending, 2)
+
+        rows = self.root.files['root/Test-rows']
+        assert_true(rows.staging)
+        rows.close()
+        self.root.files[file_path].close()
+        np.testing.assert_array_equal(task.array['toto'][:3], [0, 2, 3])
+        with open(file_path) as f:
+            assert_equal(f.readlines(), ['toto\n', '0\n', '2\n', '3\n'])
+
+    def test_check_memmap(self):
+        # Test checking a memory mapped array.
+        task = self.task
+        task.saving_target = 'Array'
+        task.memory_mapped = True
+        task.saved_values = [('toto', '{Root_int}'), ('tata', '{Root_float}')]
+        self.root.default_path = self.test_dir
+
+        test, traceback = task.check()
+        assert_false(test)
+        assert_in('root/Test', traceback)
+
+        task.array_size = '3'
+        test, traceback = task.check()
+        assert_true(test)
+        assert_false(traceback)
+
+        with open(os.path.join(self.test_dir, 'Test.npy'), 'wb'):
+            pass
+        test, traceback = task.check()
+        assert_true(test)
+        assert_in('root/Test-memmap', traceback)
+
+    def test_perform_memmap(self):
+        # Test performing in array mode with a memory mapped array.
+        task = self.task
+        task.saving_target = 'Array'
+        task.memory_mapped = True
+        task.array_size = '3'
+        task.saved_values = [('toto', '{Root_int}'), ('tata', '{Root_float}')]
+        self.root.default_path = self.test_dir
+        path = os.path.join(self.test_dir, 'Test.npy')
+
+        task.perform()
+        assert_true(isinstance(task.get_from_database('Test_array'),
+                               np.memmap))
+        assert_true(os.path.isfile(path))
+        # Data are visible in the file before the array is complete.
+        task._mapped.flush()
+        np.testing.assert_array_equal(np.load(path)['tata'], [2.0, 0, 0])
+
+        task.perform()
+        task.perform()
+        assert_false(task.initialized)
+        self.root.files[path].close()
+        saved = np.load(path)
+        np.testing.assert_array_equal(saved['toto'], [1.0, 1.0, 1.0])
+        np.testing.assert_array_equal(saved, task.array)
+
+    def test_perform_memmap_resumed(self):
+        # Test resuming the writing of a memory mapped array from a checkpoint.
+        task = self.task
+        task.saving_target = 'Array'
+        task.memory_mapped = True
+        task.array_size = '3'
+        task.saved_values = [('toto', '{Root_int}')]
+        self.root.default_path = self.test_dir
+        loop = LoopTask(task_name='Loop')
+        self.root.children_task.append(loop)
+        self.root.task_database.prepare_for_running()
+        path = os.path.join(self.test_dir, 'Test.npy')
+
+        task.perform()
+        self.root.write_in_database('int', 2)
+        task.perform()
+        loop._save_checkpoint(2, 3)
+        with open(loop.checkpoint_path()) as f:
+            files = json.load(f)['files']
+        assert_equal(files, {path: 2})
+
+        # Simulate a crash after the checkpoint.
+        self.root.write_in_database('int', 5)
+        task.perform()
+        self.root.files[path].close()
+        task.array = None
+        del self.root.files[path]
+
+        self.root.resumed_files = files
+        self.root.write_in_database('int', 3)
+        task.perform()
+        assert_false(task.initialized)
+        self.root.files[path].close()
+        np.testing.assert_array_equal(np.load(path)['toto'], [1, 2, 3])
+
+        # Resuming a missing array stops the measure.
+        os.remove(path)
+        self.root.resumed_files = files
+        task.perform()
+        assert_true(self.root.should_stop.is_set())
+
+    def test_check_compression(self):
+        # Test checking the compression options.
+        task = self.task
+        task.folder = self.test_dir
+        task.filename = 'test_comp.txt'
+        task.saved_values = [('toto', '{Root_int}')]
+        task.compression = 'bz2'
+        task.file_mode = 'Add'
+
+        test, traceback = task.check()
+        assert_false(test)
+        assert_in('root/Test-compression', traceback)
+
+        task.file_mode = 'New'
+        task.compression_level = 10
+        test, traceback = task.check()
+        assert_false(test)
+
+        task.compression_level = 9
+        test, traceback = task.check()
+        assert_true(test)
+
+    def test_check_compression_checkpoint(self):
+        # Test that compressed files are refused in a checkpointing loop.
+        loop = LoopTask(task_name='Loop', checkpoint=True)
+        self.root.children_task.remove(self.task)
+        self.root.children_task.append(loop)
+        loop.children_task.append(self.task)
+        task = self.task
+        task.folder = self.test_dir
+        task.filename = 'test_comp.txt'
+        task.saved_values = [('toto', '{Root_int}')]
+        task.compression = 'gzip'
+
+        test, traceback = task.check()
+        assert_false(test)
+        assert_in('root/Loop/Test-compression', traceback)
+
+        loop.checkpoint = False
+        test, traceback = task.check()
+        assert_true(test)
+
+    def test_check_array_checkpoint(self):
+        # Test that arrays held in memory are refused in a checkpointing loop.
+        loop = LoopTask(task_name='Loop', checkpoint=True)
+        self.root.children_task.remove(self.task)
+        self.root.children_task.append(loop)
+        loop.children_task.append(self.task)
+        task = self.task
+        task.saving_target = 'Array'
+        task.array_size = '3'
+        task.saved_values = [('toto', '{Root_int}')]
+        self.root.default_path = self.test_dir
+
+        test, traceback = task.check()
+        assert_false(test)
+        assert_in('root/Loop/Test-checkpoint', traceback)
+
+        task.memory_mapped = True
+        test, traceback = task.check()
+        assert_true(test)
+
+    def test_perform_compressed_resumed(self):
+        # Test that failing to resume a compressed file stops the measure.
+        task = self.task
+        task.folder = self.test_dir
+        task.filename = 'test_comp.txt'
+        task.compression = 'gzip'
+        task.array_size = '2'
+        task.saved_values = [('toto', '{Root_int}')]
+        file_path = os.path.join(self.test_dir, 'test_comp.txt.gz')
+        self.root.resumed_files = {file_path: 10}
+
+        task.perform()
+        assert_true(self.root.should_stop.is_set())
+        assert_false(task.initialized)
+
+    def test_perform_compressed(self):
+        # Test writing a gzip compressed file through the background writer.
+        task = self.task
+        task.saving_target = 'File'
+        task.folder = self.test_dir
+        task.filename = 'test_comp.txt'
+        task.header = 'test'
+        task.compression = 'gzip'
+        task.compression_level = 1
+        task.array_size = '2'
+        task.saved_values = [('toto', '{Root_int}'), ('tata', '{Root_float}')]
+        file_path = os.path.join(self.test_dir, 'test_comp.txt.gz')
+
+        writer = BackgroundWriter(self.root)
+        self.root.writer = writer
+        writer.start()
+        try:
+            task.perform()
+            assert_is(task._writer(), writer)
+            task.perform()
+        finally:
+            writer.close()
+            self.root.writer = None
+
+        assert_true(task.file_object.closed)
+        with open_data_file(file_path) as f:
+            a = f.readlines()
+        assert_equal(a, ['# test\n', 'toto\ttata\n', '1\t2.0\n',
+                         '1\t2.0\n'])
+
+    def test_perform3(self):
+        # Test resuming the writing of a file after a checkpoint.
+        task = self.task
+        task.saving_target = 'File and array'
+        task.folder = self.test_dir
+        task.filename = 'test_resume.txt'
+        task.file_mode = 'New'
+        task.header = 'test'
+        task.array_size = '3'
+        task.saved_values = [('toto', '{Root_int}'), ('tata', '{Root_float}')]
+        file_path = os.path.join(self.test_dir, 'test_resume.txt')
+
+        content = '# test\ntoto\ttata\n1\t2.0\n'
+        with open(file_path, 'wb') as f:
+            f.write(content + '1\t3.0\n')
+        self.root.resumed_files = {file_path: len(content)}
+
+        task.perform()
+        assert_equal(task.line_index, 2)
+        assert_false(self.root.resumed_files)
+        task.perform()
+        assert_false(task.initialized)
+
+        with open(file_path) as f:
+            a = f.readlines()
+        assert_equal(a, ['# test\n', 'toto\ttata\n', '1\t2.0\n', '1\t2.0\n',
+                         '1\t2.0\n'])
+        np.testing.assert_array_equal(task.array['tata'], [2.0, 2.0, 2.0])
+
 
 class TestSaveFileTask(object):
 
@@ -520,6 +1011,500 @@ class TestSaveFileTask(object):
         finally:
             task.file_object.close()
 
+    def test_perform_compressed_resumed(self):
+        # Test that failing to resume a compressed file stops the measure.
+        task = self.task
+        task.folder = self.test_dir
+        task.filename = 'test_comp.txt'
+        task.compression = 'gzip'
+        task.saved_values = [('toto', '{Root_float}')]
+        file_path = os.path.join(self.test_dir, 'test_comp.txt.gz')
+        self.root.resumed_files = {file_path: 10}
+
+        task.perform()
+        assert_true(self.root.should_stop.is_set())
+        assert_false(task.initialized)
+
+    def test_perform_binary_compressed(self):
+        # Test performing in binary format through a bz2 compressor.
+        task = self.task
+        task.folder = self.test_dir
+        task.filename = 'test_perform_bin.dat'
+        task.file_format = 'Binary'
+        task.compression = 'bz2'
+        task.saved_values = [('toto', '{Root_float}'),
+                             ('tata', '{Root_array}')]
+        file_path = os.path.join(self.test_dir, 'test_perform_bin.dat.bz2')
+
+        try:
+            task.perform()
+        finally:
+            task.file_object.close()
+
+        data, header = load_binary_file(file_path)
+        np.testing.assert_array_equal(data['tata'], range(10))
+        np.testing.assert_array_equal(data['toto'], [2.0]*10)
+
+    def test_perform_binary(self):
+        # Test performing in binary format with a rec array and a scalar.
+        self.root.write_in_database('array',
+                                    np.rec.fromarrays([range(10), range(10)],
+                                                      names=['a', 'b']))
+        task = self.task
+        task.folder = self.test_dir
+        task.filename = 'test_perform_bin.dat'
+        task.header = 'test'
+        task.file_format = 'Binary'
+        task.saved_values = [('toto', '{Root_float}'),
+                             ('tata', '{Root_array}')]
+        file_path = os.path.join(self.test_dir, 'test_perform_bin.dat')
+
+        try:
+            task.perform()
+            self.root.write_in_database('float', 3.0)
+            task.perform()
+        finally:
+            task.file_object.close()
+
+        data, header = load_binary_file(file_path)
+        assert_equal(header, 'test')
+        assert_equal(data.dtype.names, ('toto', 'tata_a', 'tata_b'))
+        assert_equal(data.dtype['toto'].str, '<f8')
+        assert_equal(len(data), 20)
+        np.testing.assert_array_equal(data['toto'], [2.0]*10 + [3.0]*10)
+        np.testing.assert_array_equal(data['tata_b'], range(10)*2)
+
+    def test_perform_binary_python_int(self):
+        # Test that a Python int followed by a float is saved without loss.
+        self.root.write_in_database('int', 1)
+        task = self.task
+        task.folder = self.test_dir
+        task.filename = 'test_perform_bin_int.dat'
+        task.file_format = 'Binary'
+        task.saved_values = [('toto', '{Root_int}')]
+        file_path = os.path.join(self.test_dir, 'test_perform_bin_int.dat')
+
+        try:
+            task.perform()
+            self.root.write_in_database('int', 2.5)
+            task.perform()
+        finally:
+            task.file_object.close()
+
+        data, _ = load_binary_file(file_path)
+        assert_equal(data.dtype['toto'].str, '<f8')
+        np.testing.assert_array_equal(data['toto'], [1.0, 2.5])
+
+    def test_perform_binary_type_change(self):
+        # Test that a value which cannot be safely cast stops the measure.
+        self.root.write_in_database('array', np.arange(3, dtype='i4'))
+        task = self.task
+        task.folder = self.test_dir
+        task.filename = 'test_perform_bin_change.dat'
+        task.file_format = 'Binary'
+        task.saved_values = [('toto', '{Root_array}')]
+        file_path = os.path.join(self.test_dir,
+                                 'test_perform_bin_change.dat')
+
+        try:
+            task.perform()
+            self.root.write_in_database('array', np.linspace(0, 1, 3))
+            task.perform()
+        finally:
+            task.file_object.close()
+
+        assert_true(self.root.should_stop.is_set())
+        data, _ = load_binary_file(file_path)
+        np.testing.assert_array_equal(data['toto'], range(3))
+
+
+def test_growing_array():
+    # Test the amortized growth and the trimming of a growing array.
+    closed = []
+    array = GrowingArray(np.dtype([('a', 'f8')]), capacity=2,
+                         on_close=closed.append)
+    for i in range(5):
+        array.append((i,))
+    assert_equal(array.capacity, 8)
+    assert_equal(array.length, 5)
+    np.testing.assert_array_equal(array.view['a'], range(5))
+
+    array.close()
+    assert_true(array.closed)
+    assert_equal(len(closed[0]), 5)
+    assert_equal(closed[0].base, None)
+    np.testing.assert_array_equal(closed[0]['a'], range(5))
+
+
+def test_ordered_rows():
+    # Test pushing rows from several threads in random order.
+    indexes = range(200)
+    random.shuffle(indexes)
+    rows = OrderedRows()
+    written = []
+
+    def push(indexes):
+        for i in indexes:
+            rows.push(i, i, written.append)
+
+    threads = [Thread(target=push, args=(indexes[i::4],)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert_equal(written, range(200))
+    assert_equal(rows.pending, 0)
+    assert_raises(ValueError, rows.push, 10, 10, written.append)
+
+
+def test_ordered_rows_drain():
+    # Test draining the rows waiting for a missing one when closing.
+    closed = []
+    rows = OrderedRows(on_close=closed.append)
+    written = []
+    for i in (0, 2, 5):
+        rows.push(i, i, written.append)
+    assert_equal(written, [0])
+
+    rows.close()
+    assert_is(closed[0], rows)
+    assert_equal(rows.drain(written.append), [1, 3, 4])
+    assert_equal(written, [0, 2, 5])
+    assert_equal(rows.pending, 0)
+    assert_equal(rows.next_index, 6)
+
+
+def test_npy_chunks_container():
+    # Test writing and reading back a container using the NumPy format.
+    path = os.path.join(os.path.dirname(__file__), 'container')
+    try:
+        container = NpyChunksContainer(path, 4)
+        container.set_attribute('header', 'test')
+        record = np.rec.fromarrays([np.arange(3.0), np.arange(3)],
+                                   names=['a', 'b'])
+        for i in range(10):
+            container.append('x', np.asarray(float(i)))
+            container.append('trace', record)
+        assert_equal(sorted(os.listdir(os.path.join(path, 'x'))),
+                     ['000000.npy', '000001.npy'])
+        container.close()
+
+        datasets, attributes = load_container(path)
+        assert_equal(attributes, {'header': 'test'})
+        np.testing.assert_array_equal(datasets['x'], np.arange(10.0))
+        assert_equal(datasets['trace'].shape, (10, 3))
+        np.testing.assert_array_equal(datasets['trace'][7]['b'], [0, 1, 2])
+    finally:
+        shutil.rmtree(path)
+
+
+def test_npy_chunks_container_rerun():
+    # Test that an existing container is emptied and that only the recorded
+    # rows are read back with the recorded type.
+    path = os.path.join(os.path.dirname(__file__), 'container')
+    try:
+        container = NpyChunksContainer(path, 2)
+        for i in range(5):
+            container.append('x', np.asarray(float(i)))
+        container.close()
+
+        container = NpyChunksContainer(path, 2)
+        container.append('x', np.asarray(-1.0))
+        container.flush()
+        container.append('x', np.asarray(-2.0))
+        container.append('x', np.asarray(-3.0))
+        container.append('y', np.arange(3, dtype='i4'))
+        assert_equal(sorted(os.listdir(os.path.join(path, 'x'))),
+                     ['000000.npy'])
+
+        # Metadata written before the last rows were flushed.
+        datasets, _ = load_container(path)
+        np.testing.assert_array_equal(datasets['x'], [-1.0, -2.0])
+        assert_equal(datasets['y'].shape, (0, 3))
+        assert_equal(datasets['y'].dtype, np.dtype('i4'))
+        container.close()
+
+        datasets, _ = load_container(path)
+        np.testing.assert_array_equal(datasets['x'], [-1.0, -2.0, -3.0])
+        np.testing.assert_array_equal(datasets['y'], [range(3)])
+    finally:
+        shutil.rmtree(path)
+
+
+def test_container_row_check():
+    # Test that rows which cannot be stored without loss are refused.
+    path = os.path.join(os.path.dirname(__file__), 'container')
+    try:
+        container = NpyChunksContainer(path, 4)
+        container.append('x', np.asarray(1))
+        container.append('s', np.asarray('ab'))
+        assert_raises(ValueError, container.append, 'x', np.asarray(1.5))
+        assert_raises(ValueError, container.append, 's', np.asarray('abc'))
+        assert_raises(ValueError, container.append, 'x', np.arange(2))
+        container.close()
+    finally:
+        shutil.rmtree(path)
+
+
+def test_hdf5_container():
+    # Test that HDF5 datasets grow by chunks and are trimmed on closing.
+    if h5py is None:
+        raise SkipTest('h5py is not installed.')
+    directory = mkdtemp()
+    try:
+        path = os.path.join(directory, 'data.h5')
+        container = HDF5Container(path, 4)
+        for i in range(5):
+            container.append('x', np.asarray(float(i)))
+        assert_equal(container._file['x'].shape, (8,))
+        assert_raises(ValueError, container.append, 'x', np.arange(2.0))
+        container.close()
+
+        datasets, _ = load_container(path)
+        np.testing.assert_array_equal(datasets['x'], range(5))
+    finally:
+        shutil.rmtree(directory)
+
+
+class TestSaveChunkedTask(object):
+
+    def setup(self):
+        self.test_dir = mkdtemp()
+        self.root = RootTask(should_stop=Event(), should_pause=Event())
+        self.task = SaveChunkedTask(task_name='Test', folder=self.test_dir,
+                                    filename='data', backend='NumPy',
+                                    chunk_size=2)
+        self.root.children_task.append(self.task)
+
+        self.root.write_in_database('float', 2.0)
+        self.root.write_in_database('array', np.arange(5.0))
+
+    def teardown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_check1(self):
+        # Test everything is ok when all entries can be evaluated.
+        self.task.saved_values = [('x', '{Root_float}'),
+                                  ('y', '{Root_array}')]
+        test, traceback = self.task.check()
+        assert_true(test)
+        assert_false(traceback)
+
+    def test_check2(self):
+        # Test handling duplicate labels and wrong entries.
+        self.task.saved_values = [('x', '{Root_float}'), ('x', '{Root_*}')]
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_in('root/Test-entry1', traceback)
+
+    def test_check_checkpoint(self):
+        # Test that the task is refused in a checkpointing loop.
+        loop = LoopTask(task_name='Loop', checkpoint=True)
+        self.root.children_task.remove(self.task)
+        self.root.children_task.append(loop)
+        loop.children_task.append(self.task)
+        self.task.saved_values = [('x', '{Root_float}')]
+
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_in('root/Loop/Test-checkpoint', traceback)
+
+        loop.checkpoint = False
+        test, traceback = self.task.check()
+        assert_true(test)
+
+    def test_perform(self):
+        # Test appending rows to the datasets.
+        self.task.header = 'test'
+        self.task.saved_values = [('x', '{Root_float}'),
+                                  ('y', '{Root_array}')]
+        for i in range(3):
+            self.task.perform()
+        self.root.files[os.path.join(self.test_dir, 'data')].close()
+
+        datasets, attributes = load_container(os.path.join(self.test_dir,
+                                                           'data'))
+        assert_equal(attributes['header'], 'test')
+        np.testing.assert_array_equal(datasets['x'], [2.0]*3)
+        np.testing.assert_array_equal(datasets['y'], [np.arange(5.0)]*3)
+
+    def test_perform_types(self):
+        # Test that Python numbers are stored as floats and that rows which
+        # do not match the dataset stop the measure.
+        self.root.write_in_database('int', 1)
+        self.task.saved_values = [('x', '{Root_int}'),
+                                  ('y', '{Root_array}')]
+        self.task.perform()
+        self.root.write_in_database('int', 2.5)
+        self.task.perform()
+        assert_false(self.root.should_stop.is_set())
+
+        self.root.write_in_database('array', np.arange(3.0))
+        self.task.perform()
+        assert_true(self.root.should_stop.is_set())
+        self.root.files[os.path.join(self.test_dir, 'data')].close()
+
+        datasets, _ = load_container(os.path.join(self.test_dir, 'data'))
+        np.testing.assert_array_equal(datasets['x'], [1.0, 2.5, 2.5])
+        assert_equal(len(datasets['y']), 2)
+
+
+class TestSaveSQLiteTask(object):
+
+    def setup(self):
+        self.test_dir = mkdtemp()
+        self.root = RootTask(should_stop=Event(), should_pause=Event())
+        self.task = SaveSQLiteTask(task_name='Test', folder=self.test_dir,
+                                   filename='log.db', batch_size=2,
+                                   commit_interval=1000.)
+        self.root.children_task.append(self.task)
+
+        self.root.write_in_database('float', 2.0)
+        self.root.write_in_database('index', 1)
+
+    def teardown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_check1(self):
+        # Test everything is ok when all entries can be evaluated.
+        self.task.loop_index = '{Root_index}'
+        self.task.saved_values = [('x', '{Root_float}')]
+        test, traceback = self.task.check()
+        assert_true(test)
+        assert_false(traceback)
+
+    def test_check2(self):
+        # Test handling wrong table name, reserved labels and wrong entries.
+        self.task.table = 'points; DROP'
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_in('root/Test-table', traceback)
+
+        self.task.table = 'points'
+        self.task.loop_index = '{Root_index*}'
+        self.task.saved_values = [('time', '{Root_float}'),
+                                  ('x', '{Root_*}')]
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_in('root/Test-index', traceback)
+        assert_in('root/Test-entry0', traceback)
+        assert_in('root/Test-entry1', traceback)
+
+    def test_perform(self):
+        # Test logging points in batches.
+        self.task.header = 'test'
+        self.task.loop_index = '{Root_index}'
+        self.task.saved_values = [('x', '{Root_float}'),
+                                  ('y', 'np.arange(3.0)')]
+        path = os.path.join(self.test_dir, 'log.db')
+
+        def query(sql):
+            connection = sqlite3.connect(path)
+            try:
+                return connection.execute(sql).fetchall()
+            finally:
+                connection.close()
+
+        for i in range(3):
+            self.root.write_in_database('index', i)
+            self.task.perform()
+
+        # The last point is not committed yet.
+        assert_equal(query('SELECT loop_index, x FROM points'),
+                     [(0, 2.0), (1, 2.0)])
+        indexes = [r[0] for r in query('SELECT name FROM sqlite_master '
+                                       'WHERE type="index"')]
+        assert_in('points_time', indexes)
+        assert_in('points_loop_index', indexes)
+        assert_equal(query('PRAGMA journal_mode'), [('wal',)])
+
+        self.root.files[path].close()
+        rows = query('SELECT loop_index, y FROM points WHERE loop_index > 1')
+        assert_equal(len(rows), 1)
+        array_format = query('SELECT value FROM metadata WHERE '
+                             'name="array:points.y"')[0][0]
+        np.testing.assert_array_equal(array_from_blob(rows[0][1],
+                                                      array_format),
+                                      np.arange(3.0))
+        assert_equal(query('SELECT value FROM metadata WHERE '
+                           'name="header:points"'), [('test',)])
+
+    def test_perform_array_change(self):
+        # Test that changing the shape of the saved arrays stops the measure,
+        # including when appending to an existing table.
+        path = os.path.join(self.test_dir, 'log.db')
+        self.task.saved_values = [('y', 'np.arange({Root_index})')]
+        self.task.perform()
+        self.root.write_in_database('index', 2)
+        self.task.perform()
+        assert_true(self.root.should_stop.is_set())
+        self.root.files[path].close()
+
+        self.root.should_stop.clear()
+        self.task.initialized = False
+        self.task.perform()
+        assert_true(self.root.should_stop.is_set())
+        self.root.files[path].close()
+        connection = sqlite3.connect(path)
+        try:
+            rows = connection.execute('SELECT value FROM metadata WHERE '
+                                      'name="array:points.y"').fetchall()
+        finally:
+            connection.close()
+        assert_equal(json.loads(rows[0][0])['shape'], [1])
+
+    def test_check_checkpoint(self):
+        # Test that the task is refused in a checkpointing loop.
+        loop = LoopTask(task_name='Loop', checkpoint=True)
+        self.root.children_task.remove(self.task)
+        self.root.children_task.append(loop)
+        loop.children_task.append(self.task)
+        self.task.saved_values = [('x', '{Root_float}')]
+
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_in('root/Loop/Test-checkpoint', traceback)
+
+    def test_append_columns(self):
+        # Test appending to an existing table with different columns.
+        path = os.path.join(self.test_dir, 'log.db')
+        self.task.saved_values = [('x', '{Root_float}')]
+        self.task.perform()
+        self.root.files[path].close()
+
+        self.task.initialized = False
+        self.task.saved_values = [('x', '{Root_float}'),
+                                  ('z', '{Root_index}')]
+        test, traceback = self.task.check()
+        assert_true(test)
+        assert_in("['z']", traceback['root/Test-file'])
+
+        self.task.perform()
+        self.root.files[path].close()
+        connection = sqlite3.connect(path)
+        try:
+            rows = connection.execute('SELECT x, z FROM points').fetchall()
+        finally:
+            connection.close()
+        assert_equal(rows, [(2.0, None), (2.0, 1)])
+
+    def test_check_foreign_table(self):
+        # Test refusing to append to a table which is not a point log.
+        path = os.path.join(self.test_dir, 'log.db')
+        connection = sqlite3.connect(path)
+        connection.execute('CREATE TABLE points (x REAL)')
+        connection.commit()
+        connection.close()
+        self.task.saved_values = [('x', '{Root_float}')]
+
+        test, traceback = self.task.check()
+        assert_false(test)
+        assert_in('root/Test-table', traceback)
+
+        self.task.perform()
+        assert_true(self.root.should_stop.is_set())
+
 
 class TestSaveArrayTask(object):
 
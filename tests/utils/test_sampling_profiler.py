@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : test_sampling_profiler.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+"""
+"""
+import os
+from time import sleep, time
+from tempfile import mkdtemp
+from shutil import rmtree
+from threading import Thread, Event
+from nose.tools import assert_equal, assert_in, assert_true
+
+from hqc_meas.utils.sampling_profiler import SamplingProfiler
+
+from ..util import complete_line
+
+
+def setup_module():
+    print complete_line(__name__ + ': setup_module()', '~', 78)
+
+
+def teardown_module():
+    print complete_line(__name__ + ': teardown_module()', '~', 78)
+
+
+def _busy_worker(duration):
+    start = time()
+    while time() - start < duration:
+        pass
+
+
+def test_sample():
+    # Test sampling manually the current thread (all the running threads are
+    # sampled, only the stack of the current one is checked).
+    profiler = SamplingProfiler()
+    profiler.sample()
+    assert_equal(profiler.samples, 1)
+    stacks = [s for s in profiler.stacks
+              if any('test_sample' in frame for frame in s)]
+    assert_equal(len(stacks), 1)
+    assert_in('test_sample', stacks[0][-2])
+
+
+def _idle_worker(event):
+    event.wait()
+
+
+def test_sample_idle_threads():
+    # Test that the threads waiting on an event are not sampled.
+    event = Event()
+    thread = Thread(target=_idle_worker, args=(event,))
+    thread.start()
+    try:
+        sleep(0.05)
+        profiler = SamplingProfiler()
+        profiler.sample()
+    finally:
+        event.set()
+        thread.join()
+
+    assert_true(not any('_idle_worker' in frame
+                        for stack in profiler.stacks for frame in stack))
+    assert_true(any('test_sample_idle_threads' in frame
+                    for stack in profiler.stacks for frame in stack))
+
+
+def test_sampling_threads():
+    # Test that secondary threads are sampled and the report/dump.
+    profiler = SamplingProfiler(0.001)
+    profiler.start()
+    thread = Thread(target=_busy_worker, args=(0.2,))
+    thread.start()
+    thread.join()
+    profiler.stop()
+
+    assert_true(profiler.samples > 10)
+    own, total = profiler.functions_statistics()
+    assert_true(any('_busy_worker' in label for label in own))
+    # The profiling thread should not sample itself.
+    assert_true(not any('_run' in label and 'sampling_profiler' in label
+                        for label in total))
+    assert_in('_busy_worker', profiler.format_report())
+
+    directory = mkdtemp()
+    try:
+        path = os.path.join(directory, 'samples.txt')
+        profiler.dump(path)
+        with open(path) as f:
+            lines = f.readlines()
+        assert_equal(len(lines), len(profiler.stacks))
+        assert_true(all(int(l.rsplit(' ', 1)[1]) > 0 for l in lines))
+    finally:
+        rmtree(directory)
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+# =============================================================================
+# module : test_tracing.py
+# author : Matthieu Dartiailh
+# license : MIT license
+# =============================================================================
+"""
+"""
+import os
+import json
+from tempfile import mkdtemp
+from shutil import rmtree
+from threading import Thread
+from nose.tools import assert_equal, assert_in, assert_true, assert_is_none
+
+from hqc_meas.utils.tracing import Tracer, traced, get_tracer, set_tracer
+
+from ..util import complete_line
+
+
+def setup_module():
+    print complete_line(__name__ + ': setup_module()', '~', 78)
+
+
+def teardown_module():
+    print complete_line(__name__ + ': teardown_module()', '~', 78)
+
+
+class _Driver(object):
+
+    @traced('instrument')
+    def ask(self, message):
+        """Doc"""
+        return message
+
+
+class TestTracer(object):
+
+    def setup(self):
+        self.test_dir = mkdtemp()
+
+    def teardown(self):
+        set_tracer(None)
+        rmtree(self.test_dir)
+
+    def test_traced_no_tracer(self):
+        # Test that the decorated method works without an active tracer.
+        assert_is_none(get_tracer())
+        assert_equal(_Driver().ask('a'), 'a')
+        assert_equal(_Driver.ask.__doc__, 'Doc')
+
+    def test_traced(self):
+        # Test that calls are recorded in the active tracer.
+        tracer = Tracer()
+        set_tracer(tracer)
+        assert_equal(_Driver().ask('a'), 'a')
+        assert_equal(len(tracer.events), 1)
+        name, cat, start, end, _ = tracer.events[0]
+        assert_equal(name, '_Driver.ask')
+        assert_equal(cat, 'instrument')
+        assert_true(end >= start)
+
+    def test_dump(self):
+        # Test the format of the saved file.
+        tracer = Tracer()
+        tracer.add('root/test', 'task', tracer._origin, tracer._origin + 1)
+        thread = Thread(target=tracer.add, name='Worker',
+                        args=('root/a', 'database', tracer._origin,
+                              tracer._origin))
+        thread.start()
+        thread.join()
+
+        path = os.path.join(self.test_dir, 'trace.json')
+        tracer.dump(path)
+        with open(path) as f:
+            data = json.load(f)
+
+        events = data['traceEvents']
+        metadata = [e for e in events if e['ph'] == 'M']
+        assert_equal(len(metadata), 2)
+        assert_in('Worker', [e['args']['name'] for e in metadata])
+
+        complete = [e for e in events if e['ph'] == 'X']
+        assert_equal(len(complete), 2)
+        task = [e for e in complete if e['cat'] == 'task'][0]
+        assert_equal(task['name'], 'root/test')
+        assert_equal(task['ts'], 0)
+        assert_equal(task['dur'], 1e6)
+        tids = set(e['tid'] for e in complete)
+        assert_equal(len(tids), 2)